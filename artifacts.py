@@ -0,0 +1,88 @@
+# artifacts.py
+"""
+Download artifacts built on demand.
+
+The download page registers a builder per file instead of bytes; a
+st.download_button gets registry.deferred(name), so the file is only
+fetched when somebody clicks it and is memoized for the next click
+(callable `data` needs streamlit>=1.52, see requirements.txt).
+Rendering the page therefore costs the same whether a run has 5 locations
+or 500. Files finished earlier are registered with register_file(); they
+live in the registry's working directory (`workdir`, a TemporaryDirectory)
+until the registry is dropped. generate_reports writes every location's
+workbooks there as it goes, so the report frames need not be kept.
+
+Builds are timed into the diagnostics run handed to the registry, even when
+the download happens after the run, in a later script thread.
+"""
+
+import threading
+
+import diagnostics
+
+
+class ArtifactRegistry:
+    def __init__(self, metrics=None, workdir=None):
+        """
+        `metrics` is the diagnostics.RunMetrics builds are recorded in (None: not recorded);
+        `workdir` is a TemporaryDirectory kept (and removed) with the registry.
+        """
+        self._builders = {}   # name -> zero-arg callable returning bytes or a binary file
+        self._built = {}      # name -> bytes / file
+        self._lock = threading.Lock()
+        self._metrics = metrics
+        self.workdir = workdir
+        self.builds = 0
+        self.hits = 0
+
+    def register(self, name, build):
+        self._builders[name] = build
+        self._built.pop(name, None)
+
+    def register_file(self, name, path):
+        """Register the finished file at `path`, opened on first request."""
+        self.register(name, lambda: open(path, "rb"))
+
+    def __contains__(self, name):
+        return name in self._builders
+
+    def names(self):
+        return list(self._builders)
+
+    def get(self, name):
+        """
+        Contents of `name` (bytes or a binary file), built on first request.
+        """
+        with self._lock:
+            if name in self._built:
+                self.hits += 1
+            else:
+                with diagnostics.span_in(self._metrics, "build", artifact=name) as span:
+                    self._built[name] = self._builders[name]()
+                    if span.active:
+                        span.set(bytes=_size(self._built[name]))
+                self.builds += 1
+            data = self._built[name]
+            if hasattr(data, "seek"):
+                data.seek(0)  # spooled files are re-read from the start
+            return data
+
+    def deferred(self, name):
+        """
+        Zero-argument callable for st.download_button(data=...).
+        """
+        return lambda: self.get(name)
+
+    def stats(self):
+        return {"registered": len(self._builders), "built": len(self._built),
+                "builds": self.builds, "hits": self.hits}
+
+
+def _size(data):
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    try:
+        data.seek(0, 2)
+        return data.tell()
+    except (AttributeError, OSError):
+        return None
@@ -0,0 +1,1013 @@
+# benchmarks.py
+"""
+Benchmarks and parity checks for the report pipeline.
+
+    python benchmarks.py readers <extracted_dir> [--repeat N]
+    python benchmarks.py periods [--rows N] [--days N] [--period-days N]
+    python benchmarks.py oem [--rows N] [--repeat N]
+    python benchmarks.py pool [--threads N] [--calls N] [--size N]
+    python benchmarks.py startup [--budget SECONDS]
+    python benchmarks.py writers [--rows N]
+    python benchmarks.py archives [--locations N] [--rows N] [--dealers N]
+    python benchmarks.py packaging [--locations N] [--rows N] [--threads N] [--csv]
+    python benchmarks.py dtypes <extracted_dir>
+    python benchmarks.py projection <extracted_dir> [--categories Spares,Accessories]
+    python benchmarks.py streaming [--rows N] [--chunk-rows N]
+    python benchmarks.py suite [--input <zip_or_dir> | --locations N --rows N] [--repeat N]
+                               [--json out.json] [--baseline previous.json]
+
+Each sub-command prints a table and exits non-zero if a parity check fails.
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+
+def _timed(fn, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _workbooks(root):
+    """
+    Yield (report type, path, header) for every known workbook under `root`,
+    with the header row the pipeline reads it with.
+    """
+    from report_schemas import schema_for
+
+    for dirpath, _, names in os.walk(root):
+        for name in sorted(names):
+            schema = schema_for(name)
+            if schema is not None and name.lower().strip().endswith(".xlsx"):
+                yield schema.name, os.path.join(dirpath, name), schema.header
+
+
+# ---------------- readers ---------------- #
+def bench_readers(args):
+    from excel_reader import available_engines, read_excel
+
+    engines = available_engines()
+    totals = defaultdict(lambda: defaultdict(float))
+    failures = []
+    for rtype, path, header in _workbooks(args.root):
+        frames = {}
+        for eng in engines:
+            elapsed, frames[eng] = _timed(lambda: read_excel(path, header=header, engine=eng), args.repeat)
+            totals[rtype][eng] += elapsed
+        ref = frames["openpyxl"]
+        for eng, df in frames.items():
+            if not (df.equals(ref) and df.dtypes.equals(ref.dtypes) and list(df.columns) == list(ref.columns)):
+                failures.append(f"{path}: {eng} differs from openpyxl")
+
+    print(f"{'report type':<28}" + "".join(f"{e:>12}" for e in engines) + f"{'speedup':>10}")
+    for rtype, by_engine in totals.items():
+        fastest = min(by_engine.values()) or 1e-9
+        row = f"{rtype:<28}" + "".join(f"{by_engine[e]:>11.3f}s" for e in engines)
+        print(row + f"{by_engine['openpyxl'] / fastest:>9.1f}x")
+    for msg in failures:
+        print(f"PARITY FAIL {msg}")
+    return 1 if failures else 0
+
+
+# ---------------- periods ---------------- #
+def _legacy_coverage(dates, periods):
+    """validate_periods' original per-period Python scan, kept as the reference."""
+    return [any(start <= d.date() <= end for d in dates.dropna()) for start, end in periods]
+
+
+def bench_periods(args):
+    from datetime import date, timedelta
+
+    import numpy as np
+    import pandas as pd
+
+    from validation import period_coverage
+
+    rng = np.random.default_rng(0)
+    end = date.today()
+    start = end - timedelta(days=args.days - 1)
+    periods = []
+    current = start
+    while current <= end:
+        period_end = min(current + timedelta(days=args.period_days - 1), end)
+        periods.append((current, period_end))
+        current = period_end + timedelta(days=1)
+    starts = np.array([p[0] for p in periods], dtype="datetime64[D]")
+    ends = np.array([p[1] for p in periods], dtype="datetime64[D]")
+
+    # dates spread past both ends of the window, with gaps and NaT
+    offsets = rng.integers(-30, args.days + 30, size=args.rows)
+    offsets[rng.random(args.rows) < 0.05] = -10_000
+    dates = pd.Series(pd.Timestamp(start) + pd.to_timedelta(offsets, unit="D"))
+    dates[offsets == -10_000] = pd.NaT
+    dates[(offsets > args.days // 3) & (offsets < args.days // 2)] = pd.NaT
+
+    legacy_s, legacy = _timed(lambda: _legacy_coverage(dates, periods), 1)
+    new_s, new = _timed(lambda: period_coverage(dates, starts, ends), args.repeat)
+    ok = list(new) == legacy
+    print(f"rows={args.rows} periods={len(periods)}")
+    print(f"{'legacy any() scan':<24}{legacy_s:>10.4f}s")
+    print(f"{'searchsorted/bincount':<24}{new_s:>10.4f}s{legacy_s / max(new_s, 1e-9):>9.1f}x")
+    print("parity OK" if ok else "PARITY FAIL")
+    return 0 if ok else 1
+
+
+# ---------------- oem ---------------- #
+def _legacy_oem_from_bo_list(frames, today=None):
+    """
+    process_location's original row-wise BO LIST block, kept as a timing
+    reference only: it runs on schema-normalized frames, so it is not the
+    pre-series path. Output parity is test_oem_golden.py's job.
+    """
+    from datetime import datetime, timedelta
+
+    import pandas as pd
+
+    from report import to_num
+
+    oem = pd.concat(frames, ignore_index=True)
+    oem['PO DATE'] = pd.to_datetime(oem['PO DATE'], errors='coerce')
+    cutoff_90 = ((today or datetime.today()) - timedelta(days=90)).date()
+    oem_work = oem[oem['PO DATE'].dt.date >= cutoff_90].copy()
+    for c in ['B/O', 'PROCESSING_ALLOCATION', 'PROCESSING_ON-PICK', 'PROCESSING_ON-PACK',
+              'PROCESSING_PACKED', 'PROCESSING_INVOICE', 'PROCESSING_SHIPPEO', 'QUANTITY_CURRENT']:
+        if c in oem_work.columns:
+            oem_work[c] = to_num(oem_work[c])
+    oem_work['transit'] = (
+        oem_work.get('B/O', 0)
+        + oem_work.get('PROCESSING_ALLOCATION', 0)
+        + oem_work.get('PROCESSING_ON-PICK', 0)
+        + oem_work.get('PROCESSING_ON-PACK', 0)
+        + oem_work.get('PROCESSING_PACKED', 0)
+        + oem_work.get('PROCESSING_INVOICE', 0)
+    )
+    oem_work['T/F'] = oem_work.get('QUANTITY_CURRENT', 0).eq(oem_work.get('PROCESSING_SHIPPEO', 0))
+
+    def _remark(r):
+        if r['transit'] == 0.0 and bool(r['T/F']) is True:
+            return 'Ok'
+        if r['transit'] > 0.0 and bool(r['T/F']) is False:
+            return 'Ok'
+        if r['transit'] == 0.0 and bool(r['T/F']) is False:
+            return 'Pls Check'
+        return None
+
+    oem_work['Remark'] = oem_work.apply(_remark, axis=1)
+    oem_work['transit'] = oem_work.apply(lambda row: row['QUANTITY_CURRENT'] if row['Remark'] == 'Pls Check' else row['transit'], axis=1)
+    oem_workf = oem_work[['Brand', 'Dealer', 'Location', 'ORDER NO', 'PART NO_CURRENT', 'PO DATE', 'transit', 'Remark']].copy()
+    oem_workf.rename(columns={'ORDER NO': 'OrderNumber', 'PART NO_CURRENT': 'PartNumber',
+                              'PO DATE': 'OrderDate', 'transit': 'POQty'}, inplace=True)
+    return oem_workf
+
+
+def _bo_list_rows(rng, rows, today):
+    """BO LIST data rows: PO DATE as Excel serials, strings and blanks around
+    the 90-day cutoff; quantities mixing ints, floats, blanks and junk text."""
+    import pandas as pd
+
+    def qty():
+        q = rng.integers(0, 3, size=rows).astype(object)
+        q[rng.random(rows) < 0.05] = None
+        q[rng.random(rows) < 0.02] = "n/a"
+        q[rng.random(rows) < 0.02] = 1.5
+        return q
+
+    age = rng.integers(80, 100, size=rows)
+    stamp = pd.Timestamp(today).normalize() - pd.to_timedelta(age, unit="D")
+    serial = (stamp - pd.Timestamp("1899-12-30")).days.to_numpy() + rng.choice([0.0, 0.5], size=rows)
+    po_date = serial.astype(object)
+    as_text = rng.random(rows) < 0.3
+    po_date[as_text] = stamp[as_text].strftime("%d/%m/%Y")
+    po_date[rng.random(rows) < 0.03] = None
+
+    cols = {
+        'ORDER NO': [f"ORD{i % 997:05d}" for i in range(rows)],
+        'LINE': range(rows),
+        'PART NO_ORDER': [f"P-{i % 311}.{i % 7}" for i in range(rows)],
+        'PART NO_CURRENT': [f"P-{i % 311}.{i % 7}" for i in range(rows)],
+        'PART NAME': "PART", 'PARTSOURCE': "S", 'QUANTITY_ORDER': qty(),
+        'QUANTITY_CURRENT': qty(), 'B/O': qty(), 'PO DATE': po_date,
+        'PDC': None, 'ETA': None, 'MSG': None,
+        'PROCESSING_ALLOCATION': qty(), 'PROCESSING_ON-PICK': qty(),
+        'PROCESSING_ON-PACK': qty(), 'PROCESSING_PACKED': qty(),
+        'PROCESSING_INVOICE': qty(), 'PROCESSING_SHIPPEO': qty(),
+        'LOST QTY': 0, 'ELAP': 0,
+    }
+    return pd.DataFrame(cols)
+
+
+def _sheet_values(xlsx):
+    import io
+
+    from openpyxl import load_workbook
+
+    wb = load_workbook(io.BytesIO(xlsx))
+    return wb.active.title, {ws.title: [list(r) for r in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+
+
+def bench_oem(args):
+    from datetime import datetime
+
+    import numpy as np
+
+    import report
+    from report_schemas import SCHEMAS
+
+    rng = np.random.default_rng(0)
+    today = datetime.today()
+    rows = _bo_list_rows(rng, args.rows, today)
+
+    # speed: the BO LIST step alone on an already-parsed frame
+    frame = rows.assign(Brand="KIA", Dealer="D1", Location="L1")
+    frame = SCHEMAS["bo list"].normalize(frame)
+    legacy_s, _ = _timed(lambda: _legacy_oem_from_bo_list([frame], today), 1)
+    new_s, _ = _timed(lambda: report.oem_from_bo_list([frame], today), args.repeat)
+    print(f"rows={args.rows}")
+    print(f"{'legacy row-wise apply':<24}{legacy_s:>10.4f}s")
+    print(f"{'np.select/datetime64':<24}{new_s:>10.4f}s{legacy_s / max(new_s, 1e-9):>9.1f}x")
+    return 0
+
+
+# ---------------- pool ---------------- #
+def bench_pool(args):
+    import shutil
+    import sqlite3
+    import tempfile
+    import threading
+
+    from db import ConnectionPool
+
+    tmp = tempfile.mkdtemp(prefix="kia_pool_")
+    try:
+        path = os.path.join(tmp, "pool.db")
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE Log_user (user_id INTEGER, n INTEGER)")
+        pool = ConnectionPool(lambda: sqlite3.connect(path, timeout=30, check_same_thread=False),
+                              max_size=args.size, ping_after=0)
+
+        errors = []
+
+        def worker(uid):
+            for n in range(args.calls):
+                try:
+                    with pool.cursor() as cur:
+                        cur.execute("INSERT INTO Log_user VALUES (?, ?)", (uid, n))
+                        cur.connection.commit()
+                    with pool.cursor() as cur:
+                        cur.execute("SELECT COUNT(*) FROM Log_user WHERE user_id = ?", (uid,))
+                        if cur.fetchone()[0] != n + 1:
+                            errors.append(f"thread {uid}: lost/interleaved rows")
+                except Exception as e:
+                    errors.append(f"thread {uid}: {e}")
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+        # a connection closed behind the pool's back must be replaced, not handed out
+        conn = pool.acquire()
+        conn.close()
+        pool.release(conn)
+        with pool.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM Log_user")
+            total = cur.fetchone()[0]
+        if total != args.threads * args.calls:
+            errors.append(f"expected {args.threads * args.calls} rows, found {total}")
+        stats = pool.stats()
+        if stats["reconnects"] < 1:
+            errors.append("stale connection was not replaced")
+        if stats["open"] > args.size:
+            errors.append(f"{stats['open']} connections open, max_size {args.size}")
+        pool.close()
+
+        print(f"threads={args.threads} calls={args.calls} size={args.size} elapsed={elapsed:.3f}s")
+        for k, v in stats.items():
+            print(f"  {k:<12}{v:.3f}" if isinstance(v, float) else f"  {k:<12}{v}")
+        for msg in errors[:20]:
+            print(f"POOL FAIL {msg}")
+        return 1 if errors else 0
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# ---------------- startup ---------------- #
+def bench_startup(args):
+    """First render of the page script (login screen) with the DB unreachable.
+    Run it in a fresh process: already-imported modules would hide import cost."""
+    # unroutable address: any connection attempt would block for the login timeout
+    os.environ.update({"Server": "10.255.255.1", "Database": "kia", "Password": "x"})
+    from streamlit.testing.v1 import AppTest
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Hyundaiapp.py")
+    t0 = time.perf_counter()
+    at = AppTest.from_file(script, default_timeout=max(args.budget * 4, 30)).run()
+    elapsed = time.perf_counter() - t0
+
+    import tbl
+
+    failures = [f"script raised: {e.value}" for e in at.exception]
+    if elapsed > args.budget:
+        failures.append(f"first render took {elapsed:.2f}s, budget {args.budget:.2f}s")
+    if tbl.pool.stats()["open"]:
+        failures.append("a DB connection was opened before login")
+    eager = [m for m in ("openpyxl", "lxml", "pyodbc", "report", "validation") if m in sys.modules]
+    if eager:
+        failures.append(f"imported before first use: {', '.join(eager)}")
+
+    print(f"{'first render':<24}{elapsed:>10.3f}s  (budget {args.budget:.2f}s)")
+    for msg in failures:
+        print(f"STARTUP FAIL {msg}")
+    return 1 if failures else 0
+
+
+# ---------------- writers ---------------- #
+def _oem_report_frame(rows):
+    """OEM_*.xlsx sheet1-shaped frame (strings, float qty, blanks)."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    qty = rng.integers(0, 20, size=rows).astype(float)
+    remark = np.where(rng.random(rows) < 0.1, "Pls Check", "Ok").astype(object)
+    remark[rng.random(rows) < 0.05] = None
+    return pd.DataFrame({
+        "Brand": "KIA", "Dealer": "DEALER", "Location": "LOC",
+        "OrderNumber": [f"ORD{i % 9973:06d}" for i in range(rows)],
+        "PartNumber": [f"P{i % 7919:08d}" for i in range(rows)],
+        "OrderDate": "01 Jan 2026", "POQty": qty, "Remark": remark,
+        "OEMInvoiceNo": "", "OEMInvoiceDate": "", "OEMInvoiceQty": "",
+    })
+
+
+def _rss_kb():
+    """Current resident set size (Linux), falling back to the peak elsewhere."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _writer_child(args):
+    """One writer in a fresh process so ru_maxrss is its own peak."""
+    import gc
+    import json
+    import resource
+
+    from excel_writer import to_xlsx
+
+    df = _oem_report_frame(args.rows)
+    summary = df.loc[df["Remark"].eq("Pls Check"), ["Location", "OrderNumber"]].drop_duplicates()
+    gc.collect()
+    base = _rss_kb()
+    t0 = time.perf_counter()
+    data = to_xlsx([("Check Order status", summary), ("sheet1", df)], writer=args.child)
+    elapsed = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(args.out, "wb") as fh:
+        fh.write(data)
+    print(json.dumps({"seconds": elapsed, "peak_kb": peak, "write_kb": max(peak - base, 0), "bytes": len(data)}))
+    return 0
+
+
+def bench_writers(args):
+    import json
+    import shutil
+    import subprocess
+    import tempfile
+
+    from excel_writer import available_writers
+
+    if args.child:
+        return _writer_child(args)
+
+    tmp = tempfile.mkdtemp(prefix="kia_writers_")
+    try:
+        results, sheets = {}, {}
+        for name in available_writers():
+            out = os.path.join(tmp, name + ".xlsx")
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "writers", "--rows", str(args.rows),
+                                   "--child", name, "--out", out], capture_output=True, text=True)
+            if proc.returncode:
+                print(proc.stderr)
+                return 1
+            results[name] = json.loads(proc.stdout.strip().splitlines()[-1])
+        # read outputs only after every child ran: ru_maxrss survives fork+exec,
+        # so a child started from a bloated parent would report the parent's peak
+        for name in results:
+            with open(os.path.join(tmp, name + ".xlsx"), "rb") as fh:
+                sheets[name] = _sheet_values(fh.read())
+
+        ref = results["pandas"]
+        print(f"rows={args.rows}")
+        print(f"{'writer':<12}{'wall':>10}{'peak RSS':>12}{'over data':>12}{'size':>10}{'speedup':>9}")
+        for name, r in results.items():
+            print(f"{name:<12}{r['seconds']:>9.2f}s{r['peak_kb'] / 1024:>10.0f}MB{r['write_kb'] / 1024:>10.0f}MB"
+                  f"{r['bytes'] / 1024:>8.0f}KB{ref['seconds'] / max(r['seconds'], 1e-9):>8.1f}x")
+        failures = [name for name in sheets if sheets[name] != sheets["pandas"]]
+        for name in failures:
+            print(f"PARITY FAIL {name}: cell values differ from pd.ExcelWriter")
+        return 1 if failures else 0
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# ---------------- archives ---------------- #
+def _location_frames(locations, rows, dealers):
+    """[(file name, frame)] of an OEM + Stock run, in location order."""
+    frames = []
+    for loc in range(locations):
+        df = _oem_report_frame(rows).assign(Dealer=f"D{loc % dealers}", Location=f"L{loc}")
+        frames.append((f"OEM_KIA_D{loc % dealers}_L{loc}.xlsx", df))
+        stock = df[["Brand", "Dealer", "Location", "PartNumber", "POQty"]].rename(columns={"POQty": "Qty"})
+        frames.append((f"Stock_KIA_D{loc % dealers}_L{loc}.xlsx", stock))
+    return frames
+
+
+def _legacy_dealer_zip(named_frames):
+    """The previous in-memory build: concat per dealer, bytes per member, BytesIO archive."""
+    import io
+    import zipfile
+    from collections import defaultdict
+
+    import pandas as pd
+
+    from dealer_reports import PLS_CHECK_EMPTY, dealer_group, pls_check_pairs
+    from excel_writer import to_xlsx
+
+    grouped = defaultdict(list)
+    for name, df in named_frames:
+        rep, br, dlr, _ = dealer_group(name)
+        grouped[(rep, br, dlr)].append(df)
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
+        for (rep, br, dlr), df_list in grouped.items():
+            combined = pd.concat(df_list, ignore_index=True)
+            if rep == "OEM":
+                summary = pls_check_pairs(combined)
+                if summary.empty:
+                    summary = pd.DataFrame([PLS_CHECK_EMPTY])
+                data = to_xlsx([("Check Order status", summary), ("sheet1", combined)])
+            else:
+                data = to_xlsx([("Sheet1", combined)])
+            zipf.writestr(f"{rep}_{br}_{dlr}.xlsx", data)
+    return io.BytesIO(zip_buffer.getvalue())
+
+
+def _archive_child(args):
+    import gc
+    import json
+    import resource
+    import shutil
+
+    from dealer_reports import dealer_zip
+
+    named_frames = _location_frames(args.locations, args.rows, args.dealers)
+    gc.collect()
+    base = _rss_kb()
+    t0 = time.perf_counter()
+    archive = _legacy_dealer_zip(named_frames) if args.child == "bytesio" else dealer_zip(named_frames)
+    elapsed = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(args.out, "wb") as fh:
+        shutil.copyfileobj(archive, fh)
+    print(json.dumps({"seconds": elapsed, "peak_kb": peak, "build_kb": max(peak - base, 0),
+                      "bytes": os.path.getsize(args.out)}))
+    return 0
+
+
+def bench_archives(args):
+    import json
+    import shutil
+    import subprocess
+    import tempfile
+    import zipfile
+
+    if args.child:
+        return _archive_child(args)
+
+    tmp = tempfile.mkdtemp(prefix="kia_archives_")
+    try:
+        results, contents = {}, {}
+        for mode in ("bytesio", "spooled"):
+            out = os.path.join(tmp, mode + ".zip")
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "archives",
+                                   "--locations", str(args.locations), "--rows", str(args.rows),
+                                   "--dealers", str(args.dealers), "--child", mode, "--out", out],
+                                  capture_output=True, text=True)
+            if proc.returncode:
+                print(proc.stderr)
+                return 1
+            results[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+        for mode in results:  # after the children, see bench_writers
+            with zipfile.ZipFile(os.path.join(tmp, mode + ".zip")) as z:
+                contents[mode] = {name: _sheet_values(z.read(name)) for name in z.namelist()}
+
+        print(f"locations={args.locations} rows/location={args.rows} dealers={args.dealers}")
+        print(f"{'archive':<10}{'wall':>10}{'peak RSS':>12}{'over data':>12}{'size':>10}")
+        for mode, r in results.items():
+            print(f"{mode:<10}{r['seconds']:>9.2f}s{r['peak_kb'] / 1024:>10.0f}MB{r['build_kb'] / 1024:>10.0f}MB"
+                  f"{r['bytes'] / 1024:>8.0f}KB")
+        ok = contents["bytesio"] == contents["spooled"]
+        print("archive contents identical" if ok else "PARITY FAIL: archive contents differ")
+        return 0 if ok else 1
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# ---------------- packaging ---------------- #
+def bench_packaging(args):
+    import io
+    import zipfile
+
+    from excel_writer import write_xlsx
+    from zip_output import spooled_zip
+
+    named_frames = _location_frames(args.locations, args.rows, dealers=4)
+    members = [(name, lambda fh, df=df: write_xlsx([("Sheet1", df)], fh)) for name, df in named_frames]
+    if args.csv:
+        def write_csv(fh, df):
+            text = io.TextIOWrapper(fh, "utf-8", newline="")
+            df.to_csv(text, index=False)
+            text.detach()  # flushes; leaves `fh` open
+
+        members += [(name.replace(".xlsx", ".csv"), lambda fh, df=df: write_csv(fh, df))
+                    for name, df in named_frames if name.startswith("Stock_")]
+
+    # members rendered once, to time the packaging step on its own
+    rendered = []
+    for name, write in members:
+        buf = io.BytesIO()
+        write(buf)
+        rendered.append((name, lambda fh, data=buf.getvalue(): fh.write(data)))
+
+    configs = [("deflate", 1), ("auto", 1), ("stored", 1), ("auto", args.threads)]
+    results, contents = [], []
+    for mode, threads in configs:
+        t0 = time.perf_counter()
+        spooled_zip(rendered, mode=mode, threads=threads).close()
+        packing = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        archive = spooled_zip(members, mode=mode, threads=threads)
+        elapsed = time.perf_counter() - t0
+        size = archive.seek(0, os.SEEK_END)
+        archive.seek(0)
+        with zipfile.ZipFile(archive) as z:
+            contents.append({info.filename: _sheet_values(z.read(info)) if info.filename.endswith(".xlsx")
+                             else z.read(info) for info in z.infolist()})
+        archive.close()
+        results.append((mode, threads, elapsed, packing, size))
+
+    print(f"locations={args.locations} rows/location={args.rows} members={len(members)}")
+    print(f"{'mode':<10}{'threads':>8}{'build':>10}{'packaging':>11}{'size':>11}{'speedup':>9}")
+    ref = results[0][3]
+    for mode, threads, elapsed, packing, size in results:
+        print(f"{mode:<10}{threads:>8}{elapsed:>9.2f}s{packing:>10.2f}s{size / 1024:>9.0f}KB"
+              f"{ref / max(packing, 1e-9):>8.1f}x")
+    ok = all(c == contents[0] for c in contents[1:])
+    print("member contents identical" if ok else "PARITY FAIL: member contents differ between modes")
+    return 0 if ok else 1
+
+
+# ---------------- dtypes ---------------- #
+def bench_dtypes(args):
+    import pandas as pd
+
+    from dtype_policy import compact, concat
+    from excel_reader import read_excel
+    from excel_writer import cell_value
+
+    def as_object(df):
+        text = [c for c in df.columns if isinstance(df[c].dtype, pd.StringDtype)]
+        return df.astype({c: object for c in text}) if text else df
+
+    def values(df):
+        return [[cell_value(v) for v in df[c].tolist()] for c in df.columns]
+
+    parsed, compacted = defaultdict(list), defaultdict(list)
+    seconds = defaultdict(float)
+    for rtype, path, header in _workbooks(args.root):
+        df = read_excel(path, header=header)
+        brand, dealer, location = os.path.normpath(os.path.dirname(path)).split(os.sep)[-3:]
+        df["__source_file__"] = os.path.basename(path)
+        df["Brand"], df["Dealer"], df["Location"] = brand, dealer, location
+        parsed[rtype].append(df)
+        t0 = time.perf_counter()
+        compacted[rtype].append(compact(df))
+        seconds[rtype] += time.perf_counter() - t0
+
+    # memory_usage(deep=True) of each report type's concatenated frame
+    print(f"{'report type':<28}{'rows':>9}{'object str':>12}{'as parsed':>12}{'compact':>12}{'saved':>8}{'cost':>9}")
+    failures = []
+    for rtype, frames in parsed.items():
+        before = pd.concat(frames, ignore_index=True)
+        after = concat(compacted[rtype])
+        legacy = as_object(before).memory_usage(deep=True).sum()
+        used, compact_bytes = before.memory_usage(deep=True).sum(), after.memory_usage(deep=True).sum()
+        print(f"{rtype:<28}{len(before):>9}{legacy / 1024:>10.0f}KB{used / 1024:>10.0f}KB{compact_bytes / 1024:>10.0f}KB"
+              f"{1 - compact_bytes / max(legacy, 1):>7.0%}{seconds[rtype]:>8.3f}s")
+        if list(after.columns) != list(before.columns) or values(after) != values(before):
+            failures.append(rtype)
+    print("saved = compact vs object strings (pandas < 3 parse)")
+    for rtype in failures:
+        print(f"PARITY FAIL {rtype}: compacted values differ")
+    return 1 if failures else 0
+
+
+# ---------------- projection ---------------- #
+def bench_projection(args):
+    from excel_reader import select_columns
+    from excel_writer import cell_value
+    from report import process_location, read_file
+    from zip_ingest import DiskSource
+
+    source = DiskSource(args.root)
+    categories = [c for c in args.categories.split(",") if c]
+    parsed = defaultdict(int)  # mode -> bytes of the frames handed to process_location
+
+    def full_reader(path, header=None, usecols=None):
+        # the previous behaviour: parse every column, then project
+        df = read_file(path, header=header, source=source)
+        if df is not None:
+            parsed["full"] += int(df.memory_usage(deep=True).sum())
+        try:
+            return None if df is None else select_columns(df, usecols)
+        except IndexError:
+            return None
+
+    def projected_reader(path, header=None, usecols=None):
+        df = read_file(path, header=header, source=source, usecols=usecols)
+        if df is not None:
+            parsed["projected"] += int(df.memory_usage(deep=True).sum())
+        return df
+
+    def outputs(result):
+        return {name: [[cell_value(v) for v in df[c].tolist()] for c in df.columns]
+                for name, df in result["frames"].items()}
+
+    seconds = defaultdict(float)
+    failures = []
+    for brand, dealer, location, path in source.locations():
+        results = {}
+        for mode, reader in (("full", full_reader), ("projected", projected_reader)):
+            t0 = time.perf_counter()
+            results[mode] = process_location(brand, dealer, location, path, categories,
+                                             reader=reader, source=source)
+            seconds[mode] += time.perf_counter() - t0
+        if outputs(results["full"]) != outputs(results["projected"]):
+            failures.append(location)
+
+    print(f"locations={len(source.locations())} categories={categories}")
+    print(f"{'read':<12}{'process_location':>18}{'parsed frames':>16}")
+    for mode in ("full", "projected"):
+        print(f"{mode:<12}{seconds[mode]:>17.2f}s{parsed[mode] / 1024 / 1024:>14.1f}MB")
+    print(f"speedup {seconds['full'] / max(seconds['projected'], 1e-9):.1f}x, "
+          f"parsed memory {1 - parsed['projected'] / max(parsed['full'], 1):.0%} smaller")
+    for location in failures:
+        print(f"PARITY FAIL {location}: reports differ")
+    return 1 if failures else 0
+
+
+# ---------------- streaming ---------------- #
+def _write_rows(path, rows):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
+def _streaming_location(root, rows):
+    """One location with a `rows`-row BO LIST and Stock; returns its path."""
+    import itertools
+    from datetime import datetime
+
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    loc = os.path.join(root, "KIA", "D1", "L1")
+    os.makedirs(loc, exist_ok=True)
+    bo = _bo_list_rows(rng, rows, datetime.today())
+    _write_rows(os.path.join(loc, "BO LIST.xlsx"),
+                itertools.chain([["BO LIST"], list(bo.columns)], bo.itertuples(index=False, name=None)))
+    part_type = rng.choice(["X", "Y", "A", "Z"], size=rows)
+    _write_rows(os.path.join(loc, "Stock.xlsx"),
+                itertools.chain([["PART NO ?", "PART NAME", "PART TYPE", "ON-HAND", "BIN"]],
+                                ([f"P-{i % 7919}.{i % 7}", "PART", str(part_type[i]), i % 13, f"B{i % 50}"]
+                                 for i in range(rows))))
+    return loc
+
+
+def _streaming_child(args):
+    import gc
+    import json
+    import pickle
+    import resource
+
+    from report import process_location
+    from zip_ingest import DiskSource
+
+    gc.collect()
+    base = _rss_kb()
+    t0 = time.perf_counter()
+    result = process_location("KIA", "D1", "L1", args.root, ["Spares"], source=DiskSource(),
+                              stream=args.child == "stream")
+    elapsed = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(args.out, "wb") as fh:
+        pickle.dump(result["frames"], fh)
+    print(json.dumps({"seconds": elapsed, "peak_kb": peak, "read_kb": max(peak - base, 0),
+                      "errors": result["errors"]}))
+    return 0
+
+
+def bench_streaming(args):
+    import json
+    import pickle
+    import shutil
+    import subprocess
+    import tempfile
+
+    from excel_writer import cell_value
+
+    if args.child:
+        return _streaming_child(args)
+
+    tmp = tempfile.mkdtemp(prefix="kia_streaming_")
+    try:
+        t0 = time.perf_counter()
+        loc = _streaming_location(tmp, args.rows)
+        print(f"rows={args.rows} (BO LIST + Stock, written in {time.perf_counter() - t0:.1f}s) "
+              f"chunk={args.chunk_rows}")
+        results, frames = {}, {}
+        for mode in ("whole", "stream"):
+            out = os.path.join(tmp, mode + ".pkl")
+            env = dict(os.environ, KIA_STREAM_CHUNK_ROWS=str(args.chunk_rows))
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "streaming", "--root", loc,
+                                   "--child", mode, "--out", out], capture_output=True, text=True, env=env)
+            if proc.returncode:
+                print(proc.stderr)
+                return 1
+            results[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+        for mode in results:  # after the children, see bench_writers
+            with open(os.path.join(tmp, mode + ".pkl"), "rb") as fh:
+                frames[mode] = {name: [[cell_value(v) for v in df[c].tolist()] for c in df.columns]
+                                for name, df in pickle.load(fh).items()}
+
+        print(f"{'read':<10}{'process_location':>18}{'peak RSS':>12}{'over base':>12}")
+        for mode, r in results.items():
+            print(f"{mode:<10}{r['seconds']:>17.2f}s{r['peak_kb'] / 1024:>10.0f}MB{r['read_kb'] / 1024:>10.0f}MB")
+            for msg in r["errors"]:
+                print(f"  {mode}: {msg}")
+        ok = frames["whole"] == frames["stream"] and not any(r["errors"] for r in results.values())
+        print("reports identical" if ok else "PARITY FAIL: reports differ")
+        return 0 if ok else 1
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# ---------------- suite ---------------- #
+# report builders of process_location, timed one at a time: the input types
+# each one reads (read + filter + build; the lists only feed validation)
+SUITE_BUILDERS = {
+    "build_oem": ("bo list", "receiving pending detail", "receiving today detail"),
+    "build_stock": ("stock",),
+    "build_pending": ("transfer detail",),
+    "read_lists": ("receiving pending list", "receiving today list", "transfer list"),
+}
+
+
+class _OnlyTypes:
+    """A source whose location index holds only some report types."""
+
+    def __init__(self, source, rtypes):
+        self._source = source
+        self._rtypes = set(rtypes)
+
+    def index(self, location_path):
+        return {t: (names if t in self._rtypes else [])
+                for t, names in self._source.index(location_path).items()}
+
+    def __getattr__(self, name):
+        return getattr(self._source, name)
+
+
+def _suite_run(path, categories, start, end, period):
+    """One pass over the pipeline stages of the app; returns {stage: seconds}."""
+    from diagnostics import RunMetrics
+    from kia_reports import _open_source
+    from report import generate_reports, process_location, read_file
+    from validation import PERIOD_TYPES, missing_inputs, validate_cross_sums, validate_periods
+    from workbook_store import WorkbookStore
+
+    seconds = {}
+
+    def timed(stage, fn):
+        t0 = time.perf_counter()
+        result = fn()
+        seconds[stage] = time.perf_counter() - t0
+        return result
+
+    source = timed("ingest", lambda: _open_source(path))
+    try:
+        t0 = time.perf_counter()
+        all_locations = source.locations()
+        missing_inputs(all_locations, source=source)
+        seconds["ingest"] += time.perf_counter() - t0
+
+        store = WorkbookStore(lambda p, header=None, usecols=None: read_file(p, header=header, source=source,
+                                                                              usecols=usecols))
+        timed("validate_periods", lambda: validate_periods(all_locations, start, end, PERIOD_TYPES[period],
+                                                           store=store, source=source))
+        timed("validate_cross_sums", lambda: validate_cross_sums(all_locations, store=store, source=source))
+        # workbooks and the dealer ZIP are written during generate; split them out by span
+        metrics = RunMetrics()
+        timed("generate", lambda: generate_reports(all_locations, categories, store=store,
+                                                            serial=True, source=source, metrics=metrics))
+        store.clear()
+        spans = {row["stage"]: row["seconds"] for row in metrics.stages()}
+        seconds["xlsx"] = spans.get("xlsx", 0.0)
+        seconds["zip"] = spans.get("dealer_zip", 0.0)
+        seconds["generate"] -= seconds["xlsx"] + seconds["zip"]
+
+        for stage, rtypes in SUITE_BUILDERS.items():
+            only = _OnlyTypes(source, rtypes)
+            timed(stage, lambda: [process_location(*loc, categories, source=only) for loc in all_locations])
+    finally:
+        source.close()
+    return seconds
+
+
+def bench_suite(args):
+    import json
+    import platform
+    import resource
+    import shutil
+    import tempfile
+    from datetime import date, timedelta
+
+    import pandas as pd
+
+    from excel_reader import engine_order
+    from excel_writer import writer_order
+
+    tmp = None
+    path = args.input
+    if path is None:
+        from synthetic_kia import generate
+
+        tmp = tempfile.mkdtemp(prefix="kia_suite_")
+        path = os.path.join(tmp, "synthetic.zip")
+        t0 = time.perf_counter()
+        generate(path, locations=args.locations, rows=args.rows, seed=args.seed)
+        print(f"generated {path} ({args.locations} locations x {args.rows} rows) "
+              f"in {time.perf_counter() - t0:.1f}s")
+
+    categories = [c for c in args.categories.split(",") if c]
+    end = date.today()
+    start = end - timedelta(days=args.days)
+    runs = defaultdict(list)
+    try:
+        for _ in range(args.repeat):
+            for stage, s in _suite_run(path, categories, start, end, args.period).items():
+                runs[stage].append(s)
+        size = os.path.getsize(path) if os.path.isfile(path) else None
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {
+        "input": {"path": args.input or "synthetic", "bytes": size,
+                  "synthetic": None if args.input else {"locations": args.locations, "rows": args.rows,
+                                                        "seed": args.seed}},
+        "config": {"categories": categories, "period": args.period, "days": args.days, "repeat": args.repeat,
+                   "engine": engine_order()[0], "writer": writer_order()[0],
+                   "stream_reads": os.getenv("KIA_STREAM_READS", "0")},
+        "environment": {"python": platform.python_version(), "pandas": pd.__version__,
+                        "platform": platform.platform(), "cpus": os.cpu_count()},
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": {stage: {"best": min(s), "runs": s} for stage, s in runs.items()},
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)["stages"]
+
+    print(f"{'stage':<22}{'best':>10}" + (f"{'baseline':>10}{'ratio':>8}" if baseline else ""))
+    for stage, r in report["stages"].items():
+        line = f"{stage:<22}{r['best']:>9.2f}s"
+        if baseline and stage in baseline:
+            before = baseline[stage]["best"]
+            line += f"{before:>9.2f}s{r['best'] / max(before, 1e-9):>7.2f}x"
+        print(line)
+    print(f"peak RSS {report['peak_rss_mb']:.0f}MB")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=1)
+        print(f"results -> {args.json}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="KIA report pipeline benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("readers", help="Excel engine parity + speed per report type")
+    p.add_argument("root", help="extracted Brand/Dealer/Location tree")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_readers)
+
+    p = sub.add_parser("periods", help="validate_periods coverage: legacy scan vs vectorized")
+    p.add_argument("--rows", type=int, default=50_000)
+    p.add_argument("--days", type=int, default=90)
+    p.add_argument("--period-days", type=int, default=1)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_periods)
+
+    p = sub.add_parser("oem", help="OEM transit/Remark: legacy apply vs vectorized")
+    p.add_argument("--rows", type=int, default=20_000)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_oem)
+
+    p = sub.add_parser("pool", help="db.ConnectionPool against SQLite: concurrency, reconnect, wait metrics")
+    p.add_argument("--threads", type=int, default=16)
+    p.add_argument("--calls", type=int, default=50)
+    p.add_argument("--size", type=int, default=4)
+    p.set_defaults(func=bench_pool)
+
+    p = sub.add_parser("startup", help="login page first render with the DB unreachable, under a time budget")
+    p.add_argument("--budget", type=float, default=float(os.getenv("KIA_STARTUP_BUDGET_S", "3")))
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("writers", help="xlsx writers: wall time, peak RSS, cell parity with pd.ExcelWriter")
+    p.add_argument("--rows", type=int, default=200_000)
+    p.add_argument("--child", help=argparse.SUPPRESS)
+    p.add_argument("--out", help=argparse.SUPPRESS)
+    p.set_defaults(func=bench_writers)
+
+    p = sub.add_parser("archives", help="dealer ZIP: in-memory vs spooled streaming build, peak RSS")
+    p.add_argument("--locations", type=int, default=40)
+    p.add_argument("--rows", type=int, default=2_000)
+    p.add_argument("--dealers", type=int, default=4)
+    p.add_argument("--child", help=argparse.SUPPRESS)
+    p.add_argument("--out", help=argparse.SUPPRESS)
+    p.set_defaults(func=bench_archives)
+
+    p = sub.add_parser("packaging", help="output ZIP packaging modes: build time and size per mode")
+    p.add_argument("--locations", type=int, default=100)
+    p.add_argument("--rows", type=int, default=2_000)
+    p.add_argument("--threads", type=int, default=4)
+    p.add_argument("--csv", action="store_true", help="add each location's Stock frame as a CSV member")
+    p.set_defaults(func=bench_packaging)
+
+    p = sub.add_parser("dtypes", help="dtype policy: memory_usage(deep=True) per report type, before/after")
+    p.add_argument("root", help="extracted Brand/Dealer/Location tree")
+    p.set_defaults(func=bench_dtypes)
+
+    p = sub.add_parser("projection", help="input specs: full parse vs usecols projection + row filters")
+    p.add_argument("root", help="extracted Brand/Dealer/Location tree")
+    p.add_argument("--categories", default="Spares", help="comma-separated select_categories")
+    p.set_defaults(func=bench_projection)
+
+    p = sub.add_parser("streaming", help="large BO LIST / Stock: whole-sheet vs chunked read, peak RSS")
+    p.add_argument("--rows", type=int, default=200_000)
+    p.add_argument("--chunk-rows", type=int, default=50_000)
+    p.add_argument("--root", help=argparse.SUPPRESS)
+    p.add_argument("--child", help=argparse.SUPPRESS)
+    p.add_argument("--out", help=argparse.SUPPRESS)
+    p.set_defaults(func=bench_streaming)
+
+    p = sub.add_parser("suite", help="pipeline stages end to end (synthetic or real upload), JSON results")
+    p.add_argument("--input", help="KIA ZIP or extracted tree (default: a synthetic_kia upload)")
+    p.add_argument("--locations", type=int, default=20, help="synthetic upload size")
+    p.add_argument("--rows", type=int, default=2_000, help="synthetic BO LIST rows per location")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--categories", default="Spares", help="comma-separated select_categories")
+    p.add_argument("--period", default="Day", help="validate_periods period")
+    p.add_argument("--days", type=int, default=90, help="validated date range, ending today")
+    p.add_argument("--repeat", type=int, default=1)
+    p.add_argument("--json", help="write the results here")
+    p.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    p.set_defaults(func=bench_suite)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
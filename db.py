@@ -1,9 +1,17 @@
 import os
-import pyodbc
+import threading
+import time
+from contextlib import contextmanager
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# ConnectionPool defaults
+POOL_SIZE = int(os.getenv("KIA_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("KIA_DB_POOL_TIMEOUT", "30"))
+POOL_PING_AFTER = float(os.getenv("KIA_DB_POOL_PING_S", "30"))
+
 def create_mssql_connection(
     env_server_key="Server",
     env_db_key="Database",
@@ -42,9 +50,166 @@ def create_mssql_connection(
         f"Connection Timeout={login_timeout};"
     )
 
+    import pyodbc  # only needed once a connection is actually opened
+
     conn = pyodbc.connect(conn_str)
     conn.timeout = query_timeout
     return conn
 
 
 
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections made by `factory` (lazy, up to max_size).
+
+        with pool.cursor() as cur:          # own cursor per checkout
+            cur.execute(...)
+            cur.connection.commit()
+
+    Idle connections are pinged with `ping_sql` before reuse once they have
+    been idle for `ping_after` seconds and replaced if the ping fails; a
+    connection whose rollback fails after an error is discarded. Any DB-API
+    factory works, e.g. lambda: sqlite3.connect(path, check_same_thread=False).
+    """
+
+    def __init__(self, factory=create_mssql_connection, max_size=POOL_SIZE,
+                 timeout=POOL_TIMEOUT, ping_after=POOL_PING_AFTER, ping_sql="SELECT 1"):
+        self.factory = factory
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.ping_sql = ping_sql
+        self._idle = []          # [(connection, returned_at)]
+        self._open = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self.checkouts = 0
+        self.waits = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+        self.peak_in_use = 0
+        self.reconnects = 0
+
+    # ---------- checkout ----------
+    def acquire(self):
+        t0 = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while not self._idle and self._open >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"no DB connection free after {self.timeout}s ({self.max_size} in use)")
+                self._cond.wait(remaining)
+            if self._idle:
+                conn, returned_at = self._idle.pop()
+            else:
+                conn, returned_at = None, None
+                self._open += 1
+            self._in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self._in_use)
+        try:
+            if conn is None:
+                conn = self.factory()
+            elif time.monotonic() - returned_at >= self.ping_after and not self._alive(conn):
+                self._close(conn)
+                self.reconnects += 1
+                conn = self.factory()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        waited = time.perf_counter() - t0
+        with self._cond:
+            self.checkouts += 1
+            if waited > 0.001:
+                self.waits += 1
+            self.total_wait_s += waited
+            self.max_wait_s = max(self.max_wait_s, waited)
+        return conn
+
+    def release(self, conn, broken=False):
+        with self._cond:
+            self._in_use -= 1
+            if broken:
+                self._open -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if broken:
+            self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self.release(conn, broken)
+
+    @contextmanager
+    def cursor(self):
+        with self.connection() as conn:
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                try:
+                    cur.close()
+                except Exception:
+                    pass
+
+    # ---------- health ----------
+    def _alive(self, conn):
+        try:
+            cur = conn.cursor()
+            cur.execute(self.ping_sql)
+            cur.fetchall()
+            cur.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "max_size": self.max_size,
+                "utilization": self._in_use / self.max_size if self.max_size else 0.0,
+                "peak_in_use": self.peak_in_use,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "avg_wait_ms": self.total_wait_s / self.checkouts * 1000 if self.checkouts else 0.0,
+                "max_wait_ms": self.max_wait_s * 1000,
+                "reconnects": self.reconnects,
+            }
@@ -0,0 +1,96 @@
+# dealer_reports.py
+"""
+Combined_Dealerwise_Reports.zip from the per-location report frames.
+
+Every per-location frame is fed to DealerReports.add() once, in location
+order, and its rows are streamed straight into the dealer workbook of its
+(report, brand, dealer) group; the "Pls Check" summary of OEM workbooks is
+deduplicated on the fly. No dealer-level frame is concatenated.
+"""
+
+import pandas as pd
+
+from excel_writer import XlsxStream, cell_value
+from zip_output import spooled_zip
+
+OEM_SUMMARY_SHEET = "Check Order status"
+PLS_CHECK_EMPTY = {'Location': '—', 'OrderNumber': 'No "Pls Check" rows'}
+
+
+def pls_check_pairs(df):
+    """(Location, OrderNumber) of the rows remarked "Pls Check", first occurrence order."""
+    mask = df['Remark'].astype(str).str.strip().str.lower().eq('pls check')
+    return df.loc[mask, ['Location', 'OrderNumber']].drop_duplicates()
+
+
+def dealer_group(file_name):
+    """
+    (report, brand, dealer, location part) of "Report_Brand_Dealer_Location.xlsx", else None.
+    """
+    parts = file_name.replace(".xlsx", "").split("_")
+    if len(parts) < 4:
+        return None
+    return parts[0], parts[1], parts[2], "_".join(parts[3:])
+
+
+def dealer_zip(named_frames, writer=None):
+    """
+    Combined_Dealerwise_Reports.zip for [(file name, frame)] in location order,
+    as a spooled file at position 0.
+    """
+    reports = DealerReports(writer)
+    for file_name, df in named_frames:
+        reports.add(file_name, df)
+    return spooled_zip(reports.members())
+
+
+class DealerReports:
+    def __init__(self, writer=None):
+        self.writer = writer
+        self.invalid = []      # file names not shaped Report_Brand_Dealer_Location.xlsx
+        self._books = {}       # (report, brand, dealer) -> XlsxStream, first-seen order
+        self._pls_check = {}   # OEM group -> {normalized pair: (Location, OrderNumber)}
+
+    def __len__(self):
+        """Dealer workbooks not yet handed out by members()."""
+        return len(self._books)
+
+    def add(self, file_name, df):
+        if df is None or df.empty:
+            return
+        group = dealer_group(file_name)
+        if group is None:
+            self.invalid.append(file_name)
+            return
+        rep, br, dlr, loc_part = group
+        if "Location" not in df.columns:
+            df = df.copy()
+            df["Location"] = loc_part
+
+        key = (rep, br, dlr)
+        book = self._books.get(key)
+        if book is None:
+            sheets = [OEM_SUMMARY_SHEET, "sheet1"] if rep == "OEM" else ["Sheet1"]
+            book = self._books[key] = XlsxStream(sheets, writer=self.writer)
+        if rep == "OEM":
+            seen = self._pls_check.setdefault(key, {})
+            for pair in pls_check_pairs(df).itertuples(index=False, name=None):
+                seen.setdefault(tuple(cell_value(v) for v in pair), pair)
+            book.append("sheet1", df)
+        else:
+            book.append("Sheet1", df)
+
+    def members(self):
+        """
+        (output file name, write(fh)) per dealer workbook, in first-seen group
+        order; each workbook is finished only when its member is written.
+        """
+        while self._books:
+            (rep, br, dlr), book = next(iter(self._books.items()))
+            del self._books[(rep, br, dlr)]
+            if rep == "OEM":
+                pairs = list(self._pls_check.pop((rep, br, dlr), {}).values())
+                summary = (pd.DataFrame(pairs, columns=['Location', 'OrderNumber']) if pairs
+                           else pd.DataFrame([PLS_CHECK_EMPTY]))
+                book.append(OEM_SUMMARY_SHEET, summary)
+            yield f"{rep}_{br}_{dlr}.xlsx", book.save
@@ -0,0 +1,218 @@
+# diagnostics.py
+"""
+Per-run timings and counters ("Run diagnostics").
+
+The app and kia_reports open a run around one upload (start() / stop(), or
+run() as a block); the pipeline reports into whichever run is active:
+
+    with diagnostics.run() as metrics:             # None when disabled
+        with diagnostics.span("validate_periods"):
+            ...
+    diagnostics.count("parse_cache.hits")
+
+Spans nest (a file read inside validate_periods is its child) and carry
+attributes such as file, rows and bytes; counters are plain sums (cache hits,
+DB round trips, ...). Outside a run, or with KIA_DIAGNOSTICS=0, span() hands
+back a shared no-op span and count() returns at once, so an instrumented call
+costs one context-variable lookup.
+
+The active run lives in a ContextVar: Streamlit runs every session's script
+in a thread of its own, so concurrent sessions each see their own run, and
+helper threads (log writer, ZIP threads) see none. Code that outlives the
+run or works off that thread takes the RunMetrics explicitly instead -
+ArtifactRegistry, generate_reports' pool merge, user_event_log's writes -
+and records through span_in().
+
+Location worker processes record a run of their own; the parent folds it in
+with merge(). Artifacts registered during a run keep a reference to it, so
+workbooks and ZIPs built later, on download, still show up in the panel.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+ENABLED = os.getenv("KIA_DIAGNOSTICS", "1").strip().lower() not in ("0", "false", "no")
+
+_active = contextvars.ContextVar("kia_diagnostics_run", default=None)
+
+
+class _NullSpan:
+    active = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    active = True
+
+    def __init__(self, metrics, name, attrs):
+        self._metrics = metrics
+        self.record = {"name": name, "start": None, "seconds": None, "depth": 0, **attrs}
+
+    def __enter__(self):
+        local = self._metrics._local
+        self.record["depth"] = getattr(local, "depth", 0)
+        local.depth = self.record["depth"] + 1
+        self._t0 = time.perf_counter()
+        self.record["start"] = self._t0 - self._metrics._t0
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.record["seconds"] = time.perf_counter() - self._t0
+        if exc_type is not None:
+            self.record["error"] = exc_type.__name__
+        self._metrics._local.depth = self.record["depth"]
+        self._metrics._add(self.record)
+        return False
+
+    def set(self, **attrs):
+        self.record.update(attrs)
+
+
+class RunMetrics:
+    def __init__(self):
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self._local = threading.local()   # span depth per thread
+        self._lock = threading.Lock()
+        self.spans = []                     # finished spans, as dicts
+        self.counters = defaultdict(int)
+        self.info = {}                      # snapshots: cache / pool / writer stats
+        self.seconds = None                 # run length, set by finish()
+
+    def span(self, name, **attrs):
+        return _Span(self, name, attrs)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def finish(self):
+        if self.seconds is None:
+            self.seconds = time.perf_counter() - self._t0
+
+    def _add(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def merge(self, data, **attrs):
+        """
+        Fold a worker's to_dict() into this run, nested under the current span.
+        """
+        if not data:
+            return
+        offset = data["started"] - self.started
+        depth = getattr(self._local, "depth", 0)
+        with self._lock:
+            for record in data["spans"]:
+                self.spans.append(dict(record, start=record["start"] + offset,
+                                       depth=record["depth"] + depth, **attrs))
+            for name, n in data["counters"].items():
+                self.counters[name] += n
+
+    def stages(self):
+        """
+        Spans aggregated by name: calls, seconds, rows, bytes (first-seen order).
+        """
+        table = {}
+        with self._lock:
+            spans = list(self.spans)
+        for record in sorted(spans, key=lambda r: r["start"]):
+            row = table.setdefault(record["name"], {"stage": record["name"], "calls": 0, "seconds": 0.0,
+                                                    "rows": 0, "bytes": 0})
+            row["calls"] += 1
+            row["seconds"] += record["seconds"]
+            row["rows"] += record.get("rows") or 0
+            row["bytes"] += record.get("bytes") or 0
+        return list(table.values())
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda r: r["start"])
+            counters = dict(self.counters)
+        return {
+            "started": self.started,
+            "started_at": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+            "seconds": self.seconds if self.seconds is not None else time.perf_counter() - self._t0,
+            "stages": self.stages(),
+            "counters": counters,
+            "info": dict(self.info),
+            "spans": spans,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=1, default=str)
+
+
+def start(enabled=None):
+    """
+    Make a new RunMetrics the active run of this thread / context and return
+    it (None when disabled).
+    """
+    metrics = RunMetrics() if (ENABLED if enabled is None else enabled) else None
+    _active.set(metrics)
+    return metrics
+
+
+def stop():
+    """
+    Finish the active run; later spans and counts go nowhere.
+    """
+    metrics = _active.get()
+    if metrics is not None:
+        metrics.finish()
+    _active.set(None)
+
+
+@contextmanager
+def run(enabled=None):
+    """
+    start() for the block, restoring the previous run afterwards.
+    """
+    metrics = RunMetrics() if (ENABLED if enabled is None else enabled) else None
+    token = _active.set(metrics)
+    try:
+        yield metrics
+    finally:
+        if metrics is not None:
+            metrics.finish()
+        _active.reset(token)
+
+
+def current():
+    return _active.get()
+
+
+def span_in(metrics, name, **attrs):
+    """
+    metrics.span(name, ...), or the no-op span when `metrics` is None.
+    """
+    if metrics is None:
+        return NULL_SPAN
+    return metrics.span(name, **attrs)
+
+
+def span(name, **attrs):
+    return span_in(_active.get(), name, **attrs)
+
+
+def count(name, n=1):
+    metrics = _active.get()
+    if metrics is not None:
+        metrics.count(name, n)
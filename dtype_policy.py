@@ -0,0 +1,126 @@
+# dtype_policy.py
+"""
+Compact dtypes for parsed report frames.
+
+process_location tags every row with Brand/Dealer/Location/__source_file__
+and keeps all its input frames until the reports are built, so the dtypes
+they are parsed with decide the run's memory. compact() is applied to each
+frame right after it is read and tagged:
+
+  labels        Brand, Dealer, Location, __source_file__ -> category
+  repeated text string columns with at most CATEGORY_RATIO distinct values
+                per row (statuses, part types, H/K, ...) -> category;
+                date columns stay text so date parsing sees the raw strings
+  identifiers   other all-string columns (part / order / case numbers)
+                -> pyarrow-backed strings (NaN for missing, like object)
+  numbers       int64 -> int32 when every value fits; whole-number float64
+                (quantities with blanks) -> float32 when exact
+
+concat() keeps categoricals categorical across frames whose categories
+differ, where pd.concat would fall back to object. KIA_COMPACT_DTYPES=0
+turns the policy off.
+"""
+
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+
+ENABLED = os.getenv("KIA_COMPACT_DTYPES", "1").strip().lower() not in ("0", "false", "no")
+CATEGORY_RATIO = float(os.getenv("KIA_CATEGORY_RATIO", "0.5"))
+LABEL_COLUMNS = ("Brand", "Dealer", "Location", "__source_file__")
+
+_INT32 = np.iinfo(np.int32)
+_FLOAT32_EXACT = 2 ** 24  # every whole number below this is exact in float32
+
+
+def _arrow_string_dtype():
+    if importlib.util.find_spec("pyarrow") is None:
+        return None
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)   # pandas >= 2.3
+    except TypeError:
+        try:
+            return pd.api.types.pandas_dtype("string[pyarrow_numpy]")  # pandas 2.1 / 2.2
+        except TypeError:
+            return None
+
+
+STRING_DTYPE = _arrow_string_dtype()
+
+
+def compact(df):
+    """
+    `df` with the dtype policy applied to its columns (same values, same order).
+    """
+    if not ENABLED or df is None or df.empty:
+        return df
+    converted = {}
+    for col, duplicated in zip(df.columns, df.columns.duplicated(keep=False)):
+        if duplicated or not isinstance(col, str):
+            continue
+        s = compact_column(df[col], label=col in LABEL_COLUMNS, date="DATE" in col.upper())
+        if s is not None:
+            converted[col] = s
+    if not converted:
+        return df
+    out = df.copy(deep=False)
+    for col, s in converted.items():
+        out[col] = s
+    return out
+
+
+def compact_column(s, label=False, date=False):
+    """
+    Compacted copy of `s`, or None when the policy leaves it as is.
+    """
+    kind = s.dtype.kind
+    if kind == "i":
+        if s.dtype.itemsize > 4 and (s.empty or (s.min() >= _INT32.min and s.max() <= _INT32.max)):
+            return s.astype(np.int32)
+        return None
+    if kind == "f":
+        if s.dtype.itemsize > 4:
+            values = s.to_numpy()
+            finite = values[~np.isnan(values)]
+            if (np.abs(finite) < _FLOAT32_EXACT).all() and (finite == np.round(finite)).all():
+                return s.astype(np.float32)
+        return None
+    if isinstance(s.dtype, pd.CategoricalDtype) or not _is_text(s):
+        return None
+    if label or (not date and s.nunique() <= CATEGORY_RATIO * len(s)):
+        return s.astype("category")
+    if STRING_DTYPE is not None and s.dtype != STRING_DTYPE:
+        return s.astype(STRING_DTYPE)
+    return None
+
+
+def _is_text(s):
+    if isinstance(s.dtype, pd.StringDtype):
+        return True
+    return s.dtype == object and pd.api.types.infer_dtype(s, skipna=True) == "string"
+
+
+def concat(frames):
+    """
+    pd.concat(frames, ignore_index=True), keeping shared categorical columns
+    categorical (categories unioned in first-seen order).
+    """
+    frames = list(frames)
+    if len(frames) > 1:
+        shared = [c for c in frames[0].columns
+                  if all(c in f.columns and isinstance(f[c].dtype, pd.CategoricalDtype) for f in frames)]
+        mixed = [c for c in shared if any(not f[c].cat.categories.equals(frames[0][c].cat.categories)
+                                          for f in frames[1:])]
+        if mixed:
+            categories = {c: pd.Index(pd.concat([f[c].cat.categories.to_series() for f in frames]).unique())
+                          for c in mixed}
+            aligned = []
+            for f in frames:
+                f = f.copy(deep=False)
+                for c in mixed:
+                    f[c] = f[c].cat.set_categories(categories[c])
+                aligned.append(f)
+            frames = aligned
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,167 @@
+# excel_reader.py
+"""
+Pluggable .xlsx reader used by both read_file helpers.
+
+Engines, fastest first:
+  calamine  - Rust reader (python-calamine, pandas >= 2.2)
+  openpyxl  - pure-Python reader (always available)
+
+KIA_EXCEL_ENGINE selects one explicitly ("calamine" / "openpyxl"); the default
+"auto" uses calamine when it is installed. If the chosen engine fails on a
+file, the next engine is tried before the error is raised to the caller.
+
+`usecols` is a hashable column projection: a tuple of column positions, or a
+tuple of header names (names missing from the file are skipped).
+
+iter_excel_chunks() is the streaming alternative for very large sheets: it
+walks the first sheet with openpyxl read_only iter_rows and yields frames of
+at most KIA_STREAM_CHUNK_ROWS rows, built by the same TextParser step
+pd.read_excel ends with, so names and dtypes come out as a whole-sheet read
+would give them. KIA_STREAM_READS=1 makes process_location stream its BO LIST
+and Stock inputs this way.
+"""
+
+import os
+
+import pandas as pd
+
+ENGINES = ("calamine", "openpyxl")
+DEFAULT_ENGINE = os.getenv("KIA_EXCEL_ENGINE", "auto").strip().lower()
+STREAM_READS = os.getenv("KIA_STREAM_READS", "0").strip().lower() in ("1", "true", "yes")
+CHUNK_ROWS = int(os.getenv("KIA_STREAM_CHUNK_ROWS", "50000"))
+
+
+def _engine_available(engine):
+    if engine == "calamine":
+        try:
+            import python_calamine  # noqa: F401
+        except ImportError:
+            return False
+    return True
+
+
+def available_engines():
+    return [e for e in ENGINES if _engine_available(e)]
+
+
+def engine_order(engine=None):
+    """
+    Engines to try, in order, for the requested engine name.
+    """
+    engine = (engine or DEFAULT_ENGINE).lower()
+    if engine == "auto":
+        order = list(ENGINES)
+    elif engine in ENGINES:
+        order = [engine] + [e for e in ENGINES if e != engine]
+    else:
+        raise ValueError(f"Unknown Excel engine '{engine}', expected one of {('auto',) + ENGINES}")
+    return [e for e in order if e in available_engines()]
+
+
+def _usecols_arg(usecols):
+    if usecols is None:
+        return None
+    if all(isinstance(c, int) for c in usecols):
+        return list(usecols)
+    wanted = set(usecols)
+    return lambda name: name in wanted
+
+
+def select_columns(df, usecols):
+    """
+    The `usecols` projection of an already parsed frame (same as reading with it).
+    """
+    if usecols is None:
+        return df
+    if all(isinstance(c, int) for c in usecols):
+        return df.iloc[:, sorted(usecols)]
+    wanted = set(usecols)
+    return df[[c for c in df.columns if c in wanted]]
+
+
+def read_excel(source, header=None, engine=None, usecols=None, **kwargs):
+    """
+    pd.read_excel with engine selection and automatic fallback.
+    """
+    last_error = None
+    for eng in engine_order(engine):
+        try:
+            if hasattr(source, "seek"):
+                source.seek(0)
+            return pd.read_excel(source, header=header, engine=eng, usecols=_usecols_arg(usecols), **kwargs)
+        except Exception as e:
+            last_error = e
+            print(f"[excel_reader] {eng} failed, trying next engine: {e}")
+    raise last_error
+
+
+def _cell(value):
+    # as pandas' openpyxl reader converts cells: blanks -> "", whole floats -> int
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _trimmed(row):
+    row = [_cell(v) for v in row]
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+def iter_excel_chunks(source, header=0, usecols=None, chunk_rows=None):
+    """
+    Yield the first sheet of `source` (path or binary file) as DataFrames of at
+    most `chunk_rows` rows, parsed with openpyxl in read_only mode. Rows above
+    `header` are skipped and trailing blank rows dropped, as pd.read_excel
+    does. The width is fixed by the header row and the first chunk; cells past
+    it in later rows are ignored.
+    """
+    from openpyxl import load_workbook
+    from pandas.io.parsers import TextParser
+
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    if hasattr(source, "seek"):
+        source.seek(0)
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        ws.reset_dimensions()  # export tools write unreliable <dimension> tags
+        rows = ws.iter_rows(values_only=True)
+        names = None
+        for i, row in enumerate(rows):
+            if i == header:
+                names = _trimmed(row)
+                break
+        if names is None:
+            return
+
+        width = None
+        buffer, blanks = [], []
+        usecols_arg = _usecols_arg(usecols)
+
+        def parse(data):
+            nonlocal width
+            if width is None:
+                width = max([len(names)] + [len(r) for r in data])
+            head = names + [""] * (width - len(names))
+            data = [r[:width] + [""] * (width - len(r)) for r in data]
+            return TextParser([head] + data, header=0, usecols=usecols_arg, skip_blank_lines=False).read()
+
+        for row in rows:
+            row = _trimmed(row)
+            if not row:
+                blanks.append(row)  # kept only if data follows
+                continue
+            buffer.extend(blanks)
+            blanks.clear()
+            buffer.append(row)
+            if len(buffer) >= chunk_rows:
+                yield parse(buffer)
+                buffer = []
+        if buffer:
+            yield parse(buffer)
+    finally:
+        wb.close()
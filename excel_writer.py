@@ -0,0 +1,255 @@
+# excel_writer.py
+"""
+Streaming .xlsx writer for generated reports.
+
+Writers, fastest first:
+  xlsxwriter  - constant_memory mode, rows flushed to disk as written
+  openpyxl    - write-only workbook (always available)
+  pandas      - pd.ExcelWriter(engine="openpyxl"), the original full object model
+
+KIA_XLSX_WRITER selects one explicitly; the default "auto" uses xlsxwriter
+when it is installed. Rows are converted in chunks of KIA_XLSX_CHUNK so a
+large frame is never materialized as Python objects all at once. Cell values
+match DataFrame.to_excel(index=False): NaN/None/NaT blank, +-inf as "inf",
+header row bold/bordered/centered. The first sheet is the active one.
+"""
+
+import io
+import os
+import shutil
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+
+from zip_output import spooled_file
+
+WRITERS = ("xlsxwriter", "openpyxl", "pandas")
+DEFAULT_WRITER = os.getenv("KIA_XLSX_WRITER", "auto").strip().lower()
+CHUNK_ROWS = int(os.getenv("KIA_XLSX_CHUNK", "10000"))
+
+
+def _writer_available(writer):
+    if writer == "xlsxwriter":
+        try:
+            import xlsxwriter  # noqa: F401
+        except ImportError:
+            return False
+    return True
+
+
+def available_writers():
+    return [w for w in WRITERS if _writer_available(w)]
+
+
+def writer_order(writer=None):
+    """
+    Writers to try, in order, for the requested writer name.
+    """
+    writer = (writer or DEFAULT_WRITER).lower()
+    if writer == "auto":
+        order = list(WRITERS)
+    elif writer in WRITERS:
+        order = [writer] + [w for w in WRITERS if w != writer]
+    else:
+        raise ValueError(f"Unknown xlsx writer '{writer}', expected one of {('auto',) + WRITERS}")
+    return [w for w in order if w in available_writers()]
+
+
+def to_xlsx(sheets, writer=None):
+    """
+    Workbook bytes for [(sheet name, DataFrame), ...], written without index.
+    """
+    last_error = None
+    for name in writer_order(writer):
+        try:
+            book = XlsxStream([sheet_name for sheet_name, _ in sheets], writer=name)
+            for sheet_name, df in sheets:
+                book.append(sheet_name, df)
+            return book.close()
+        except Exception as e:
+            last_error = e
+            print(f"[excel_writer] {name} failed, trying next writer: {e}")
+    raise last_error
+
+
+def write_xlsx(sheets, fh, writer=None):
+    """
+    Stream the workbook for [(sheet name, DataFrame), ...] into the binary file `fh`
+    (no fallback: a partly written file cannot be retried).
+    """
+    book = XlsxStream([sheet_name for sheet_name, _ in sheets], writer=writer)
+    for sheet_name, df in sheets:
+        book.append(sheet_name, df)
+    book.save(fh)
+
+
+class XlsxStream:
+    """
+    Workbook built incrementally: append(sheet, df) writes the frame's rows
+    below what the sheet already holds (header taken from the first frame,
+    later frames aligned to it), close() returns the bytes. Sheets are
+    created up front, so their order - and the active first sheet - does not
+    depend on the order frames arrive in. The pandas writer only collects
+    frames and writes them, concatenated, on close.
+    """
+
+    def __init__(self, sheet_names, writer=None):
+        self.writer = writer_order(writer)[0]
+        self._book = _BOOKS[self.writer](sheet_names)
+        self._columns = {}
+
+    def append(self, sheet_name, df):
+        if self.writer == "pandas":
+            self._book.append(sheet_name, df)
+            return
+        if sheet_name not in self._columns:
+            self._columns[sheet_name] = list(df.columns)
+            if df.shape[1]:
+                self._book.header(sheet_name, [cell_value(c) for c in df.columns])
+        columns = self._columns[sheet_name]
+        if list(df.columns) != columns:
+            extra = [c for c in df.columns if c not in columns]
+            if extra:
+                raise ValueError(f"sheet {sheet_name!r}: columns {extra} not in header {columns}")
+            df = df.reindex(columns=columns)
+        self._book.rows(sheet_name, _rows(df))
+
+    def save(self, fh):
+        """Write the finished workbook into the binary file `fh`."""
+        self._book.save(fh)
+
+    def close(self):
+        buf = io.BytesIO()
+        self._book.save(buf)
+        return buf.getvalue()
+
+
+# ---------- values ----------
+def cell_value(value):
+    """Scalar as to_excel writes it (pandas' ExcelFormatter conversion)."""
+    if value is None or value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        if np.isnan(value):
+            return None
+        if np.isinf(value):
+            return "inf" if value > 0 else "-inf"
+        return float(value)
+    if isinstance(value, (timedelta, np.timedelta64)):
+        return pd.Timedelta(value).total_seconds() / 86400
+    if isinstance(value, np.datetime64):
+        return None if np.isnat(value) else pd.Timestamp(value)
+    if isinstance(value, (datetime, date, time)):
+        return value
+    return str(value)
+
+
+def _column(s):
+    """Column slice as a list of cell values."""
+    kind = s.dtype.kind
+    if kind in "iub" and not s.hasnans:
+        return s.tolist()
+    if kind == "f" and np.isfinite(s.to_numpy(dtype=float, na_value=np.nan)).all():
+        return s.tolist()
+    if kind == "M" or isinstance(s.dtype, pd.StringDtype):
+        return s.astype(object).where(s.notna(), None).tolist()
+    return [cell_value(v) for v in s.tolist()]
+
+
+def _rows(df):
+    for start in range(0, len(df), CHUNK_ROWS):
+        part = df.iloc[start:start + CHUNK_ROWS]
+        yield from zip(*(_column(part.iloc[:, i]) for i in range(part.shape[1])))
+
+
+# ---------- writers ----------
+class _XlsxwriterBook:
+    def __init__(self, sheet_names):
+        import xlsxwriter
+
+        # the package is zipped into a spooled file on close, then copied out
+        self._out = spooled_file()
+        self._wb = xlsxwriter.Workbook(self._out, {
+            "constant_memory": True,
+            "strings_to_numbers": False,
+            "strings_to_formulas": False,
+            "strings_to_urls": False,
+            "default_date_format": "yyyy-mm-dd hh:mm:ss",
+        })
+        self._header = self._wb.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+        self._sheets = {name: self._wb.add_worksheet(name) for name in sheet_names}
+        self._next = dict.fromkeys(sheet_names, 0)
+
+    def header(self, sheet_name, values):
+        self._sheets[sheet_name].write_row(0, 0, values, self._header)
+        self._next[sheet_name] = 1
+
+    def rows(self, sheet_name, rows):
+        ws, r = self._sheets[sheet_name], self._next[sheet_name]
+        for row in rows:
+            ws.write_row(r, 0, row)
+            r += 1
+        self._next[sheet_name] = r
+
+    def save(self, buf):
+        self._wb.worksheets()[0].activate()
+        self._wb.close()
+        self._out.seek(0)
+        shutil.copyfileobj(self._out, buf, 1024 * 1024)
+        self._out.close()
+
+
+class _OpenpyxlBook:
+    def __init__(self, sheet_names):
+        from openpyxl import Workbook
+
+        self._wb = Workbook(write_only=True)
+        self._sheets = {name: self._wb.create_sheet(name) for name in sheet_names}
+
+    def header(self, sheet_name, values):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Border, Font, Side
+
+        ws = self._sheets[sheet_name]
+        thin = Side(style="thin")
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.font = Font(bold=True)
+            cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+            cell.alignment = Alignment(horizontal="center", vertical="top")
+            cells.append(cell)
+        ws.append(cells)
+
+    def rows(self, sheet_name, rows):
+        ws = self._sheets[sheet_name]
+        for row in rows:
+            ws.append(row)
+
+    def save(self, buf):
+        self._wb.save(buf)
+
+
+class _PandasBook:
+    def __init__(self, sheet_names):
+        self._frames = {name: [] for name in sheet_names}
+
+    def append(self, sheet_name, df):
+        self._frames[sheet_name].append(df)
+
+    def save(self, buf):
+        with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+            for sheet_name, frames in self._frames.items():
+                df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+            writer.book.active = 0
+
+
+_BOOKS = {"xlsxwriter": _XlsxwriterBook, "openpyxl": _OpenpyxlBook, "pandas": _PandasBook}
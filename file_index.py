@@ -0,0 +1,46 @@
+# file_index.py
+"""
+Single-pass classification of a location's files by KIA report type.
+
+Every stage (missing-file check, validate_periods, validate_cross_sums,
+process_files) reads the same index, so a file is classified the same way
+everywhere: case-insensitive prefix match on the stripped name against the
+report_schemas prefixes ("receiving" and the common export typo "receving"
+both accepted), directories ignored.
+"""
+
+import os
+
+from report_schemas import SCHEMAS, schema_for
+
+# Report types in missing-file reporting order.
+REPORT_TYPES = list(SCHEMAS)
+
+
+def classify(file_name):
+    """
+    Report type of `file_name`, or None if it is not a KIA input.
+    """
+    schema = schema_for(file_name)
+    return schema.name if schema is not None else None
+
+
+def build_index(source, location_path):
+    """
+    {report type: [file names]} for one location; every type is present.
+    """
+    index = {t: [] for t in REPORT_TYPES}
+    for name in source.listdir(location_path):
+        rtype = classify(name)
+        if rtype is not None and source.isfile(os.path.join(location_path, name)):
+            index[rtype].append(name)
+    return index
+
+
+def iter_files(index):
+    """
+    (report type, file name) pairs of an index.
+    """
+    for rtype in REPORT_TYPES:
+        for name in index[rtype]:
+            yield rtype, name
@@ -0,0 +1,144 @@
+# input_specs.py
+"""
+What each report reads from its input workbooks.
+
+An InputSpec declares the report type of an input (report_schemas: header
+row, column names), the columns a report uses from it and the rows it keeps.
+load() asks the reader for just those columns (read_excel usecols: the other
+columns are never converted to Python values, cached or retained); read_file
+names them and coerces their dates and numbers by the schema. keep() applies
+the row filter - the 90/60-day cutoffs and the Stock PART TYPE category
+filter. Neither Excel engine can filter rows while parsing, so it runs on the
+projected frame right after the parse, before the frame is tagged, compacted
+and held for the rest of the location.
+
+stream() is the bounded-memory path for very large BO LIST / Stock sheets
+(KIA_STREAM_READS): the projection is parsed chunk by chunk
+(excel_reader.iter_excel_chunks) and every chunk is normalized and filtered
+before the next one is read, so only the kept rows outlive their chunk.
+
+Positional layouts (BO LIST, Receiving Detail) have two-row headers and are
+projected by position in their schema's header list. Named layouts (Stock,
+Transfer Detail) are projected by header name; a column missing from a file
+is simply not loaded.
+"""
+
+import itertools
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from excel_reader import iter_excel_chunks
+from report_schemas import SCHEMAS
+
+# Stock PART TYPE codes per category selection
+PART_TYPES = {"Spares": {"X", "Y"}, "Accessories": {"A"}}
+
+
+def day_cutoff(days, today=None):
+    """Midnight `days` days before today: date(x) >= cutoff day  <=>  x >= this; NaT compares False."""
+    return pd.Timestamp((today or datetime.today()) - timedelta(days=days)).normalize()
+
+
+def part_types(select_categories):
+    """PART TYPE codes kept for the selected categories, or None to keep every row."""
+    selected = set(select_categories or ())
+    if selected in ({"Spares"}, {"Accessories"}, {"Spares", "Accessories"}):
+        return set().union(*(PART_TYPES[c] for c in selected))
+    return None
+
+
+class InputSpec:
+    def __init__(self, rtype, columns, where=None):
+        """
+        `columns` are header names of report type `rtype`, located by position
+        in positional layouts. `where(df, **context)` returns the mask of rows
+        to keep.
+        """
+        self.schema = SCHEMAS[rtype]
+        self.header = self.schema.header
+        self.names = list(columns)
+        self.positional = self.schema.positional
+        self.usecols = self.schema.positions(columns) if self.positional else tuple(columns)
+        self.where = where
+
+    def load(self, read, file_path):
+        """
+        The projected frame of `file_path`; None / empty as `read` returned it.
+        """
+        df = read(file_path, header=self.header, usecols=self.usecols)
+        if df is not None and df.shape[1] == 0 and not self.positional:
+            # none of the columns in this file's header: read it whole, as before
+            df = read(file_path, header=self.header)
+        return df
+
+    def stream(self, file, chunk_rows=None, **context):
+        """
+        The kept rows of workbook `file` (path or binary file), read in chunks
+        of `chunk_rows`; load() + keep() without holding the whole sheet. None
+        when the sheet has no data rows.
+        """
+        usecols = self.usecols
+        chunks = iter_excel_chunks(file, header=self.header, usecols=usecols, chunk_rows=chunk_rows)
+        first = next(chunks, None)
+        if first is not None and first.shape[1] == 0 and not self.positional:
+            # none of the columns in this file's header: read it whole, as load() does
+            chunks.close()
+            usecols = None
+            chunks = iter_excel_chunks(file, header=self.header, chunk_rows=chunk_rows)
+            first = next(chunks, None)
+        if first is None:
+            return None
+        kept = [self.keep(self.schema.normalize(chunk, usecols), **context)
+                for chunk in itertools.chain([first], chunks)]
+        return pd.concat(kept, ignore_index=True)
+
+    def keep(self, df, **context):
+        if self.where is None or df is None or df.empty:
+            return df
+        mask = self.where(df, **context)
+        return df if mask is None or mask.all() else df[mask]
+
+
+def _recent(col, days):
+    return lambda df, today=None, **_: df[col] >= day_cutoff(days, today)
+
+
+def _part_type_in(df, select_categories=None, **_):
+    allowed = part_types(select_categories)
+    if allowed is None:
+        return None
+    return df['PART TYPE'].astype(str).str.strip().isin(allowed)
+
+
+# ---------- report inputs ----------
+BO_LIST = InputSpec(
+    "bo list",
+    columns=['ORDER NO', 'PART NO_CURRENT', 'QUANTITY_CURRENT', 'B/O', 'PO DATE',
+             'PROCESSING_ALLOCATION', 'PROCESSING_ON-PICK', 'PROCESSING_ON-PACK',
+             'PROCESSING_PACKED', 'PROCESSING_INVOICE', 'PROCESSING_SHIPPEO'],
+    where=_recent('PO DATE', 90),
+)
+
+RECEIVING_PENDING_DETAIL = InputSpec(
+    "receiving pending detail",
+    columns=['ORDER NO ', 'PART NO _SUPPLY', 'ACCEPT QTY', 'ORDER DATE'],
+    where=_recent('ORDER DATE', 60),
+)
+
+RECEIVING_TODAY_DETAIL = InputSpec(
+    "receiving today detail",
+    columns=['ORDER NO ', 'PART NO _SUPPLY', 'ACCEPT QTY', 'ORDER DATE'],
+    where=_recent('ORDER DATE', 60),
+)
+
+STOCK = InputSpec(
+    "stock",
+    columns=['PART NO ?', 'PART TYPE', 'ON-HAND'],
+    where=_part_type_in,
+)
+
+TRANSFER_DETAIL = InputSpec(
+    "transfer detail",
+    columns=['PART NO ?', 'QUANTITY'],
+)
@@ -0,0 +1,226 @@
+# kia_reports.py
+"""
+Headless batch entry point for the KIA report pipeline (cron, bulk runs).
+
+    python -m kia_reports run <zip-or-dir> --out <dir> [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+                          [--period Day|Week|Month|Quarter|Year] [--categories Spares,Accessories]
+                          [--workers N] [--strict] [--profile]
+
+Runs what the app runs after "Generate Reports" - ingest, missing-file check,
+validate_periods, validate_cross_sums, report generation - without importing
+Streamlit. The per-location workbooks and Combined_Dealerwise_Reports.zip are
+written to --out, next to the validation logs, run_summary.json (inputs,
+findings, per-stage timings) and run_diagnostics.json (every span and counter
+of the run, see diagnostics; KIA_DIAGNOSTICS=0 skips it). --profile adds
+kia_profile_<timestamp>.zip (run_profiler: pstats, collapsed stacks,
+tracemalloc per stage) and generates serially.
+
+Exit status:
+  0  reports written (missing files / period gaps are reported, as with
+     "Continue Anyway"; --strict turns them into a block)
+  1  blocked: List vs Detail quantity mismatches (or --strict findings);
+     nothing is generated
+  2  bad arguments or unreadable input
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+import zipfile
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import diagnostics
+import run_profiler
+
+EXIT_OK = 0
+EXIT_BLOCKED = 1
+EXIT_INPUT = 2
+
+
+@contextmanager
+def _stage(timings, name, profiler=None):
+    t0 = time.perf_counter()
+    try:
+        with diagnostics.span(name), run_profiler.stage(profiler, name):
+            yield
+    finally:
+        timings[name] = time.perf_counter() - t0
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD, got '{value}'")
+
+
+def _open_source(path):
+    from zip_ingest import DiskSource, ZipSource
+
+    if os.path.isdir(path):
+        return DiskSource(path)
+    if zipfile.is_zipfile(path):
+        return ZipSource(path)
+    raise ValueError(f"{path} is neither a directory nor a ZIP file")
+
+
+def _write_artifact(data, path):
+    with open(path, "wb") as fh:
+        if isinstance(data, (bytes, bytearray)):
+            fh.write(data)
+        else:
+            shutil.copyfileobj(data, fh, 1024 * 1024)
+
+
+def _log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def run(args):
+    from parse_cache import ParseCache
+    from report import COMBINED_ZIP, generate_reports, read_file
+    from validation import PERIOD_TYPES, missing_inputs, validate_cross_sums, validate_periods
+    from workbook_store import WorkbookStore
+
+    if args.start > args.end:
+        _log(f"--start {args.start} is after --end {args.end}")
+        return EXIT_INPUT
+    categories = [c.strip() for c in args.categories.split(",") if c.strip()]
+    os.makedirs(args.out, exist_ok=True)
+
+    timings = {}
+    summary = {
+        "input": os.path.abspath(args.input), "start": str(args.start), "end": str(args.end),
+        "period": args.period, "categories": categories, "timings": timings,
+    }
+    source = None
+    store = None
+    parse_cache = None
+    metrics = diagnostics.start()
+    profiler = None
+    if args.profile:
+        try:
+            profiler = run_profiler.RunProfiler().start()
+        except run_profiler.ProfilerBusy as e:
+            _log(f"warning: not profiling, {e}")
+    try:
+        with _stage(timings, "ingest", profiler):
+            try:
+                source = _open_source(args.input)
+                all_locations = source.locations()
+            except (OSError, ValueError, zipfile.BadZipFile) as e:
+                _log(f"cannot read input: {e}")
+                return EXIT_INPUT
+            missing_files = missing_inputs(all_locations, source=source)
+        _log(f"{len(all_locations)} locations, {len(missing_files)} missing input files")
+
+        # each workbook is parsed once and shared by validation + report generation
+        parse_cache = None if args.no_cache else ParseCache()
+        reader = (parse_cache.reader(read_file, source) if parse_cache is not None
+                  else lambda path, header=None, usecols=None: read_file(path, header=header, source=source,
+                                                                          usecols=usecols))
+        store = WorkbookStore(reader)
+
+        with _stage(timings, "validate_periods", profiler):
+            period_errors, period_log = validate_periods(all_locations, args.start, args.end,
+                                                         PERIOD_TYPES[args.period], store=store, source=source)
+        with _stage(timings, "validate_cross_sums", profiler):
+            qty_errors, qty_log = validate_cross_sums(all_locations, store=store, source=source)
+
+        period_log.to_csv(os.path.join(args.out, "period_validation.csv"), index=False)
+        qty_log.to_csv(os.path.join(args.out, "qty_mismatches.csv"), index=False)
+        summary.update(locations=len(all_locations), missing_files=missing_files,
+                       period_errors=period_errors, qty_mismatch_errors=qty_errors)
+        for msg in missing_files + period_errors:
+            _log(f"warning: {msg}")
+        for msg in qty_errors:
+            _log(f"BLOCKING: {msg}")
+
+        blocked = bool(qty_errors) or (args.strict and bool(missing_files or period_errors))
+        if blocked:
+            status = EXIT_BLOCKED
+            summary["outputs"] = []
+        else:
+            def progress(done, total, message):
+                _log(f"  {message}")
+
+            with _stage(timings, "generate", profiler):
+                result = generate_reports(all_locations, categories, store=store, parse_cache=parse_cache,
+                                          workers=args.workers, source=source, progress=progress,
+                                          serial=True if profiler is not None else None, metrics=metrics)
+            files = result["files"]
+            with _stage(timings, "write", profiler):
+                for name in files.names():
+                    _write_artifact(files.get(name), os.path.join(args.out, name))
+            summary.update(outputs=files.names(), report_errors=result["errors"],
+                           warnings=result["warnings"], invalid_names=result["invalid_names"])
+            for msg in result["errors"] + result["warnings"]:
+                _log(f"warning: {msg}")
+            if COMBINED_ZIP not in files:
+                _log("warning: no dealer reports generated - check the Brand/Dealer/Location folder structure")
+            status = EXIT_OK
+    finally:
+        if metrics is not None:
+            if parse_cache is not None:
+                metrics.info["parse_cache"] = parse_cache.stats(metrics)
+            if store is not None:
+                metrics.info["store"] = {"hits": store.hits, "misses": store.misses,
+                                         "peak_mb": round(store.peak_bytes / 1024 / 1024, 1)}
+        diagnostics.stop()
+        if profiler is not None:
+            profiler.stop()
+            if os.path.isdir(args.out):
+                _write_artifact(profiler.archive(), os.path.join(args.out, profiler.file_name()))
+        if store is not None:
+            store.clear()
+        if source is not None:
+            source.close()
+
+    summary["exit_status"] = status
+    with open(os.path.join(args.out, "run_summary.json"), "w") as fh:
+        json.dump(summary, fh, indent=1, default=str)
+    if metrics is not None:
+        with open(os.path.join(args.out, "run_diagnostics.json"), "w") as fh:
+            fh.write(metrics.to_json())
+
+    print(f"{'stage':<22}{'seconds':>10}")
+    for name, seconds in timings.items():
+        print(f"{name:<22}{seconds:>10.2f}")
+    print(f"{'total':<22}{sum(timings.values()):>10.2f}")
+    print("BLOCKED: quantity mismatches, no reports generated" if qty_errors else
+          "BLOCKED: validation findings (--strict)" if status == EXIT_BLOCKED else
+          f"{len(summary['outputs'])} files written to {args.out}")
+    return status
+
+
+def main(argv=None):
+    from validation import PERIOD_TYPES
+
+    parser = argparse.ArgumentParser(prog="python -m kia_reports", description="KIA report pipeline, headless")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    today = date.today()
+    p = sub.add_parser("run", help="validate an upload and generate its reports")
+    p.add_argument("input", help="uploaded KIA ZIP, or an extracted Brand/Dealer/Location tree")
+    p.add_argument("--out", required=True, help="output directory")
+    p.add_argument("--start", type=_date, default=today - timedelta(days=90), help="YYYY-MM-DD (default: 90 days ago)")
+    p.add_argument("--end", type=_date, default=today, help="YYYY-MM-DD (default: today)")
+    p.add_argument("--period", choices=list(PERIOD_TYPES), default="Day", help="validation period (default: Day)")
+    p.add_argument("--categories", default="Spares", help="comma-separated: Spares, Accessories, All")
+    p.add_argument("--workers", type=int, default=None, help="location processes (default KIA_WORKERS / all cores)")
+    p.add_argument("--strict", action="store_true", help="also block on missing files and period gaps")
+    p.add_argument("--no-cache", action="store_true",
+                   help="do not use the on-disk parse cache (reports are then generated serially)")
+    p.add_argument("--profile", action="store_true", help="write a cProfile / tracemalloc profile of the run")
+    p.set_defaults(func=run)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
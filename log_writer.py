@@ -0,0 +1,289 @@
+# log_writer.py
+"""
+Background writer for Log_user events.
+
+The page hands a run's rows to submit() and carries on; a daemon thread
+drains the bounded queue in batches through `write_fn`, which returns the
+rows it could not write. Failed rows are retried with exponential backoff.
+Rows lost to an error (write_fn raised) are then appended to a local JSONL
+spill file, which is replayed after the next successful write and when the
+writer starts, so events survive a DB outage and an app restart. Rows that
+write_fn still returns as failed after the last retry were rejected by the
+DB for their data; they go to a dead-letter file (<spill>.dead) instead and
+are never replayed, so one bad row cannot loop against the DB forever.
+A write_fn that raises TargetUnavailable (DB unreachable) skips the retries:
+its rows are spilled at once and a replay stops at the first such chunk.
+
+Spilled rows end up in Log_user, so the spill lives in a private per-user
+directory (private_files; spilling is off if it cannot be made private).
+Appends and the replay hand-over hold an OS lock on <spill>.lock, and only
+one process at a time replays (<spill>.replay.lock), so app processes on
+the same host neither lose nor double-insert each other's rows.
+
+    KIA_LOG_QUEUE        max queued rows (default 10000; overflow spills)
+    KIA_LOG_BATCH        rows per write (default 500)
+    KIA_LOG_RETRIES      write attempts before spilling (default 4)
+    KIA_LOG_SPILL        spill file (default <tmp>/kia_log-<uid>/spill.jsonl)
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from private_files import file_lock, private_dir, user_dir
+
+DEFAULT_QUEUE = int(os.getenv("KIA_LOG_QUEUE", "10000"))
+DEFAULT_BATCH = int(os.getenv("KIA_LOG_BATCH", "500"))
+DEFAULT_RETRIES = int(os.getenv("KIA_LOG_RETRIES", "4"))
+DEFAULT_SPILL = os.getenv("KIA_LOG_SPILL") or os.path.join(user_dir("kia_log"), "spill.jsonl")
+
+
+class TargetUnavailable(Exception):
+    """
+    Raised by a write_fn when the target cannot be reached; `rows` are the
+    rows it did not write (None: all of them).
+    """
+
+    def __init__(self, message="", rows=None):
+        super().__init__(message)
+        self.rows = rows
+
+
+def _count_lines(path):
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return sum(1 for _ in fh)
+    except OSError:
+        return 0
+
+
+class EventLogWriter:
+    def __init__(self, write_fn, max_queue=DEFAULT_QUEUE, batch_size=DEFAULT_BATCH,
+                 retries=DEFAULT_RETRIES, backoff=0.5, max_backoff=30.0, spill_path=DEFAULT_SPILL):
+        self.write_fn = write_fn
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.spill_path = spill_path
+        try:
+            private_dir(os.path.dirname(os.path.abspath(spill_path)))
+        except OSError as e:
+            print(f"[log_writer] spilling disabled, cannot use {spill_path}: {e}")
+            self.spill_path = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.written = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.dead_lettered = 0
+        self.flushes = 0
+        self.last_flush_s = None
+        self.total_flush_s = 0.0
+        # rows in the spill (+ interrupted replay) file, kept up to date instead of re-read
+        self.spill_pending = (_count_lines(spill_path) + _count_lines(spill_path + ".replay")
+                              if self.spill_path else 0)
+        self._thread = threading.Thread(target=self._run, name="kia-log-writer", daemon=True)
+        self._thread.start()
+
+    # ---------- public ----------
+    def submit(self, rows):
+        """
+        Queue rows without blocking; rows that don't fit go straight to the spill file.
+        """
+        overflow = []
+        for row in rows:
+            try:
+                self._queue.put_nowait(tuple(row))
+            except queue.Full:
+                overflow.append(row)
+        if overflow:
+            self._spill(overflow)
+
+    def flush(self, timeout=None):
+        """
+        Wait until every queued row has been written or spilled.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout=10.0):
+        self.flush(timeout)
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "written": self.written,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "spill_pending": self.spill_pending,
+            "dead_lettered": self.dead_lettered,
+            "flushes": self.flushes,
+            "last_flush_ms": None if self.last_flush_s is None else round(self.last_flush_s * 1000, 1),
+            "avg_flush_ms": round(self.total_flush_s / self.flushes * 1000, 1) if self.flushes else None,
+        }
+
+    # ---------- worker ----------
+    def _run(self):
+        self._replay()
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if self._write(batch):
+                    self._replay()
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, rows):
+        """
+        Write with retry/backoff; spill rows still failing on errors and
+        dead-letter rows still rejected. True if the target was reachable
+        (nothing spilled).
+        """
+        delay = self.backoff
+        pending = rows
+        for attempt in range(self.retries):
+            t0 = time.perf_counter()
+            unavailable = rejected = False
+            try:
+                failed = list(self.write_fn(pending))
+                rejected = True
+            except TargetUnavailable as e:
+                print(f"[log_writer] target unavailable, spilling: {e}")
+                failed = pending if e.rows is None else list(e.rows)
+                unavailable = True
+            except Exception as e:
+                print(f"[log_writer] write failed: {e}")
+                failed = pending
+            elapsed = time.perf_counter() - t0
+            self.flushes += 1
+            self.last_flush_s = elapsed
+            self.total_flush_s += elapsed
+            self.written += len(pending) - len(failed)
+            if not failed:
+                return True
+            pending = failed
+            if unavailable:
+                break
+            if attempt < self.retries - 1 and not self._stop.wait(delay):
+                delay = min(delay * 2, self.max_backoff)
+        if rejected:
+            self._dead_letter(pending)
+            return True
+        self._spill(pending)
+        return False
+
+    # ---------- spill ----------
+    @contextmanager
+    def _locked(self):
+        """Exclusive use of the spill files, across threads and processes."""
+        with self._spill_lock, file_lock(self.spill_path + ".lock"):
+            yield
+
+    def _spill(self, rows):
+        if self.spill_path is None:
+            print(f"[log_writer] dropping {len(rows)} events, spilling is disabled")
+            return
+        try:
+            with self._locked(), open(self.spill_path, "a", encoding="utf-8") as fh:
+                for row in rows:
+                    fh.write(json.dumps(list(row), default=str) + "\n")
+            self.spilled += len(rows)
+            self.spill_pending += len(rows)
+        except OSError as e:
+            print(f"[log_writer] dropping {len(rows)} events, cannot spill to {self.spill_path}: {e}")
+
+    def _dead_letter(self, rows):
+        if self.spill_path is None:
+            print(f"[log_writer] dropping {len(rows)} events rejected by the target, spilling is disabled")
+            return
+        path = self.spill_path + ".dead"
+        print(f"[log_writer] {len(rows)} events rejected by the target, kept in {path}")
+        try:
+            with self._locked(), open(path, "a", encoding="utf-8") as fh:
+                for row in rows:
+                    fh.write(json.dumps(list(row), default=str) + "\n")
+            self.dead_lettered += len(rows)
+        except OSError as e:
+            print(f"[log_writer] dropping {len(rows)} rejected events, cannot write {path}: {e}")
+
+    def _replay(self):
+        """
+        Write spilled rows back; rows failing on errors stay in the spill file,
+        rows the target rejects are dead-lettered. Skipped while another
+        process replays.
+        """
+        if self.spill_path is None:
+            return
+        try:
+            with file_lock(self.spill_path + ".replay.lock", blocking=False) as owner:
+                if owner:
+                    self._replay_owned()
+        except OSError as e:
+            print(f"[log_writer] cannot replay {self.spill_path}: {e}")
+
+    def _replay_owned(self):
+        replay_path = self.spill_path + ".replay"
+        with self._locked():
+            try:
+                if os.path.exists(self.spill_path):
+                    # appended so a leftover from an interrupted replay is kept
+                    with open(self.spill_path, encoding="utf-8") as src, \
+                            open(replay_path, "a", encoding="utf-8") as dst:
+                        dst.write(src.read())
+                    os.remove(self.spill_path)
+            except OSError as e:
+                print(f"[log_writer] cannot replay {self.spill_path}: {e}")
+                return
+        if not os.path.exists(replay_path):
+            return
+        with open(replay_path, encoding="utf-8") as fh:
+            rows = [tuple(json.loads(line)) for line in fh if line.strip()]
+        failed = []
+        rejected = []
+        for i in range(0, len(rows), self.batch_size):
+            chunk = rows[i:i + self.batch_size]
+            try:
+                chunk_rejected = list(self.write_fn(chunk))
+            except TargetUnavailable as e:
+                print(f"[log_writer] replay stopped, target unavailable: {e}")
+                failed.extend(chunk if e.rows is None else e.rows)
+                failed.extend(rows[i + self.batch_size:])
+                self.replayed += len(chunk) - (len(chunk) if e.rows is None else len(e.rows))
+                break
+            except Exception as e:
+                print(f"[log_writer] replay failed: {e}")
+                failed.extend(chunk)
+            else:
+                rejected.extend(chunk_rejected)
+                self.replayed += len(chunk) - len(chunk_rejected)
+        if rejected:
+            self._dead_letter(rejected)
+        with self._locked():
+            if failed:
+                with open(self.spill_path, "a", encoding="utf-8") as fh:
+                    for row in failed:
+                        fh.write(json.dumps(list(row), default=str) + "\n")
+            os.remove(replay_path)
+            # recounted: other processes on the host spill into the same file
+            self.spill_pending = _count_lines(self.spill_path)
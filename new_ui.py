@@ -1,5 +1,5 @@
 import streamlit as st
-from tbl import user_register, user_login, User_Exist, cursor
+from tbl import user_register, user_login, User_Exist
 import re
 
 def main():
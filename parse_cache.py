@@ -0,0 +1,214 @@
+# parse_cache.py
+"""
+Content-addressed on-disk cache of parsed input workbooks.
+
+Entries are keyed by the SHA-256 of the file bytes, the header row, the
+column projection (usecols), the report type the file name maps to (it
+decides how normalize_input names the columns) and SCHEMA_VERSION, so a "Continue Anyway" rerun or a re-upload of the same ZIP
+never parses an unchanged workbook twice. Frames are stored as Arrow IPC
+(feather) when they round-trip exactly, otherwise as a pickle. The cache
+directory is capped at KIA_PARSE_CACHE_MAX_MB and evicts least recently used
+entries first.
+
+A projected read (usecols) that misses falls back to the full-frame entry of
+the same bytes and header, when one exists, and cuts the columns from it the
+way WorkbookStore does, so workers reading a projection don't re-parse files
+that validation already cached whole.
+
+Entries are unpickled, so the directory must be private: it is created
+0700, per user (kia_parse_cache-<uid>), and the cache turns itself off when
+the directory is a symlink or belongs to someone else.
+"""
+
+import hashlib
+import importlib.util
+import os
+import tempfile
+
+import pandas as pd
+
+from report_schemas import schema_for
+
+import diagnostics
+from excel_reader import select_columns
+from private_files import private_dir, user_dir
+
+# feather backend; checked without importing so pyarrow loads on first write
+HAS_ARROW = importlib.util.find_spec("pyarrow") is not None
+
+# Bump whenever the way frames are parsed/normalized changes.
+SCHEMA_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.getenv("KIA_PARSE_CACHE_DIR") or user_dir("kia_parse_cache")
+DEFAULT_MAX_BYTES = int(os.getenv("KIA_PARSE_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+_EXTS = (".arrow", ".pkl")
+
+
+class ParseCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 schema_version=SCHEMA_VERSION):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.schema_version = schema_version
+        self.hits = 0
+        self.misses = 0
+        self.enabled = True
+        try:
+            private_dir(cache_dir)
+        except OSError as e:
+            print(f"[parse_cache] disabled, cannot use {cache_dir}: {e}")
+            self.enabled = False
+
+    # ---------- keys ----------
+    def key(self, path, header=None, source=None, usecols=None):
+        return self._key(self._content_hash(path, source), path, header, usecols)
+
+    @staticmethod
+    def _content_hash(path, source=None):
+        h = hashlib.sha256()
+        with (source.open(path) if source is not None else open(path, "rb")) as fh:
+            for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h
+
+    def _key(self, content, path, header, usecols):
+        """
+        Entry key from the hashed file bytes (`content`, left untouched) and the read options.
+        """
+        h = content.copy()
+        schema = schema_for(path.replace("\\", "/").rsplit("/", 1)[-1])
+        h.update(f"|header={header}|schema={self.schema_version}|type={schema.name if schema else None}".encode())
+        if usecols is not None:
+            h.update(f"|usecols={usecols!r}".encode())
+        return h.hexdigest()
+
+    # ---------- public ----------
+    def read(self, path, header, reader, source=None, usecols=None):
+        """
+        Return the cached frame for (file bytes, header, usecols), parsing with
+        `reader(path, header=..., source=..., usecols=...)` and storing the result on a miss.
+        A projection missing from the cache is cut from the full frame's entry if there is one.
+        """
+        def parse():
+            return reader(path, header=header, source=source, usecols=usecols)
+
+        if not self.enabled:
+            return parse()
+        try:
+            content = self._content_hash(path, source)
+        except OSError:
+            return parse()
+        digest = self._key(content, path, header, usecols)
+
+        df = self._load(digest)
+        if df is None and usecols is not None:
+            df = self._load(self._key(content, path, header, None))
+            try:
+                df = None if df is None else select_columns(df, usecols)
+            except IndexError:
+                df = None  # positions past the last column: let the reader report it
+        if df is not None:
+            self.hits += 1
+            diagnostics.count("parse_cache.hits")
+            return df
+
+        self.misses += 1
+        diagnostics.count("parse_cache.misses")
+        df = parse()
+        if isinstance(df, pd.DataFrame):
+            self._save(digest, df)
+        return df
+
+    def reader(self, read_fn, source=None):
+        """
+        `read_fn` bound to this cache and `source`, as a reader(path, header=..., usecols=...).
+        """
+        return lambda path, header=None, usecols=None: self.read(path, header, read_fn, source, usecols)
+
+    def stats(self, metrics=None):
+        """
+        Hits / misses of this process, or with `metrics` (a diagnostics.RunMetrics)
+        of the whole run: pool workers' lookups only reach the parent merged into it.
+        """
+        if metrics is not None:
+            return {"hits": metrics.counters.get("parse_cache.hits", 0),
+                    "misses": metrics.counters.get("parse_cache.misses", 0)}
+        return {"hits": self.hits, "misses": self.misses}
+
+    # ---------- storage ----------
+    def _entry(self, digest, ext):
+        return os.path.join(self.cache_dir, digest + ext)
+
+    def _load(self, digest):
+        for ext in _EXTS:
+            entry = self._entry(digest, ext)
+            if not os.path.exists(entry):
+                continue
+            try:
+                df = pd.read_feather(entry) if ext == ".arrow" else pd.read_pickle(entry)
+                os.utime(entry)  # LRU: mtime tracks last use
+                return df
+            except Exception as e:
+                print(f"[parse_cache] dropping unreadable entry {entry}: {e}")
+                self._remove(entry)
+        return None
+
+    def _save(self, digest, df):
+        tmp = None
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            os.close(fd)
+            ext = ".pkl"
+            if HAS_ARROW and self._write_arrow(df, tmp):
+                ext = ".arrow"
+            else:
+                df.to_pickle(tmp)
+            os.replace(tmp, self._entry(digest, ext))
+            tmp = None
+            self._evict()
+        except Exception as e:
+            print(f"[parse_cache] could not store entry: {e}")
+        finally:
+            if tmp:
+                self._remove(tmp)
+
+    @staticmethod
+    def _write_arrow(df, target):
+        """
+        Write feather only when it round-trips exactly (dtypes, None vs NaN,
+        column labels); mixed-type object columns fall back to pickle.
+        """
+        if not all(isinstance(c, str) for c in df.columns):
+            return False
+        try:
+            df.to_feather(target)
+            back = pd.read_feather(target)
+        except Exception:
+            return False
+        return back.equals(df) and list(back.columns) == list(df.columns) and back.dtypes.equals(df.dtypes)
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(_EXTS):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
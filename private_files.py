@@ -0,0 +1,76 @@
+# private_files.py
+"""
+Per-user local state (parse cache entries, the event-log spill).
+
+Both are read back later: cache entries are unpickled, spilled events are
+inserted into Log_user. So they never sit directly in the shared temp dir
+but in a directory of their own, created 0700 and checked to belong to the
+current user (and not to be a symlink). Processes sharing that state on one
+host coordinate through file_lock().
+"""
+
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+USER = str(os.getuid()) if hasattr(os, "getuid") else (os.getenv("USERNAME") or "user")
+
+
+def user_dir(name):
+    """<tmp>/<name>-<uid>: the default location of per-user state `name`."""
+    return os.path.join(tempfile.gettempdir(), f"{name}-{USER}")
+
+
+def private_dir(path):
+    """
+    Create `path` as a 0700 directory; OSError if it is a symlink, not a
+    directory, or owned by another user.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        return
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise OSError(f"{path} is not a directory")
+    if info.st_uid != os.getuid():
+        raise OSError(f"{path} is owned by uid {info.st_uid}, not {os.getuid()}")
+    if info.st_mode & 0o077:
+        os.chmod(path, 0o700)
+
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """
+    Hold an exclusive OS lock on `path` (created if missing) for the block.
+    Yields True, or False at once when `blocking` is off and another process
+    (or thread) holds it.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            else:
+                msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            if blocking:
+                raise
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
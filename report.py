@@ -1,464 +1,661 @@
-def process_files(validation_errors, all_locations, start_date, end_date, total_locations,
-                  progress_bar, status_text, select_categories):
+import os
+import multiprocessing
+import pickle
+import tempfile
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from excel_reader import STREAM_READS, read_excel
+from dtype_policy import compact, concat
+from input_specs import (BO_LIST as BO_LIST_SPEC, RECEIVING_PENDING_DETAIL, RECEIVING_TODAY_DETAIL,
+                         STOCK, TRANSFER_DETAIL, day_cutoff)
+from report_schemas import SCHEMAS, normalize_input
+from excel_writer import write_xlsx
+from dealer_reports import PLS_CHECK_EMPTY, DealerReports, pls_check_pairs
+from artifacts import ArtifactRegistry
+from zip_output import spooled_zip
+from zip_ingest import DiskSource
+from file_index import iter_files
+import diagnostics
+
+# ---------- parallelism ----------
+# KIA_WORKERS: process count for per-location report generation (default: all cores)
+# KIA_SERIAL=1: force the in-process serial path
+DEFAULT_WORKERS = int(os.getenv("KIA_WORKERS", "0")) or (os.cpu_count() or 1)
+DEFAULT_SERIAL = os.getenv("KIA_SERIAL", "").strip().lower() in ("1", "true", "yes")
+
+COMBINED_ZIP = "Combined_Dealerwise_Reports.zip"
+
+# For Stock: handle common header variants
+STOCK_PART_COLS = ["PART NO ?", "PART NO", "PART NO.", "PART_NO", "PART NUMBER", "PART_NUMBER"]
+STOCK_QTY_COLS  = ["ON-HAND", "ON HAND", "ONHAND", "ON_HAND", "QTY", "CLOSE_QTY"]
+
+
+# ---------- helpers ----------
+def display_name(file_path):
+    if "extracted_files/" in file_path:
+        return file_path.split("extracted_files/", 1)[1]
+    return os.path.basename(file_path)
+
+
+def read_file(file_path, header=None, source=None, usecols=None):
+    """
+    Parsed workbook, normalized by its report schema (names, dates, numerics).
+    """
+    with diagnostics.span("read", file=display_name(file_path), header=header) as span:
+        try:
+            if source is not None:
+                with source.open(file_path) as fh:
+                    df = read_excel(fh, header=header, usecols=usecols)
+            else:
+                df = read_excel(file_path, header=header, usecols=usecols)
+            df = normalize_input(file_path, df, header, usecols)
+            if span.active:
+                span.set(rows=len(df), bytes=(source or DiskSource()).getsize(file_path))
+            return df
+        except Exception as e:
+            print(f" read failed for {file_path}: {e}")
+            span.set(error=type(e).__name__)
+            return None
+
+# def read_file(file_path, header=None):
+#     try:
+#         lower = file_path.lower()
+#         if lower.endswith(".xlsx"):
+#             return pd.read_excel(file_path, header=header, engine="openpyxl")
+#         if lower.endswith(".xls"):
+#             try:
+#                 return pd.read_excel(file_path, header=header, engine="xlrd")
+#             except Exception:
+#                 return pd.read_excel(file_path, header=header, engine="openpyxl")
+#         # CSV / TXT best-effort
+#         try:
+#             return pd.read_csv(file_path, header=header, sep=None, engine="python",
+#                                on_bad_lines="skip", encoding="utf-8")
+#         except UnicodeDecodeError:
+#             return pd.read_csv(file_path, header=header, sep=None, engine="python",
+#                                on_bad_lines="skip", encoding="windows-1252")
+#     except Exception:
+#         return None
+
+def to_num(s):
+    return pd.to_numeric(s, errors="coerce").fillna(0)
+
+
+# BO LIST quantities still in the supply pipeline (summed into transit)
+BO_TRANSIT_COLS = ['B/O', 'PROCESSING_ALLOCATION', 'PROCESSING_ON-PICK', 'PROCESSING_ON-PACK',
+                   'PROCESSING_PACKED', 'PROCESSING_INVOICE']
+
+
+def oem_from_bo_list(frames, today=None):
+    """
+    OEM rows of the BO LIST frames: last 90 days by PO DATE, transit/Remark
+    computed column-wise ("Pls Check" rows carry QUANTITY_CURRENT as POQty).
+    """
+    oem = concat(frames)
+    # PO DATE / quantities are coerced on read (report_schemas)
+    oem_work = oem[oem['PO DATE'] >= day_cutoff(90, today)].copy()
+
+    # blanks count as 0
+    for c in BO_TRANSIT_COLS + ['PROCESSING_SHIPPEO', 'QUANTITY_CURRENT']:
+        if c in oem_work.columns:
+            oem_work[c] = oem_work[c].fillna(0)
+
+    transit = sum(oem_work.get(c, 0) for c in BO_TRANSIT_COLS)
+    oem_work['transit'] = transit
+    tf = oem_work.get('QUANTITY_CURRENT', 0).eq(oem_work.get('PROCESSING_SHIPPEO', 0))
+    oem_work['T/F'] = tf
+
+    # transit == 0 & T  -> Ok;  transit > 0 & F -> Ok;  transit == 0 & F -> Pls Check
+    pls_check = (transit == 0) & ~tf
+    ok = ((transit == 0) & tf) | ((transit > 0) & ~tf)
+    oem_work['Remark'] = np.select([ok, pls_check], ['Ok', 'Pls Check'], default=None)
+    oem_work['transit'] = oem_work['QUANTITY_CURRENT'].where(pls_check, transit)
+
+    oem_workf = oem_work[['Brand', 'Dealer', 'Location', 'ORDER NO', 'PART NO_CURRENT', 'PO DATE', 'transit', 'Remark']].copy()
+    oem_workf.rename(columns={
+        'ORDER NO': 'OrderNumber',
+        'PART NO_CURRENT': 'PartNumber',
+        'PO DATE': 'OrderDate',
+        'transit': 'POQty'
+    }, inplace=True)
+    return oem_workf
+
+
+def location_input_bytes(location_path, source):
+    return sum(source.getsize(os.path.join(location_path, file))
+               for _, file in iter_files(source.index(location_path)))
+
+
+# ---------- per location ----------
+def process_location(brand, dealer, location, location_path, select_categories, reader=None, source=None,
+                     stream=None):
+    """
+    Build the OEM / Stock / Pending reports of one location.
+
+    Runs without Streamlit so it can execute in a worker process. Returns
+    {"frames": name -> DataFrame, "workbooks": name -> [(sheet, DataFrame)],
+     "errors": [...], "warnings": [...]}. Workbooks are serialized by the
+    caller (generate_reports); frames are shared with them, not copied.
+
+    `stream=True` (default KIA_STREAM_READS) reads BO LIST and Stock chunk by
+    chunk straight from `source`, bypassing `reader`, so a very large sheet is
+    never held whole.
+    """
+    source = source or DiskSource()
+    reader = reader or (lambda path, header=None, usecols=None: read_file(path, header=header, source=source,
+                                                                          usecols=usecols))
+    frames = {}    # name -> DataFrame
+    workbooks = {} # name -> [(sheet name, DataFrame)], first sheet active
+    errors = []
+    warnings = []
+
+    def read(file_path, header=None, usecols=None):
+        if not file_path.lower().endswith('.xlsx'):
+            warnings.append(f"File not Excel Workbook and .xlsx extention For : {display_name(file_path)}")
+            return None
+        return reader(file_path, header=header, usecols=usecols)
+
+    # row filters of the input specs (cutoffs, Stock categories)
+    today = datetime.today()
+    keep = {"today": today, "select_categories": select_categories}
+
+    stream = STREAM_READS if stream is None else stream
+
+    def load(spec, file_path):
+        # kept rows of an input spec, or None when the file is unreadable / has no rows
+        if not stream:
+            df = spec.load(read, file_path)
+            return None if df is None or df.empty else spec.keep(df, **keep)
+        if not file_path.lower().endswith('.xlsx'):
+            warnings.append(f"File not Excel Workbook and .xlsx extention For : {display_name(file_path)}")
+            return None
+        with diagnostics.span("read", file=display_name(file_path), header=spec.header, streamed=True) as span:
+            try:
+                with source.open(file_path) as fh:
+                    df = spec.stream(fh, **keep)
+                if span.active and df is not None:
+                    span.set(rows=len(df), bytes=source.getsize(file_path))
+                return df
+            except Exception as e:
+                print(f" read failed for {file_path}: {e}")
+                span.set(error=type(e).__name__)
+                return None
 
-    import streamlit as st
-    import os
-    import io
-    import zipfile
-    import pandas as pd
-    from datetime import datetime, timedelta
-    from collections import defaultdict
-
-    # Keep DataFrame previews separate from downloadable file bytes
-    previews = {}  # name -> DataFrame
-    files = {}     # name -> excel bytes
-
-    # ---------- helpers ----------
-    def read_file(file_path,header=None):
-      if "extracted_files/" in file_path:
-          file_name = file_path.split("extracted_files/", 1)[1]
-      else:
-          file_name = os.path.basename(file_path)
-      try:
-          if file_path.lower().endswith('.xlsx'):
-              return pd.read_excel(file_path, header=header, engine='openpyxl')
-          else:
-              return st.warning(f"File not Excel Workbook and .xlsx extention For : {file_name}")
-      except Exception as e:
-          print(f" read failed for {file_path}: {e}")
-          return None               
-
-                    
-    # def read_file(file_path, header=None):
-    #     try:
-    #         lower = file_path.lower()
-    #         if lower.endswith(".xlsx"):
-    #             return pd.read_excel(file_path, header=header, engine="openpyxl")
-    #         if lower.endswith(".xls"):
-    #             try:
-    #                 return pd.read_excel(file_path, header=header, engine="xlrd")
-    #             except Exception:
-    #                 return pd.read_excel(file_path, header=header, engine="openpyxl")
-    #         # CSV / TXT best-effort
-    #         try:
-    #             return pd.read_csv(file_path, header=header, sep=None, engine="python",
-    #                                on_bad_lines="skip", encoding="utf-8")
-    #         except UnicodeDecodeError:
-    #             return pd.read_csv(file_path, header=header, sep=None, engine="python",
-    #                                on_bad_lines="skip", encoding="windows-1252")
-    #     except Exception:
-    #         return None
-
-    def to_num(s):
-        return pd.to_numeric(s, errors="coerce").fillna(0)
-
-    def normalize_excel_like_date(col):
-        num = pd.to_numeric(col, errors="coerce")
-        dt_excel = pd.to_datetime(num, unit="D", origin="1899-12-30", errors="coerce")
-        dt_fallback = pd.to_datetime(col, errors="coerce", dayfirst=True)
-        return dt_excel.combine_first(dt_fallback)
-
-    # For Stock: handle common header variants
-    STOCK_PART_COLS = ["PART NO ?", "PART NO", "PART NO.", "PART_NO", "PART NUMBER", "PART_NUMBER"]
-    STOCK_QTY_COLS  = ["ON-HAND", "ON HAND", "ONHAND", "ON_HAND", "QTY", "CLOSE_QTY"]
-
-    # ---------- per location ----------
-    for i, (brand, dealer, location, location_path) in enumerate(all_locations):
-        progress_bar.progress((i + 1) / max(total_locations, 1))
-        status_text.text(f"Generating reports for {location} ({i+1}/{total_locations})...")
-
-        BO_LIST = []
-        Stock_data = []
-        Receving_Pending_Detail = []
-        Receving_Today_Detail = []
-        Receving_Today_List = []
-        Receving_Pending_list = []
-        Transfer_List = []
-        Transfer_Detail = []
-
-        for file in os.listdir(location_path):
-            file_path = os.path.join(location_path, file)
-            if not os.path.isfile(file_path):
+    BO_LIST = []
+    Stock_data = []
+    Receving_Pending_Detail = []
+    Receving_Today_Detail = []
+    Receving_Today_List = []
+    Receving_Pending_list = []
+    Transfer_List = []
+    Transfer_Detail = []
+
+    for rtype, file in iter_files(source.index(location_path)):
+        file_path = os.path.join(location_path, file)
+       # st.write(file_path)        
+
+        # BO LIST (header row is the 2nd row -> header=1), only the OEM columns
+        if rtype == "bo list":
+            bo_df = load(BO_LIST_SPEC, file_path)
+            #st.write(bo_df.head(2))
+            if bo_df is None:
+                errors.append(f"{location}: Unable to read BO LIST -> {file}")
                 continue
-           # st.write(file_path)        
-            fl = file.lower().strip()
-
-            # BO LIST (header row is the 2nd row -> header=1)
-            if fl.startswith("bo list"):
-                custom_headers = [
-                    'ORDER NO', 'LINE', 'PART NO_ORDER', 'PART NO_CURRENT', 'PART NAME',
-                    'PARTSOURCE', 'QUANTITY_ORDER', 'QUANTITY_CURRENT', 'B/O', 'PO DATE',
-                    'PDC', 'ETA', 'MSG', 'PROCESSING_ALLOCATION', 'PROCESSING_ON-PICK',
-                    'PROCESSING_ON-PACK', 'PROCESSING_PACKED', 'PROCESSING_INVOICE',
-                    'PROCESSING_SHIPPEO', 'LOST QTY', 'ELAP'
-                ]
-                bo_df = read_file(file_path, header=1)
-                try:
-                    bo_df.columns = custom_headers
-                    #[:bo_df.shape[1]]
-                except:
-                    #bo_df = pd.concat(pd.read_html(file_path, header=1), ignore_index=True)
-                    bo_df.columns = custom_headers
-                    #[:bo_df.shape[1]]
-                bo_df['PO DATE'] = normalize_excel_like_date(bo_df['PO DATE'])
-                #st.write(bo_df.head(2))
-                if bo_df is None or bo_df.empty:
-                    validation_errors.append(f"{location}: Unable to read BO LIST -> {file}")
-                    continue
-                bo_df.columns = custom_headers
-                #[:bo_df.shape[1]]
 
-                required_cols = ['ORDER NO', 'PART NO_CURRENT', 'PO DATE', 'QUANTITY_CURRENT', 'PROCESSING_ALLOCATION']
-                missing = [c for c in required_cols if c not in bo_df.columns]
-                if missing:
-                    validation_errors.append(f"{location}: BO LIST missing columns - {', '.join(missing)}")
-                    continue
-
-                bo_df['__source_file__'] = file
-                bo_df['Brand'] = brand
-                bo_df['Dealer'] = dealer
-                bo_df['Location'] = location
-                BO_LIST.append(bo_df)
+            missing = BO_LIST_SPEC.schema.missing(bo_df)
+            if missing:
+                errors.append(f"{location}: BO LIST missing columns - {', '.join(missing)}")
                 continue
 
-            # STOCK
-            if fl.startswith("stock"):
-                sd = read_file(file_path, header=0)
+            bo_df['__source_file__'] = file
+            bo_df['Brand'] = brand
+            bo_df['Dealer'] = dealer
+            bo_df['Location'] = location
+            BO_LIST.append(compact(bo_df))
+            continue
+
+        # STOCK
+        if rtype == "stock":
+            sd = load(STOCK, file_path)
+            if sd is None:
+                with source.open(file_path) as fh:
+                    sd = pd.concat(pd.read_html(fh, header=STOCK.header), ignore_index=True)
                 if sd is None or sd.empty:
-                    sd = pd.concat(pd.read_html(file_path, header=0), ignore_index=True)
-                    if sd is None or sd.empty:
-                        validation_errors.append(f"{location}: Unable to read Stock -> {file}")
-                        continue
-                sd['Brand'] = brand
-                sd['Dealer'] = dealer
-                sd['Location'] = location
-                sd['__source_file__'] = file
-                Stock_data.append(sd)
+                    errors.append(f"{location}: Unable to read Stock -> {file}")
+                    continue
+                sd = STOCK.keep(sd, **keep)
+            sd['Brand'] = brand
+            sd['Dealer'] = dealer
+            sd['Location'] = location
+            sd['__source_file__'] = file
+            Stock_data.append(compact(sd))
+            
+
+        # RECEIVING PENDING DETAIL (header=1)
+        if rtype == "receiving pending detail":
+            df = RECEIVING_PENDING_DETAIL.load(read, file_path)
+            # if df is None or df.empty:
+            #     df = pd.concat(pd.read_html(file_path, header=1), ignore_index=True)
                 
+            if df is None or df.empty:
+                errors.append(f"{location}: Unable to read Receiving Pending Detail -> {file}")
+                continue
+            df = RECEIVING_PENDING_DETAIL.keep(df, **keep)
+            df['__source_file__'] = file
+            df['Brand'] = brand
+            df['Dealer'] = dealer
+            df['Location'] = location
+            Receving_Pending_Detail.append(compact(df))
+            continue
+
+        # RECEIVING PENDING LIST (header=2)
+        if rtype == "receiving pending list":
+            schema = SCHEMAS[rtype]
+            df = read(file_path, header=schema.header)
+            if df is None or df.empty:
+                with source.open(file_path) as fh:
+                    df = pd.concat(pd.read_html(fh, header=schema.header), ignore_index=True)
+                if df is None or df.empty:
+                    errors.append(f"{location}: Unable to read Receiving Pending List -> {file}")
+                    continue
+                df = schema.normalize(df)
+            df['__source_file__'] = file
+            df['Brand'] = brand
+            df['Dealer'] = dealer
+            df['Location'] = location
+            Receving_Pending_list.append(compact(df))
+            continue
 
-            # RECEIVING PENDING DETAIL (header=1)
-            if fl.startswith("receiving pending detail"):
-                cols = ['SEQ','CASE NO ','ORDER NO ','LINE NO','PART NO _SUPPLY','PART NO _ORDER','H/K','PART NAME',
-                        'SUPPLY QTY','ORDER QTY','ACCEPT QTY','CLAIM QTY','CLAIM TYPE','CLAIM CODE','LOC','LIST PRICE',
-                        'NDP (UNIT)','ED (UNIT)','MAT VALUE','DEPOT S/C','VOR S/C','OTHER CHARGES','STAX(%)','CTAX(%)',
-                        'ITAX(%)','TAX(%)','HSN CODE','TAX AMT','FRT/INS','SGST AMT','CGST AMT','IGST AMT','COMP CESS AMT',
-                        'LANDED COST','ORDER DATE','RECEIVING DATE','STATUS']
-                df = read_file(file_path, header=1)
-                # if df is None or df.empty:
-                #     df = pd.concat(pd.read_html(file_path, header=1), ignore_index=True)
-                    
+        # RECEIVING TODAY LIST (header=2)
+        if rtype == "receiving today list":
+            schema = SCHEMAS[rtype]
+            df = read(file_path, header=schema.header)
+            if df is  None or  df.empty:
+                with source.open(file_path) as fh:
+                    df = pd.concat(pd.read_html(fh, header=schema.header), ignore_index=True)
                 if df is None or df.empty:
-                    validation_errors.append(f"{location}: Unable to read Receiving Pending Detail -> {file}")
+                    errors.append(f"{location}: Unable to read Receiving Today List -> {file}")
                     continue
-                df.columns = cols[:df.shape[1]]
-                df['ORDER DATE'] = normalize_excel_like_date(df['ORDER DATE'])
+                df = schema.normalize(df)
                 df['__source_file__'] = file
                 df['Brand'] = brand
                 df['Dealer'] = dealer
                 df['Location'] = location
-                Receving_Pending_Detail.append(df)
-                continue
+                Receving_Today_List.append(compact(df))
+            continue
 
-            # RECEIVING PENDING LIST (header=2)
-            if fl.startswith("receiving pending list"):
-                cols = ['SEQ','H/K','GR_NO','GR_TYPE','GR_STATUS','INVOICE_NO','INVOICE_DATE','SHIPPED INFORMATION_SUPPLIER',
-                        'SHIPPED INFORMATION_TRUCK NO','SHIPPED INFORMATION_CARRIER NAME','SHIPPED INFORMATION_FINISH DATE',
-                        'SHIPPED INFORMATION_ACCEPT QTY','SHIPPED INFORMATION_CLAIM QTY','SHIPPED INFORMATION_MAT VALUE',
-                        'SHIPPED INFORMATION_FREIGHT AMT','SHIPPED INFORMATION_SGST AMT','SHIPPED INFORMATION_IGST AMT',
-                        'SHIPPED INFORMATION_TCS AMT','SHIPPED INFORMATION_TAX AMOUNT']
-                df = read_file(file_path, header=2)
-                if df is None or df.empty:
-                    df = pd.concat(pd.read_html(file_path, header=2), ignore_index=True)
-                    if df is None or df.empty:
-                        validation_errors.append(f"{location}: Unable to read Receiving Pending List -> {file}")
-                        continue
-                df.columns = cols[:df.shape[1]]
+        # RECEIVING TODAY DETAIL (header=1)
+        if rtype == "receiving today detail":
+            df = RECEIVING_TODAY_DETAIL.load(read, file_path)
+            if df is None:
+              with source.open(file_path) as fh:
+                  df = pd.concat(pd.read_html(fh, header=RECEIVING_TODAY_DETAIL.header), ignore_index=True)
+              df = RECEIVING_TODAY_DETAIL.schema.normalize(df)
+              
+            df = RECEIVING_TODAY_DETAIL.keep(df, **keep)
+            if df is not None and not df.empty:
+              #  df.columns = cols[:df.shape[1]]
                 df['__source_file__'] = file
                 df['Brand'] = brand
                 df['Dealer'] = dealer
                 df['Location'] = location
-                Receving_Pending_list.append(df)
-                continue
+                Receving_Today_Detail.append(compact(df))
+            continue
 
-            # RECEIVING TODAY LIST (header=2)
-            if fl.startswith("receiving today list"):
-                cols = ['SEQ','H/K','GR_NO','GR_TYPE','GR_STATUS','INVOICE_NO','INVOICE_DATE','SHIPPED INFORMATION_SUPPLIER',
-                        'SHIPPED INFORMATION_TRUCK NO','SHIPPED INFORMATION_CARRIER NAME','SHIPPED INFORMATION_FINISH DATE',
-                        'SHIPPED INFORMATION_ACCEPT QTY','SHIPPED INFORMATION_CLAIM QTY','SHIPPED INFORMATION_MAT VALUE',
-                        'SHIPPED INFORMATION_FREIGHT AMT','SHIPPED INFORMATION_SGST AMT','SHIPPED INFORMATION_IGST AMT',
-                        'SHIPPED INFORMATION_TCS AMT','SHIPPED INFORMATION_TAX AMOUNT']
-                df = read_file(file_path, header=2)
-                if df is  None or  df.empty:
-                    df = pd.concat(pd.read_html(file_path, header=2), ignore_index=True)
-                    if df is None or df.empty:
-                        validation_errors.append(f"{location}: Unable to read Receiving Today List -> {file}")
-                        continue
-                    df.columns = cols[:df.shape[1]]
-                    df['__source_file__'] = file
-                    df['Brand'] = brand
-                    df['Dealer'] = dealer
-                    df['Location'] = location
-                    Receving_Today_List.append(df)
-                continue
+            # if df is  None or  df.empty:
+            #     df = pd.concat(pd.read_html(file_path, header=1), ignore_index=True)
+            #     if df is None or df.empty:
+            #         errors.append(f"{location}: Unable to read Receiving Today Detail -> {file}")
+            #         continue    
+            # try:
+            #   df.columns = cols[:df.shape[1]]
+            #   df['ORDER DATE'] = normalize_excel_like_date(df['ORDER DATE'])
+            #   df['__source_file__'] = file
+            #   df['Brand'] = brand
+            #   df['Dealer'] = dealer
+            #   df['Location'] = location
+            #   Receving_Today_Detail.append(df)
+            # except:
+            #   st.write('Recv today details not found')
+            #   pass
+            # continue
+
+        # TRANSFER LIST (header=1)
+        if rtype == "transfer list":
+            schema = SCHEMAS[rtype]
+            df = read(file_path, header=schema.header)
+            if df is  None or  df.empty:
+                with source.open(file_path) as fh:
+                    df = pd.concat(pd.read_html(fh, header=schema.header), ignore_index=True)
+                if df is None or df.empty:
+                    errors.append(f"{location}: Unable to read Transfer List -> {file}")
+                    continue
+                df = schema.normalize(df)
+                df['__source_file__'] = file
+                df['Brand'] = brand
+                df['Dealer'] = dealer
+                df['Location'] = location
+                Transfer_List.append(compact(df))
+            continue
 
-            # RECEIVING TODAY DETAIL (header=1)
-            if fl.startswith("receiving today detail"):
-                cols = ['SEQ','CASE NO ','ORDER NO ','LINE NO','PART NO _SUPPLY','PART NO _ORDER','H/K','PART NAME',
-                        'SUPPLY QTY','ORDER QTY','ACCEPT QTY','CLAIM QTY','CLAIM TYPE','CLAIM CODE','LOC','LIST PRICE',
-                        'NDP (UNIT)','ED (UNIT)','MAT VALUE','DEPOT S/C','VOR S/C','OTHER CHARGES','STAX(%)','CTAX(%)',
-                        'ITAX(%)','TAX(%)','HSN CODE','TAX AMT','FRT/INS','SGST AMT','CGST AMT','IGST AMT','COMP CESS AMT',
-                        'LANDED COST','ORDER DATE','RECEIVING DATE','STATUS']
-                df = read_file(file_path, header=1)
-                try:
-                  df.columns = cols[:df.shape[1]]
-                except:
-                  df = pd.concat(pd.read_html(file_path, header=1),ignore_index=True)
-                  
-                if df is not None and not df.empty:
-                  #  df.columns = cols[:df.shape[1]]
-                    df['__source_file__'] = file
-                    df['Brand'] = brand
-                    df['Dealer'] = dealer
-                    df['Location'] = location
-                    Receving_Today_Detail.append(df)
-                continue
+        # TRANSFER DETAIL (header=0)
+        if rtype == "transfer detail":
+            df = TRANSFER_DETAIL.load(read, file_path)
+            if df is  None or  df.empty:
+                with source.open(file_path) as fh:
+                    df = pd.concat(pd.read_html(fh, header=TRANSFER_DETAIL.header), ignore_index=True)
+                if df is None or df.empty:
+                    errors.append(f"{location}: Unable to read Transfer Detail -> {file}")
+                    continue
+                df = TRANSFER_DETAIL.schema.normalize(df)
+            if df is not None and not df.empty:
+              df['__source_file__'] = file
+              df['Brand'] = brand
+              df['Dealer'] = dealer
+              df['Location'] = location
+              Transfer_Detail.append(compact(df))
+            else:
+                warnings.append(f"{location}: Transfer Detail is empty -> {file}")  
+            #continue
+
+  
+    # ---------- REPORT GEN ----------
+    frames_for_oem = []
+
+    # BO LIST → last 90 days; compute transit/T/F/Remark
+    if BO_LIST:
+        frames_for_oem.append(oem_from_bo_list(BO_LIST, today=today))
+
+    # Receiving Pending Detail → last 60 days (cut per file by RECEIVING_PENDING_DETAIL)
+    if Receving_Pending_Detail:
+        rpd = concat(Receving_Pending_Detail)
+        rpdw = rpd[['Brand', 'Dealer', 'Location', 'ORDER NO ', 'PART NO _SUPPLY', 'ORDER DATE', 'ACCEPT QTY', '__source_file__']]
+        rpdw.rename(columns={
+            'ORDER NO ': 'OrderNumber',
+            'PART NO _SUPPLY': 'PartNumber',
+            'ORDER DATE': 'OrderDate',
+            'ACCEPT QTY': 'POQty',
+            '__source_file__': 'Remark'
+        }, inplace=True)
+        frames_for_oem.append(rpdw)
+
+    # Receiving Today Detail → last 60 days (cut per file by RECEIVING_TODAY_DETAIL)
+    if Receving_Today_Detail:
+        rtd = concat(Receving_Today_Detail)
+        rtdw = rtd[['Brand', 'Dealer', 'Location', 'ORDER NO ', 'PART NO _SUPPLY', 'ORDER DATE', 'ACCEPT QTY', '__source_file__']]
+        rtdw.rename(columns={
+            'ORDER NO ': 'OrderNumber',
+            'PART NO _SUPPLY': 'PartNumber',
+            'ORDER DATE': 'OrderDate',
+            'ACCEPT QTY': 'POQty',
+            '__source_file__': 'Remark'
+        }, inplace=True)
+        frames_for_oem.append(rtdw)
+
+    # Save OEM_{...}.xlsx (Hyundai unified)
+    # if frames_for_oem:
+    #     key_oem = f"OEM_{brand}_{dealer}_{location}.xlsx"
+    #     oem_final = pd.concat(frames_for_oem, ignore_index=True)
+    #     oem_final['PartNumber']  = oem_final['PartNumber'].astype(str).str.strip().replace('-','').replace('.','')
+        
+    #     oem_final['OEMInvoiceNo']=''
+    #     oem_final['OEMInvoiceDate']=''
+    #     oem_final['OEMInvoiceQty']=''
+    #     oem_final['OrderDate'] = pd.to_datetime(oem_final['OrderDate'], errors='coerce')
+    #     oem_final['OrderDate'] = oem_final['OrderDate'].dt.strftime('%d %b %Y')
+    #     oem_c = oem_final[oem_final['Remark']=='Pls Check'][['Location','OrderNumber']].drop_duplicates()
+    #     # Preview for UI & for dealerwise ZIP
+    #     previews[key_oem] = oem_final.copy()
+
+    #     # Build Excel with two sheets (sheet1: summary of "Pls Check", sheet2: full)
+    #     excel_buffer = io.BytesIO()
+    #     with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
+    #         #oem_c = oem_final[oem_final['Remark']=='Pls Check'][['Location','OrderNumber']].drop_duplicates()
+    #         oem_c.reset_index(drop=True).to_excel(writer, sheet_name='sheet1', index=False)
+    #         oem_final.reset_index(drop=True).to_excel(writer, sheet_name='sheet2', index=False)
+    #     files[key_oem] = excel_buffer.getvalue()
+
+    # Save OEM_{...}.xlsx (Hyundai unified)
+    if frames_for_oem:
+        key_oem = f"OEM_{brand}_{dealer}_{location}.xlsx"
+        oem_final = concat(frames_for_oem)
+    
+        # CLEAN: remove - and . safely
+        oem_final['PartNumber'] = (
+            oem_final['PartNumber'].astype(str).str.strip().str.replace(r'[\-.]', '', regex=True)
+        )
+    
+        oem_final['OEMInvoiceNo'] = ''
+        oem_final['OEMInvoiceDate'] = ''
+        oem_final['OEMInvoiceQty'] = ''
+        oem_final['OrderDate'] = pd.to_datetime(oem_final['OrderDate'], errors='coerce').dt.strftime('%d %b %Y')
+    
+        # Preview for UI & for dealerwise ZIP
+        frames[key_oem] = oem_final
+    
+        # Build Excel with two sheets: Summary (Pls Check) + FullData
+        summary = pls_check_pairs(oem_final)
+        # keep a visible row even if empty (optional)
+        if summary.empty:
+            summary = pd.DataFrame([PLS_CHECK_EMPTY])
 
-                # if df is  None or  df.empty:
-                #     df = pd.concat(pd.read_html(file_path, header=1), ignore_index=True)
-                #     if df is None or df.empty:
-                #         validation_errors.append(f"{location}: Unable to read Receiving Today Detail -> {file}")
-                #         continue    
-                # try:
-                #   df.columns = cols[:df.shape[1]]
-                #   df['ORDER DATE'] = normalize_excel_like_date(df['ORDER DATE'])
-                #   df['__source_file__'] = file
-                #   df['Brand'] = brand
-                #   df['Dealer'] = dealer
-                #   df['Location'] = location
-                #   Receving_Today_Detail.append(df)
-                # except:
-                #   st.write('Recv today details not found')
-                #   pass
-                # continue
-
-            # TRANSFER LIST (header=1)
-            if fl.startswith("transfer list"):
-                cols = ['TRANSFER NO','REQ.DATE','REQ.TIME','SEND DATE','SEND.TIME','RECE.DATE','RECE.TIME','REQU.DEALER',
-                        'SEND DEALER','ITEM_REQ','ITEM_SEND','QUANTITY_REQ','QUANTITY_SEND','AMOUNT','AMOUNT2','TAXABLE AMT',
-                        'SGST AMT','CGST AMT','IGST AMT','COMP CESS AMT','STATUS']
-                df = read_file(file_path, header=1)
-                if df is  None or  df.empty:
-                    df = pd.concat(pd.read_html(file_path, header=1), ignore_index=True)
-                    if df is None or df.empty:
-                        validation_errors.append(f"{location}: Unable to read Transfer List -> {file}")
-                        continue
-                    df.columns = cols[:df.shape[1]]
-                    df['__source_file__'] = file
-                    df['Brand'] = brand
-                    df['Dealer'] = dealer
-                    df['Location'] = location
-                    Transfer_List.append(df)
-                continue
+        # first sheet (Summary) is the active one
+        workbooks[key_oem] = [('Check Order status', summary), ('sheet1', oem_final)]
 
-            # TRANSFER DETAIL (header=0)
-            if fl.startswith("transfer detail"):
-                df = read_file(file_path, header=0)
-                if df is  None or  df.empty:
-                    df = pd.concat(pd.read_html(file_path, header=0), ignore_index=True)
-                    if df is None or df.empty:
-                        validation_errors.append(f"{location}: Unable to read Transfer Detail -> {file}")
-                        continue
-                if df is not None and not df.empty:
-                  df['__source_file__'] = file
-                  df['Brand'] = brand
-                  df['Dealer'] = dealer
-                  df['Location'] = location
-                  Transfer_Detail.append(df)
+    
+    # Save Stock_{...}.xlsx
+    if Stock_data:
+        key_stock = f"Stock_{brand}_{dealer}_{location}.xlsx"
+        stock_df = concat(Stock_data)
+        #stock_df['PART NO ?']  = stock_df['PART NO ?'].astype(str).str.strip().replace('.','').replace('-','')
+        stock_df['PART NO ?'] = (stock_df['PART NO ?'].astype(str).str.strip().str.replace('.', '', regex=False).str.replace('-', '', regex=False))
+        # PART TYPE category filter applied per file (STOCK spec)
+
+        # Final selection
+        stock_final = stock_df[['Brand', 'Dealer', 'Location', 'PART NO ?', 'ON-HAND']].rename(
+            columns={'PART NO ?': 'Partnumber', 'ON-HAND': 'Qty'}
+        )
+        frames[key_stock] = stock_final
+        workbooks[key_stock] = [("Sheet1", stock_final)]
+
+    # Pending (from Transfer_Detail minimal subset) -> Pending_{...}.xlsx
+    if Transfer_Detail:
+        tr = concat(Transfer_Detail)
+        # Only add if expected columns exist
+        needed_cols = {'PART NO ?', 'QUANTITY'}
+        if needed_cols.issubset(set(tr.columns)):
+            tr_Df = tr[['Brand','Dealer','Location','PART NO ?','QUANTITY']].copy()
+            tr_Df['PART NO ?'] = tr_Df['PART NO ?'].astype(str).str.strip()
+            tr_Df.rename(columns={'PART NO ?':'PartNumber','QUANTITY':'Qty'}, inplace=True)
+            key_pending = f"Pending_{brand}_{dealer}_{location}.xlsx"
+            frames[key_pending] = tr_Df
+            workbooks[key_pending] = [("Sheet1", tr_Df)]
+
+    return {"frames": frames, "workbooks": workbooks, "errors": errors, "warnings": warnings}
+
+
+def _location_worker(brand, dealer, location, location_path, select_categories, parse_cache, source,
+                     out_dir, diagnose=False):
+    reader = parse_cache.reader(read_file, source) if parse_cache is not None else None
+    with diagnostics.run(enabled=diagnose) as metrics:
+        with diagnostics.span("location", location=location):
+            result = process_location(brand, dealer, location, location_path, select_categories,
+                                      reader=reader, source=source)
+        # workbooks are written here, in parallel; the parent only registers the files
+        _write_workbooks(result, out_dir, metrics)
+    if metrics is not None:
+        result["diagnostics"] = metrics.to_dict()
+    return result
+
+
+def _write_workbooks(result, out_dir, metrics=None):
+    """
+    Write the workbooks of a process_location result into files in `out_dir`,
+    replacing each sheet list in result["workbooks"] by the file's path.
+    """
+    for name, sheets in result["workbooks"].items():
+        with diagnostics.span_in(metrics, "xlsx", artifact=name) as span:
+            fd, path = tempfile.mkstemp(suffix=".xlsx", dir=out_dir)
+            with os.fdopen(fd, "wb") as fh:
+                write_xlsx(sheets, fh)
+                if span.active:
+                    span.set(bytes=fh.tell())
+        result["workbooks"][name] = path
+
+
+def _park(result):
+    """Move a location result that arrived early out of memory (private temp file)."""
+    fh = tempfile.TemporaryFile(prefix="kia_park_")
+    pickle.dump(result, fh, pickle.HIGHEST_PROTOCOL)
+    return fh
+
+
+def _unpark(fh):
+    with fh:
+        fh.seek(0)
+        return pickle.load(fh)
+
+
+def generate_reports(all_locations, select_categories, store=None, parse_cache=None, workers=None,
+                     serial=None, source=None, progress=None, metrics=None):
+    """
+    Generate every location's reports, without Streamlit.
+
+    Locations run in a process pool (`workers`, default KIA_WORKERS / all
+    cores), largest input first. `serial=True` (or KIA_SERIAL=1) keeps the
+    in-process loop, which also reuses frames already parsed into `store`;
+    workers read through `parse_cache` instead, so without a (usable) parse
+    cache the pool would parse every workbook a second time and the serial
+    path is taken. Results are merged in
+    `all_locations` order either way, so the output is identical; in the
+    pool, results that finish ahead of an earlier location wait in a temp
+    file, not in memory.
+
+    A location's frames are dropped as soon as it is collected: its rows go
+    into the dealer workbooks (dealer_reports.DealerReports), its workbooks
+    into files in the registry's temporary directory (written by the worker
+    in the pool), and only the first rows are kept for the previews. The
+    dealer ZIP is finished into a spooled file after the last location.
+    `progress(done, total, message)` is called after each location.
+    `metrics` is the diagnostics.RunMetrics to record into (default: the
+    active run); worker runs and artifact builds are folded into it.
+
+    Returns {"previews": name -> first rows,
+    "files": ArtifactRegistry of the workbooks (+ Combined_Dealerwise_Reports.zip),
+    "errors": [...], "warnings": [...], "invalid_names": [...]}.
+    """
+    source = source or DiskSource()
+    workers = workers or DEFAULT_WORKERS
+    serial = DEFAULT_SERIAL if serial is None else serial
+    if len(all_locations) <= 1 or workers <= 1:
+        serial = True
+    if parse_cache is None or not parse_cache.enabled:
+        serial = True   # only the in-process store has validation's frames
+    total = len(all_locations)
+    progress = progress or (lambda done, total, message: None)
+
+    # Keep DataFrame previews separate from downloadable files
+    previews = {}  # name -> first rows of the report (all the UI shows)
+    metrics = metrics if metrics is not None else diagnostics.current()
+    # name -> xlsx file in the run's temporary directory / spooled dealer ZIP
+    files = ArtifactRegistry(metrics, workdir=tempfile.TemporaryDirectory(prefix="kia_reports_",
+                                                                          ignore_cleanup_errors=True))
+    out_dir = files.workdir.name
+    dealer_reports = DealerReports()
+    errors = []
+    warnings = []
+
+    def collect(result):
+        # called in all_locations order; the full frames are dropped afterwards
+        if metrics is not None:
+            metrics.merge(result.get("diagnostics"), worker=True)
+        for name, df in result["frames"].items():
+            previews[name] = df.head(5)
+            dealer_reports.add(name, df)
+        for name, path in result["workbooks"].items():
+            files.register_file(name, path)
+        errors.extend(result["errors"])
+        warnings.extend(result["warnings"])
+
+    if serial:
+        # Report generation is the last stage for every workbook: take the frame
+        # parsed during validation (if any) and let the store drop it.
+        def read_once(file_path, header=None, usecols=None):
+            if store is None:
+                return read_file(file_path, header=header, source=source, usecols=usecols)
+            df = store.read(file_path, header=header, usecols=usecols)
+            store.release(file_path)
+            return df
+
+        for i, (brand, dealer, location, location_path) in enumerate(all_locations):
+            progress(i + 1, total, f"Generating reports for {location} ({i+1}/{total})...")
+            with diagnostics.span_in(metrics, "location", location=location):
+                result = process_location(brand, dealer, location, location_path, select_categories,
+                                          reader=read_once, source=source)
+                _write_workbooks(result, out_dir, metrics)
+            collect(result)
+            if store is not None and STREAM_READS:
+                # streamed inputs never went through read_once; drop what validation parsed
+                for _, name in iter_files(source.index(location_path)):
+                    store.release(os.path.join(location_path, name))
+    else:
+        # workers parse (or hit the on-disk cache) themselves; free the shared frames
+        if store is not None:
+            store.clear()
+        order = sorted(range(len(all_locations)),
+                       key=lambda i: location_input_bytes(all_locations[i][3], source), reverse=True)
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(all_locations)), mp_context=ctx) as pool:
+            futures = {
+                pool.submit(_location_worker, *all_locations[i], select_categories, parse_cache,
+                            source.subset(all_locations[i][3]), out_dir, metrics is not None): i
+                for i in order
+            }
+            parked = {}   # index -> temp file with the result, until every earlier location is in
+            next_i = 0
+            for done, future in enumerate(as_completed(futures), start=1):
+                i = futures[future]
+                if i == next_i:
+                    collect(future.result())
+                    next_i += 1
                 else:
-                    st.warning(f"{location}: Transfer Detail is empty -> {file}")  
-                #continue
-
-      
-        # ---------- REPORT GEN ----------
-        frames_for_oem = []
-
-        # BO LIST → last 90 days; compute transit/T/F/Remark
-        if BO_LIST:
-            oem = pd.concat(BO_LIST, ignore_index=True)
-            # Date parse (supports 2-digit/4-digit year strings)
-            oem['PO DATE'] = pd.to_datetime(oem['PO DATE'], errors='coerce')
-            cutoff_90 = (datetime.today() - timedelta(days=90)).date()
-            oem_work = oem[oem['PO DATE'].dt.date >= cutoff_90].copy()
-
-            # numerics
-            for c in ['B/O', 'PROCESSING_ALLOCATION', 'PROCESSING_ON-PICK', 'PROCESSING_ON-PACK',
-                      'PROCESSING_PACKED', 'PROCESSING_INVOICE', 'PROCESSING_SHIPPEO', 'QUANTITY_CURRENT']:
-                if c in oem_work.columns:
-                    oem_work[c] = to_num(oem_work[c])
-
-            oem_work['transit'] = (
-                oem_work.get('B/O', 0)
-                + oem_work.get('PROCESSING_ALLOCATION', 0)
-                + oem_work.get('PROCESSING_ON-PICK', 0)
-                + oem_work.get('PROCESSING_ON-PACK', 0)
-                + oem_work.get('PROCESSING_PACKED', 0)
-                + oem_work.get('PROCESSING_INVOICE', 0)
-            )
-            oem_work['T/F'] = oem_work.get('QUANTITY_CURRENT', 0).eq(oem_work.get('PROCESSING_SHIPPEO', 0))
-
-            def _remark(r):
-                if r['transit'] == 0.0 and bool(r['T/F']) is True:
-                    return 'Ok'
-                if r['transit'] > 0.0 and bool(r['T/F']) is False:
-                    return 'Ok'
-                if r['transit'] == 0.0 and bool(r['T/F']) is False:
-                    return 'Pls Check'
-                return None
+                    parked[i] = _park(future.result())
+                while next_i in parked:
+                    collect(_unpark(parked.pop(next_i)))
+                    next_i += 1
+                progress(done, total, f"Generated reports for {all_locations[i][2]} ({done}/{total})...")
 
-            oem_work['Remark'] = oem_work.apply(_remark, axis=1)
-            oem_work['transit'] = oem_work.apply(lambda row:row['QUANTITY_CURRENT'] if row['Remark']=='Pls Check' else row['transit'] ,axis=1)
-            oem_workf = oem_work[['Brand', 'Dealer', 'Location', 'ORDER NO', 'PART NO_CURRENT', 'PO DATE', 'transit', 'Remark']].copy()
-            oem_workf.rename(columns={
-                'ORDER NO': 'OrderNumber',
-                'PART NO_CURRENT': 'PartNumber',
-                'PO DATE': 'OrderDate',
-                'transit': 'POQty'
-            }, inplace=True)
-            frames_for_oem.append(oem_workf)
-
-        # Receiving Pending Detail → last 60 days
-        if Receving_Pending_Detail:
-            rpd = pd.concat(Receving_Pending_Detail, ignore_index=True)
-            rpd['ORDER DATE'] = pd.to_datetime(rpd['ORDER DATE'], errors='coerce')
-            cutoff_60 = (datetime.today() - timedelta(days=60)).date()
-            rpdw = rpd[rpd['ORDER DATE'].dt.date >= cutoff_60].copy()
-            rpdw = rpdw[['Brand', 'Dealer', 'Location', 'ORDER NO ', 'PART NO _SUPPLY', 'ORDER DATE', 'ACCEPT QTY', '__source_file__']]
-            rpdw.rename(columns={
-                'ORDER NO ': 'OrderNumber',
-                'PART NO _SUPPLY': 'PartNumber',
-                'ORDER DATE': 'OrderDate',
-                'ACCEPT QTY': 'POQty',
-                '__source_file__': 'Remark'
-            }, inplace=True)
-            frames_for_oem.append(rpdw)
-
-        # Receiving Today Detail → last 60 days
-        if Receving_Today_Detail:
-            rtd = pd.concat(Receving_Today_Detail, ignore_index=True)
-            rtd['ORDER DATE'] = pd.to_datetime(rtd['ORDER DATE'], errors='coerce')
-            cutoff_60 = (datetime.today() - timedelta(days=60)).date()
-            rtdw = rtd[rtd['ORDER DATE'].dt.date >= cutoff_60].copy()
-            rtdw = rtdw[['Brand', 'Dealer', 'Location', 'ORDER NO ', 'PART NO _SUPPLY', 'ORDER DATE', 'ACCEPT QTY', '__source_file__']]
-            rtdw.rename(columns={
-                'ORDER NO ': 'OrderNumber',
-                'PART NO _SUPPLY': 'PartNumber',
-                'ORDER DATE': 'OrderDate',
-                'ACCEPT QTY': 'POQty',
-                '__source_file__': 'Remark'
-            }, inplace=True)
-            frames_for_oem.append(rtdw)
-
-        # Save OEM_{...}.xlsx (Hyundai unified)
-        # if frames_for_oem:
-        #     key_oem = f"OEM_{brand}_{dealer}_{location}.xlsx"
-        #     oem_final = pd.concat(frames_for_oem, ignore_index=True)
-        #     oem_final['PartNumber']  = oem_final['PartNumber'].astype(str).str.strip().replace('-','').replace('.','')
-            
-        #     oem_final['OEMInvoiceNo']=''
-        #     oem_final['OEMInvoiceDate']=''
-        #     oem_final['OEMInvoiceQty']=''
-        #     oem_final['OrderDate'] = pd.to_datetime(oem_final['OrderDate'], errors='coerce')
-        #     oem_final['OrderDate'] = oem_final['OrderDate'].dt.strftime('%d %b %Y')
-        #     oem_c = oem_final[oem_final['Remark']=='Pls Check'][['Location','OrderNumber']].drop_duplicates()
-        #     # Preview for UI & for dealerwise ZIP
-        #     previews[key_oem] = oem_final.copy()
-
-        #     # Build Excel with two sheets (sheet1: summary of "Pls Check", sheet2: full)
-        #     excel_buffer = io.BytesIO()
-        #     with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-        #         #oem_c = oem_final[oem_final['Remark']=='Pls Check'][['Location','OrderNumber']].drop_duplicates()
-        #         oem_c.reset_index(drop=True).to_excel(writer, sheet_name='sheet1', index=False)
-        #         oem_final.reset_index(drop=True).to_excel(writer, sheet_name='sheet2', index=False)
-        #     files[key_oem] = excel_buffer.getvalue()
-
-        # Save OEM_{...}.xlsx (Hyundai unified)
-        if frames_for_oem:
-            key_oem = f"OEM_{brand}_{dealer}_{location}.xlsx"
-            oem_final = pd.concat(frames_for_oem, ignore_index=True)
-        
-            # CLEAN: remove - and . safely
-            oem_final['PartNumber'] = (
-                oem_final['PartNumber'].astype(str).str.strip().str.replace(r'[\-.]', '', regex=True)
-            )
-        
-            oem_final['OEMInvoiceNo'] = ''
-            oem_final['OEMInvoiceDate'] = ''
-            oem_final['OEMInvoiceQty'] = ''
-            oem_final['OrderDate'] = pd.to_datetime(oem_final['OrderDate'], errors='coerce').dt.strftime('%d %b %Y')
-        
-            # Preview for UI & for dealerwise ZIP
-            previews[key_oem] = oem_final.copy()
-        
-            # Build Excel with two sheets: Summary (Pls Check) + FullData
-            excel_buffer = io.BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                summary = (
-                    oem_final.loc[oem_final['Remark'].astype(str).str.strip().str.lower().eq('pls check'),
-                                  ['Location', 'OrderNumber']]
-                            .drop_duplicates()
-                )
-                # keep a visible row even if empty (optional)
-                if summary.empty:
-                    summary = pd.DataFrame([{'Location': '—', 'OrderNumber': 'No "Pls Check" rows'}])
-        
-                summary.to_excel(writer, sheet_name='Check Order status', index=False)
-                oem_final.reset_index(drop=True).to_excel(writer, sheet_name='sheet1', index=False)
-        
-                # make Summary the active sheet
-                writer.book.active = 0
-        
-            files[key_oem] = excel_buffer.getvalue()
+    # Combined ZIP per (report_type, brand, dealer), assembled by dealer_reports
+    if len(dealer_reports):
+        with diagnostics.span_in(metrics, "dealer_zip"):
+            archive = spooled_zip(dealer_reports.members())
+        files.register(COMBINED_ZIP, lambda: archive)
 
-        
-        # Save Stock_{...}.xlsx
-        if Stock_data:
-            key_stock = f"Stock_{brand}_{dealer}_{location}.xlsx"
-            stock_df = pd.concat(Stock_data, ignore_index=True)
-            #stock_df['PART NO ?']  = stock_df['PART NO ?'].astype(str).str.strip().replace('.','').replace('-','')
-            stock_df['PART NO ?'] = (stock_df['PART NO ?'].astype(str).str.strip().str.replace('.', '', regex=False).str.replace('-', '', regex=False))
-            stock_df['PART TYPE'] = stock_df['PART TYPE'].astype(str).str.strip()
-            if select_categories == ['Spares']:
-                stock_df = stock_df[stock_df['PART TYPE'].isin(['X', 'Y'])]
-            elif select_categories == ['Accessories']:
-                stock_df = stock_df[stock_df['PART TYPE'] == 'A']
-            elif set(select_categories) == {'Spares', 'Accessories'}:
-                stock_df = stock_df[stock_df['PART TYPE'].isin(['X', 'Y', 'A'])]
-
-            # Final selection
-            stock_final = stock_df[['Brand', 'Dealer', 'Location', 'PART NO ?', 'ON-HAND']].rename(
-                columns={'PART NO ?': 'Partnumber', 'ON-HAND': 'Qty'}
-            )
-            previews[key_stock] = stock_final.copy()
-            buf = io.BytesIO()
-            with pd.ExcelWriter(buf, engine="openpyxl") as writer:
-                stock_final.to_excel(writer, index=False, sheet_name="Sheet1")
-            files[key_stock] = buf.getvalue()
-
-        # Pending (from Transfer_Detail minimal subset) -> Pending_{...}.xlsx
-        if Transfer_Detail:
-            tr = pd.concat(Transfer_Detail, ignore_index=True)
-            # Only add if expected columns exist
-            needed_cols = {'PART NO ?', 'QUANTITY'}
-            if needed_cols.issubset(set(tr.columns)):
-                tr_Df = tr[['Brand','Dealer','Location','PART NO ?','QUANTITY']].copy()
-                tr_Df['PART NO ?'] = tr_Df['PART NO ?'].astype(str).str.strip()
-                tr_Df.rename(columns={'PART NO ?':'PartNumber','QUANTITY':'Qty'}, inplace=True)
-                key_pending = f"Pending_{brand}_{dealer}_{location}.xlsx"
-                previews[key_pending] = tr_Df.copy()
-                buf = io.BytesIO()
-                with pd.ExcelWriter(buf, engine="openpyxl") as writer:
-                    tr_Df.to_excel(writer, index=False, sheet_name="Sheet1")
-                files[key_pending] = buf.getvalue()
+    return {"previews": previews, "files": files,
+            "errors": errors, "warnings": warnings, "invalid_names": dealer_reports.invalid}
+
+
+def process_files(validation_errors, all_locations, start_date, end_date, total_locations,
+                  progress_bar, status_text, select_categories, store=None,
+                  parse_cache=None, workers=None, serial=None, source=None, metrics=None):
+    """
+    Generate every location's reports (generate_reports) and render the download UI.
+    """
+    import streamlit as st
+
+    def progress(done, total, message):
+        progress_bar.progress(done / max(total_locations, 1))
+        status_text.text(message)
+
+    run = generate_reports(all_locations, select_categories, store=store, parse_cache=parse_cache,
+                           workers=workers, serial=serial, source=source, progress=progress,
+                           metrics=metrics)
+    previews, files = run["previews"], run["files"]
+    validation_errors.extend(run["errors"])
+    for msg in run["warnings"]:
+        st.warning(msg)
 
     # ---------- UI ----------
     if validation_errors:
@@ -469,11 +666,11 @@ def process_files(validation_errors, all_locations, start_date, end_date, total_
     st.success("🎉 Reports generated successfully!")
     st.subheader("📥 Download Reports")
 
-    # Build sections from available file names (files dict is source of truth for downloads)
+    # Build sections from available file names (files registry is source of truth for downloads)
     report_types = {
-        'OEM':      [k for k in files.keys() if k.startswith('OEM_')],
-        'Stock':    [k for k in files.keys() if k.startswith('Stock_')],
-        'Transfer': [k for k in files.keys() if k.startswith(('Transfer_','Pending_'))],
+        'OEM':      [k for k in files.names() if k.startswith('OEM_')],
+        'Stock':    [k for k in files.names() if k.startswith('Stock_')],
+        'Transfer': [k for k in files.names() if k.startswith(('Transfer_','Pending_'))],
     }
 
     for report_type, names in report_types.items():
@@ -490,12 +687,11 @@ def process_files(validation_errors, all_locations, start_date, end_date, total_
                 else:
                     st.info("No preview available.")
 
-                # Download button (bytes)
-                blob = files.get(name)
-                if blob:
+                # Download button (workbook written when clicked; callable data needs streamlit>=1.52)
+                if name in files:
                     st.download_button(
                         label="⬇ Download Excel",
-                        data=blob,
+                        data=files.deferred(name),
                         file_name=name,
                         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                         key=f"dl_{name}",
@@ -539,52 +735,15 @@ def process_files(validation_errors, all_locations, start_date, end_date, total_
     # else:
     #     st.info("ℹ No reports available to download.")
     #     st.warring("Pls check Folder Structure")
-    # ---------- Combined ZIP per (report_type, brand, dealer) using previews (DataFrames) ----------
-    grouped_data = defaultdict(list)
-    for file_name, df in previews.items():
-        if df is None or df.empty:
-            continue
-        parts = file_name.replace(".xlsx", "").split("_")
-        if len(parts) >= 4:
-            rep, br, dlr = parts[0], parts[1], parts[2]
-            loc_part = "_".join(parts[3:])
-            if "Location" not in df.columns:
-                df = df.copy()
-                df["Location"] = loc_part
-            grouped_data[(rep, br, dlr)].append(df)
-        else:
-            st.warning(f"❗ Invalid file name format: {file_name}")
-    
-    if grouped_data:
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for (rep, br, dlr), df_list in grouped_data.items():
-                combined_df = pd.concat(df_list, ignore_index=True)
-    
-                excel_buffer = io.BytesIO()
-                with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
-                    if rep == "OEM":
-                        summary = (
-                            combined_df.loc[combined_df['Remark'].astype(str).str.strip().str.lower().eq('pls check'),
-                                            ['Location', 'OrderNumber']]
-                                       .drop_duplicates()
-                        )
-                        if summary.empty:
-                            summary = pd.DataFrame([{'Location': '—', 'OrderNumber': 'No "Pls Check" rows'}])
-    
-                        summary.to_excel(writer, sheet_name="Check Order status", index=False)
-                        combined_df.to_excel(writer, sheet_name="sheet1", index=False)
-                        writer.book.active = 0
-                    else:
-                        combined_df.to_excel(writer, sheet_name="Sheet1", index=False)
-    
-                output_filename = f"{rep}_{br}_{dlr}.xlsx"
-                zipf.writestr(output_filename, excel_buffer.getvalue())
-    
+    # ---------- Combined ZIP per (report_type, brand, dealer), built by dealer_reports on click ----------
+    for file_name in run["invalid_names"]:
+        st.warning(f"❗ Invalid file name format: {file_name}")
+
+    if COMBINED_ZIP in files:
         st.download_button(
             label="📦 Download Combined Dealer Reports ZIP",
-            data=zip_buffer.getvalue(),
-            file_name="Combined_Dealerwise_Reports.zip",
+            data=files.deferred(COMBINED_ZIP),
+            file_name=COMBINED_ZIP,
             mime="application/zip",
         )
     else:
@@ -0,0 +1,177 @@
+# report_schemas.py
+"""
+Registry of the KIA input report types.
+
+One ReportSchema per type describes how its workbooks look: filename
+prefixes (both "receiving" spellings), header row, the positional header
+list for exports whose two-row headers pandas cannot name, the date and
+numeric columns, and the fields a report cannot do without. Everything that
+reads inputs goes through it:
+
+  file_index      - classification and missing-file order (SCHEMAS order)
+  read_file       - normalize_input(): positional names, dates, numerics
+  validation      - header rows and column names
+  process_location / input_specs - header rows, columns, required fields
+
+normalize() is applied once per file, right after the parse, so the parse
+cache and the WorkbookStore hold normalized frames and no stage coerces a
+column again. Dates are Excel serials or day-first strings
+(normalize_excel_like_date); numerics go through pd.to_numeric(errors=
+"coerce"). Adding a report type is one entry in SCHEMAS.
+"""
+
+import pandas as pd
+
+
+def normalize_excel_like_date(col):
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col
+    num = pd.to_numeric(col, errors="coerce")
+    dt_excel = pd.to_datetime(num, unit="D", origin="1899-12-30", errors="coerce")
+    dt_fallback = pd.to_datetime(col, errors="coerce", dayfirst=True)
+    return dt_excel.combine_first(dt_fallback)
+
+
+class ReportSchema:
+    def __init__(self, name, prefixes, header, columns=None, dates=(), numerics=(), required=()):
+        """
+        `columns` is the positional header list (None: names come from the
+        file's header row). `dates` / `numerics` are coerced on read;
+        `required` are the fields the report needs.
+        """
+        self.name = name
+        self.prefixes = tuple(prefixes)
+        self.header = header
+        self.columns = list(columns) if columns is not None else None
+        self.dates = tuple(dates)
+        self.numerics = tuple(numerics)
+        self.required = tuple(required)
+
+    @property
+    def positional(self):
+        return self.columns is not None
+
+    def positions(self, names):
+        """Column positions of `names` in a positional layout (usecols)."""
+        return tuple(self.columns.index(c) for c in names)
+
+    def matches(self, file_name):
+        return file_name.lower().strip().startswith(self.prefixes)
+
+    def normalize(self, df, usecols=None):
+        """
+        Name positional columns (`usecols`: the positions that were read) and
+        coerce the date and numeric columns, in place; returns `df`.
+        """
+        if df is None or df.empty:
+            return df
+        if self.positional:
+            positions = sorted(usecols) if usecols is not None else range(df.shape[1])
+            df.columns = [self.columns[i] if i < len(self.columns) else df.columns[n]
+                          for n, i in enumerate(positions)]
+        for col in self.dates:
+            if col in df.columns:
+                df[col] = normalize_excel_like_date(df[col])
+        for col in self.numerics:
+            if col in df.columns and df[col].dtype.kind not in "iufb":
+                df[col] = pd.to_numeric(df[col], errors="coerce")
+        return df
+
+    def missing(self, df):
+        return [c for c in self.required if c not in df.columns]
+
+
+RECEIVING_DETAIL_COLUMNS = [
+    'SEQ', 'CASE NO ', 'ORDER NO ', 'LINE NO', 'PART NO _SUPPLY', 'PART NO _ORDER', 'H/K', 'PART NAME',
+    'SUPPLY QTY', 'ORDER QTY', 'ACCEPT QTY', 'CLAIM QTY', 'CLAIM TYPE', 'CLAIM CODE', 'LOC', 'LIST PRICE',
+    'NDP (UNIT)', 'ED (UNIT)', 'MAT VALUE', 'DEPOT S/C', 'VOR S/C', 'OTHER CHARGES', 'STAX(%)', 'CTAX(%)',
+    'ITAX(%)', 'TAX(%)', 'HSN CODE', 'TAX AMT', 'FRT/INS', 'SGST AMT', 'CGST AMT', 'IGST AMT', 'COMP CESS AMT',
+    'LANDED COST', 'ORDER DATE', 'RECEIVING DATE', 'STATUS'
+]
+
+RECEIVING_LIST_COLUMNS = [
+    'SEQ', 'H/K', 'GR_NO', 'GR_TYPE', 'GR_STATUS', 'INVOICE_NO', 'INVOICE_DATE',
+    'SHIPPED INFORMATION_SUPPLIER', 'SHIPPED INFORMATION_TRUCK NO', 'SHIPPED INFORMATION_CARRIER NAME',
+    'SHIPPED INFORMATION_FINISH DATE', 'SHIPPED INFORMATION_ACCEPT QTY', 'SHIPPED INFORMATION_CLAIM QTY',
+    'SHIPPED INFORMATION_MAT VALUE', 'SHIPPED INFORMATION_FREIGHT AMT', 'SHIPPED INFORMATION_SGST AMT',
+    'SHIPPED INFORMATION_IGST AMT', 'SHIPPED INFORMATION_TCS AMT', 'SHIPPED INFORMATION_TAX AMOUNT'
+]
+
+_SCHEMAS = [
+    ReportSchema(
+        "bo list", ("bo list",), header=1,
+        columns=['ORDER NO', 'LINE', 'PART NO_ORDER', 'PART NO_CURRENT', 'PART NAME',
+                 'PARTSOURCE', 'QUANTITY_ORDER', 'QUANTITY_CURRENT', 'B/O', 'PO DATE',
+                 'PDC', 'ETA', 'MSG', 'PROCESSING_ALLOCATION', 'PROCESSING_ON-PICK',
+                 'PROCESSING_ON-PACK', 'PROCESSING_PACKED', 'PROCESSING_INVOICE',
+                 'PROCESSING_SHIPPEO', 'LOST QTY', 'ELAP'],
+        dates=['PO DATE'],
+        numerics=['QUANTITY_CURRENT', 'B/O', 'PROCESSING_ALLOCATION', 'PROCESSING_ON-PICK',
+                  'PROCESSING_ON-PACK', 'PROCESSING_PACKED', 'PROCESSING_INVOICE', 'PROCESSING_SHIPPEO'],
+        required=['ORDER NO', 'PART NO_CURRENT', 'PO DATE', 'QUANTITY_CURRENT', 'PROCESSING_ALLOCATION'],
+    ),
+    ReportSchema(
+        "receiving pending list", ("receiving pending list", "receving pending list"), header=2,
+        columns=RECEIVING_LIST_COLUMNS,
+        numerics=['SHIPPED INFORMATION_ACCEPT QTY'],
+    ),
+    ReportSchema(
+        "receiving pending detail", ("receiving pending detail", "receving pending detail"), header=1,
+        columns=RECEIVING_DETAIL_COLUMNS,
+        dates=['ORDER DATE'],
+        numerics=['ACCEPT QTY'],
+        required=['ORDER NO ', 'PART NO _SUPPLY', 'ORDER DATE', 'ACCEPT QTY'],
+    ),
+    ReportSchema(
+        "stock", ("stock",), header=0,
+        required=['PART NO ?', 'PART TYPE', 'ON-HAND'],
+    ),
+    ReportSchema(
+        "receiving today list", ("receiving today list", "receving today list"), header=2,
+        columns=RECEIVING_LIST_COLUMNS,
+        numerics=['SHIPPED INFORMATION_ACCEPT QTY'],
+    ),
+    ReportSchema(
+        "receiving today detail", ("receiving today detail", "receving today detail"), header=1,
+        columns=RECEIVING_DETAIL_COLUMNS,
+        dates=['ORDER DATE'],
+        numerics=['ACCEPT QTY'],
+        required=['ORDER NO ', 'PART NO _SUPPLY', 'ORDER DATE', 'ACCEPT QTY'],
+    ),
+    ReportSchema(
+        "transfer list", ("transfer list",), header=1,
+        columns=['TRANSFER NO', 'REQ.DATE', 'REQ.TIME', 'SEND DATE', 'SEND.TIME', 'RECE.DATE', 'RECE.TIME',
+                 'REQU.DEALER', 'SEND DEALER', 'ITEM_REQ', 'ITEM_SEND', 'QUANTITY_REQ', 'QUANTITY_SEND',
+                 'AMOUNT', 'AMOUNT2', 'TAXABLE AMT', 'SGST AMT', 'CGST AMT', 'IGST AMT', 'COMP CESS AMT',
+                 'STATUS'],
+        dates=['REQ.DATE'],
+        numerics=['QUANTITY_SEND'],
+    ),
+    ReportSchema(
+        "transfer detail", ("transfer detail",), header=0,
+        numerics=['QUANTITY'],
+        required=['PART NO ?', 'QUANTITY'],
+    ),
+]
+
+# report type -> schema, in missing-file reporting order
+SCHEMAS = {schema.name: schema for schema in _SCHEMAS}
+
+
+def schema_for(file_name):
+    """Schema of `file_name` (a KIA input), or None."""
+    for schema in SCHEMAS.values():
+        if schema.matches(file_name):
+            return schema
+    return None
+
+
+def normalize_input(file_path, df, header=None, usecols=None):
+    """
+    Normalize a freshly parsed workbook by the schema of its file name; frames
+    read with another header row than the schema's are returned as they are.
+    """
+    schema = schema_for(file_path.replace("\\", "/").rsplit("/", 1)[-1])
+    if schema is None or header != schema.header or not isinstance(df, pd.DataFrame):
+        return df
+    return schema.normalize(df, usecols)
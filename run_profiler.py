@@ -0,0 +1,233 @@
+# run_profiler.py
+"""
+On-demand profile of one pipeline run (admins only).
+
+The app offers a "Profile next run" toggle to the users listed in
+KIA_ADMIN_USERS (comma-separated user ids or login names); kia_reports has
+--profile. The run is then wrapped in a RunProfiler:
+
+  - cProfile, enabled inside every stage (deterministic, whole call graph)
+  - a sampler thread that records the running stack every
+    KIA_PROFILE_INTERVAL_MS (default 5) -> flamegraph-style collapsed stacks,
+    rooted at the stage name
+  - tracemalloc, per stage: peak traced memory above the stage's starting
+    point, net growth, and the source lines that grew the most
+
+archive() packs it all into one ZIP for offline analysis:
+
+    run.pstats        python -m pstats run.pstats / snakeviz run.pstats
+    run.collapsed     flamegraph.pl run.collapsed > run.svg, or speedscope
+    stages.json       seconds, peak / net MB and top allocations per stage
+    top_functions.txt cumulative-time listing of the 60 costliest functions
+
+Profiling slows a run down noticeably (tracemalloc the most), and location
+workers are separate processes the profiler cannot see, so profiled runs
+generate reports serially.
+
+tracemalloc (and the interpreter's profiling hook) are process-wide, while
+Streamlit serves every session from the same process: one RunProfiler runs
+at a time. start() raises ProfilerBusy instead of waiting when another run
+is being profiled, and the app tells the second admin so.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+ADMIN_USERS = {u.strip().lower() for u in os.getenv("KIA_ADMIN_USERS", "").split(",") if u.strip()}
+SAMPLE_INTERVAL = float(os.getenv("KIA_PROFILE_INTERVAL_MS", "5")) / 1000
+TOP_ALLOCATIONS = 10
+
+# held from RunProfiler.start() to stop(); never waited on
+_PROFILE_LOCK = threading.Lock()
+
+# allocations of the profiler itself and of imports are not the pipeline's
+_ALLOCATION_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+)
+
+
+class ProfilerBusy(RuntimeError):
+    """Another run is being profiled in this process."""
+
+
+def is_admin(user_id=None, username=None):
+    """True when the user id or login name is listed in KIA_ADMIN_USERS."""
+    names = {str(v).strip().lower() for v in (user_id, username) if v not in (None, "")}
+    return bool(names & ADMIN_USERS)
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Sampler(threading.Thread):
+    """Collects the stacks of thread `ident` every `interval` seconds."""
+
+    def __init__(self, ident, interval):
+        super().__init__(name="kia-profile-sampler", daemon=True)
+        self.target = ident
+        self.interval = interval
+        self.stage = None
+        self.stacks = Counter()
+        self.samples = 0
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            stage = self.stage
+            frame = sys._current_frames().get(self.target)
+            if stage is None or frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.append(stage)
+            self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def halt(self):
+        self._halt.set()
+        self.join()
+
+
+class RunProfiler:
+    def __init__(self, trace_memory=True, interval=SAMPLE_INTERVAL):
+        self.trace_memory = trace_memory
+        self.interval = interval
+        self.profile = cProfile.Profile()
+        self.stages = []    # per stage: {"stage", "seconds", "peak_mb", "net_mb", "top_allocations"}
+        self.started = None
+        self._sampler = None
+        self._owns_tracemalloc = False
+        self._locked = False
+
+    def start(self):
+        """
+        Start tracing; ProfilerBusy if another RunProfiler is running.
+        """
+        if not _PROFILE_LOCK.acquire(blocking=False):
+            raise ProfilerBusy("another run is being profiled")
+        self._locked = True
+        try:
+            self.started = datetime.now()
+            if self.trace_memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracemalloc = True
+            self._sampler = _Sampler(threading.get_ident(), self.interval)
+            self._sampler.start()
+        except BaseException:
+            self.stop()
+            raise
+        return self
+
+    def stop(self):
+        if self._sampler is not None:
+            self._sampler.halt()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+        if self._locked:
+            self._locked = False
+            _PROFILE_LOCK.release()
+
+    @staticmethod
+    def _snapshot():
+        return tracemalloc.take_snapshot().filter_traces(_ALLOCATION_FILTERS)
+
+    @contextmanager
+    def stage(self, name):
+        """Profile the block as pipeline stage `name`."""
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            before = self._snapshot()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        self._sampler.stage = name
+        t0 = time.perf_counter()
+        self.profile.enable()
+        try:
+            yield
+        finally:
+            self.profile.disable()
+            seconds = time.perf_counter() - t0
+            self._sampler.stage = None
+            record = {"stage": name, "seconds": round(seconds, 4)}
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                grown = self._snapshot().compare_to(before, "lineno")[:TOP_ALLOCATIONS]
+                record.update(
+                    peak_mb=round((peak - base) / 1024 / 1024, 2),
+                    net_mb=round((current - base) / 1024 / 1024, 2),
+                    top_allocations=[{"line": str(s.traceback), "size_kb": round(s.size_diff / 1024, 1),
+                                      "count": s.count_diff} for s in grown if s.size_diff > 0],
+                )
+            self.stages.append(record)
+
+    # ---------- outputs ----------
+    def pstats_bytes(self):
+        fd, path = tempfile.mkstemp(suffix=".pstats")
+        os.close(fd)
+        try:
+            self.profile.dump_stats(path)
+            with open(path, "rb") as fh:
+                return fh.read()
+        finally:
+            os.remove(path)
+
+    def collapsed(self):
+        """Collapsed stacks ("stage;outer;...;inner count" per line)."""
+        stacks = self._sampler.stacks if self._sampler is not None else {}
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(stacks.items()))
+
+    def top_functions(self, limit=60):
+        out = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=out)
+        stats.strip_dirs().sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+    def summary(self):
+        return {
+            "started_at": self.started.isoformat(timespec="seconds") if self.started else None,
+            "sample_interval_ms": self.interval * 1000,
+            "samples": self._sampler.samples if self._sampler is not None else 0,
+            "trace_memory": self.trace_memory,
+            "stages": self.stages,
+        }
+
+    def archive(self):
+        """ZIP bytes of run.pstats, run.collapsed, stages.json and top_functions.txt."""
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("run.pstats", self.pstats_bytes())
+            zf.writestr("run.collapsed", self.collapsed())
+            zf.writestr("stages.json", json.dumps(self.summary(), indent=1))
+            zf.writestr("top_functions.txt", self.top_functions())
+        return buf.getvalue()
+
+    def file_name(self):
+        return f"kia_profile_{(self.started or datetime.now()):%Y%m%d_%H%M%S}.zip"
+
+
+@contextmanager
+def stage(profiler, name):
+    """profiler.stage(name), or nothing when `profiler` is None."""
+    if profiler is None:
+        yield
+    else:
+        with profiler.stage(name):
+            yield
@@ -0,0 +1,271 @@
+# synthetic_kia.py
+"""
+Synthetic KIA uploads for benchmarking and load tests.
+
+    python synthetic_kia.py <out.zip | out_dir> [--locations 150] [--dealers 15] [--rows 2000]
+                            [--rows-per-type "stock=8000,bo list=3000"] [--header "bo list=1"]
+                            [--typo-ratio 0.5] [--mismatch-ratio 0] [--seed 0]
+
+Writes the Brand/Dealer/Location layout the app expects, one workbook per
+report type in every location (file names, header rows and positional
+headers from report_schemas). The data looks like a real export where it
+matters to the pipeline:
+
+  - title / group-header rows above the header row (two-row headers)
+  - PO / ORDER / REQ dates as Excel serials or dd/mm/yyyy text, some blank,
+    spread around the 60/90-day cutoffs
+  - part numbers with "-" and "." separators, PART TYPE codes X/Y/A/Z
+  - Receiving List ACCEPT and Transfer List SEND totals equal to their
+    Detail totals, so validate_cross_sums passes; `mismatch_ratio` of the
+    locations get a List total that is off by one instead
+  - `typo_ratio` of the locations use the "Receving" export typo
+
+`rows` sizes a location; `rows_per_type` overrides single report types and
+`headers` moves a type's header row (the pipeline then misreads it - useful
+for error-path tests).
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import zipfile
+from datetime import datetime, timedelta
+
+from report_schemas import SCHEMAS
+
+# rows of each report type per location, relative to `rows`
+ROW_SCALE = {
+    "bo list": 1.0,
+    "receiving pending list": 0.05,
+    "receiving pending detail": 0.5,
+    "stock": 2.0,
+    "receiving today list": 0.02,
+    "receiving today detail": 0.2,
+    "transfer list": 0.05,
+    "transfer detail": 0.25,
+}
+
+# header rows of the named layouts (the positional ones come from SCHEMAS)
+NAMED_HEADERS = {
+    "stock": ["PART NO ?", "PART NAME", "PART TYPE", "BIN LOC", "ON-HAND", "ALLOCATED", "MAD"],
+    "transfer detail": ["TRANSFER NO", "PART NO ?", "PART NAME", "QUANTITY", "STATUS"],
+}
+
+FILE_NAMES = {
+    "bo list": "BO LIST.xlsx",
+    "receiving pending list": "Receiving Pending List.xlsx",
+    "receiving pending detail": "Receiving Pending Detail.xlsx",
+    "stock": "Stock.xlsx",
+    "receiving today list": "Receiving Today List.xlsx",
+    "receiving today detail": "Receiving Today Detail.xlsx",
+    "transfer list": "Transfer List.xlsx",
+    "transfer detail": "Transfer Detail.xlsx",
+}
+
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+
+
+class _Location:
+    """Row generator for one location; every report type draws from it."""
+
+    def __init__(self, rng, index, today):
+        self.rng = rng
+        self.index = index
+        self.today = today
+
+    def part(self):
+        n = self.rng.randrange(20000)
+        return f"{n // 1000:02d}-{n % 1000:03d}.{self.rng.randrange(10)}"
+
+    def date(self, max_age):
+        """An Excel serial, dd/mm/yyyy text or (2%) blank, up to `max_age` days back."""
+        r = self.rng.random()
+        if r < 0.02:
+            return None
+        day = self.today - timedelta(days=self.rng.randrange(max_age))
+        if r < 0.7:
+            return float((day - _EXCEL_EPOCH).days)
+        return day.strftime("%d/%m/%Y")
+
+    def qty(self, hi=5):
+        return self.rng.randrange(hi + 1)
+
+    def split(self, total, parts):
+        """`parts` non-negative ints summing to `total`."""
+        if parts <= 0:
+            return []
+        cuts = sorted(self.rng.randrange(total + 1) for _ in range(parts - 1))
+        return [b - a for a, b in zip([0] + cuts, cuts + [total])]
+
+    # ---------- report types ----------
+    def bo_list(self, n):
+        for i in range(n):
+            q = 1 + self.qty(9)
+            shipped = q if self.rng.random() < 0.4 else 0
+            pipeline = [0 if self.rng.random() < 0.6 else self.qty(3) for _ in range(6)]
+            yield [f"ORD{self.index:03d}{i // 4:05d}", i % 4 + 1, self.part(), self.part(), "PART", "KMI",
+                   q, q, pipeline[0], self.date(120), None, None, None,
+                   *pipeline[1:], shipped, 0, self.rng.randrange(200)]
+
+    def receiving_detail(self, n, accept):
+        for i in range(n):
+            part = self.part()
+            yield [i + 1, f"C{self.index:03d}{i // 20:04d}", f"ORD{self.index:03d}{i // 4:05d}", i % 4 + 1, part, part,
+                   "H", "PART", accept[i], accept[i], accept[i], 0, None, None, "W1", 125.5,
+                   *([0] * 18), self.date(90), self.date(30), "RECEIVED"]
+
+    def receiving_list(self, n, accept):
+        for i in range(n):
+            yield [i + 1, "H", f"GR{self.index:03d}{i:05d}", "NORMAL", "OPEN", f"INV{i:06d}", self.date(30),
+                   "KIA INDIA", f"KA01{i:04d}", "CARRIER", self.date(30), accept[i], 0, 1000.0, 0, 0, 0, 0, 0]
+
+    def transfer_list(self, n, send):
+        for i in range(n):
+            yield [f"TR{self.index:03d}{i:05d}", self.date(90), "10:00", self.date(60), "11:00", None, None,
+                   f"D{self.index:03d}", "D000", 1, 1, send[i], send[i], 0, 0, 0, 0, 0, 0, 0, "SENT"]
+
+    def transfer_detail(self, n, qty):
+        for i in range(n):
+            yield [f"TR{self.index:03d}{i:05d}", self.part(), "PART", qty[i], "SENT"]
+
+    def stock(self, n):
+        for _ in range(n):
+            yield [self.part(), "PART", self.rng.choice("XXYYAZ"), f"B{self.rng.randrange(99):02d}",
+                   self.qty(20), 0, self.qty(3)]
+
+
+def _header_rows(rtype, header):
+    """The rows above and at `header`: title, group labels, column names."""
+    schema = SCHEMAS[rtype]
+    names = schema.columns if schema.positional else NAMED_HEADERS[rtype]
+    if header == 0:
+        return [names]
+    groups = [n.split("_", 1)[0] if "_" in n else n for n in names]
+    subs = [n.split("_", 1)[1] if "_" in n else None for n in names]
+    rows = [[rtype.upper()]] + [[None]] * (header - 2) + [groups] if header >= 2 else [groups]
+    return rows + [subs]
+
+
+def _xlsx(rows):
+    buf = io.BytesIO()
+    try:
+        import xlsxwriter
+    except ImportError:
+        from openpyxl import Workbook
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        for row in rows:
+            ws.append(row)
+        wb.save(buf)
+        return buf.getvalue()
+    wb = xlsxwriter.Workbook(buf, {"constant_memory": True, "in_memory": True})
+    ws = wb.add_worksheet()
+    for r, row in enumerate(rows):
+        ws.write_row(r, 0, row)
+    wb.close()
+    return buf.getvalue()
+
+
+def location_workbooks(index, rows=2000, rows_per_type=None, headers=None, typo=False, mismatch=False,
+                       seed=0, today=None):
+    """
+    {file name: xlsx bytes} of location number `index`.
+    """
+    rng = random.Random(f"{seed}:{index}")
+    loc = _Location(rng, index, today or datetime.today())
+    sizes = {t: max(1, int(rows * scale)) for t, scale in ROW_SCALE.items()}
+    sizes.update(rows_per_type or {})
+    header = {t: schema.header for t, schema in SCHEMAS.items()}
+    header.update(headers or {})
+
+    # List totals match Detail totals (cross-sum checks), unless `mismatch`
+    data = {"bo list": loc.bo_list(sizes["bo list"]), "stock": loc.stock(sizes["stock"])}
+    for kind in ("pending", "today"):
+        detail = [loc.qty(4) for _ in range(sizes[f"receiving {kind} detail"])]
+        listed = loc.split(sum(detail) + (1 if mismatch else 0), sizes[f"receiving {kind} list"])
+        data[f"receiving {kind} detail"] = loc.receiving_detail(len(detail), detail)
+        data[f"receiving {kind} list"] = loc.receiving_list(len(listed), listed)
+    moved = [1 + loc.qty(4) for _ in range(sizes["transfer detail"])]
+    sent = loc.split(sum(moved) + (1 if mismatch else 0), sizes["transfer list"])
+    data["transfer list"] = loc.transfer_list(len(sent), sent)
+    data["transfer detail"] = loc.transfer_detail(len(moved), moved)
+
+    books = {}
+    for rtype in SCHEMAS:
+        name = FILE_NAMES[rtype]
+        if typo and rtype.startswith("receiving"):
+            name = name.replace("Receiving", "Receving")
+        books[name] = _xlsx(_header_rows(rtype, header[rtype]) + list(data[rtype]))
+    return books
+
+
+def generate(out, locations=150, dealers=15, brand="KIA", rows=2000, rows_per_type=None, headers=None,
+             typo_ratio=0.5, mismatch_ratio=0.0, seed=0, today=None):
+    """
+    Write a synthetic upload to `out` (a .zip, or a directory for an extracted
+    tree); returns {"locations", "files", "bytes"}.
+    """
+    rng = random.Random(seed)
+    as_zip = out.lower().endswith(".zip")
+    zf = zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) if as_zip else None
+    files = size = 0
+    try:
+        for i in range(locations):
+            folder = f"{brand}/DLR{i % max(dealers, 1):03d}/LOC{i:04d}"
+            books = location_workbooks(i, rows, rows_per_type, headers, typo=rng.random() < typo_ratio,
+                                       mismatch=rng.random() < mismatch_ratio, seed=seed, today=today)
+            for name, data in books.items():
+                if as_zip:
+                    zf.writestr(f"{folder}/{name}", data)
+                else:
+                    os.makedirs(os.path.join(out, folder), exist_ok=True)
+                    with open(os.path.join(out, folder, name), "wb") as fh:
+                        fh.write(data)
+                files += 1
+                size += len(data)
+    finally:
+        if zf is not None:
+            zf.close()
+    return {"locations": locations, "files": files, "bytes": size}
+
+
+def _per_type(spec, cast):
+    """'stock=8000,bo list=3000' -> {"stock": 8000, "bo list": 3000}."""
+    out = {}
+    for item in filter(None, (s.strip() for s in (spec or "").split(","))):
+        rtype, _, value = item.partition("=")
+        rtype = rtype.strip().lower()
+        if rtype not in SCHEMAS:
+            raise argparse.ArgumentTypeError(f"unknown report type '{rtype}', expected one of {list(SCHEMAS)}")
+        out[rtype] = cast(value)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic KIA upload generator")
+    parser.add_argument("out", help="output .zip, or a directory for an extracted tree")
+    parser.add_argument("--locations", type=int, default=150)
+    parser.add_argument("--dealers", type=int, default=15)
+    parser.add_argument("--brand", default="KIA")
+    parser.add_argument("--rows", type=int, default=2000, help="BO LIST rows per location; other types scale from it")
+    parser.add_argument("--rows-per-type", type=lambda s: _per_type(s, int), default=None,
+                        help='e.g. "stock=8000,transfer detail=500"')
+    parser.add_argument("--header", type=lambda s: _per_type(s, int), default=None,
+                        help='header row overrides, e.g. "bo list=2"')
+    parser.add_argument("--typo-ratio", type=float, default=0.5, help='share of locations with "Receving" names')
+    parser.add_argument("--mismatch-ratio", type=float, default=0.0,
+                        help="share of locations whose List totals differ from Detail")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    info = generate(args.out, args.locations, args.dealers, args.brand, args.rows, args.rows_per_type,
+                    args.header, args.typo_ratio, args.mismatch_ratio, args.seed)
+    print(f"{info['locations']} locations, {info['files']} workbooks, {info['bytes'] / 1024 / 1024:.1f}MB -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
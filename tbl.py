@@ -1,7 +1,8 @@
-from db import create_mssql_connection
+from db import ConnectionPool, create_mssql_connection
 
-connection = create_mssql_connection()
-cursor = connection.cursor()
+# Shared by every Streamlit session thread; each call checks out its own
+# connection + cursor (see db.ConnectionPool).
+pool = ConnectionPool(create_mssql_connection)
 
 #cursor.close()
 
@@ -35,11 +36,12 @@ def user_login(username, password):
     """
     try:
         # adjust column names if different; I'm using Id and Name as example
-        cursor.execute(
-            "SELECT Id, Name FROM user_Credential (nolock) WHERE Name = ? AND Pwd = ?",
-            (username, password)
-        )
-        row = cursor.fetchone()
+        with pool.cursor() as cursor:
+            cursor.execute(
+                "SELECT Id, Name FROM user_Credential (nolock) WHERE Name = ? AND Pwd = ?",
+                (username, password)
+            )
+            row = cursor.fetchone()
         if row:
             try:
                 uid = int(row[0])
@@ -54,8 +56,9 @@ def user_login(username, password):
 
 def User_Exist(Email,name):
     try:
-        cursor.execute("SELECT * FROM user_Credential (nolock) WHERE Email = ? and name=?", (Email,name))
-        result = cursor.fetchone()
+        with pool.cursor() as cursor:
+            cursor.execute("SELECT * FROM user_Credential (nolock) WHERE Email = ? and name=?", (Email,name))
+            result = cursor.fetchone()
         return result is not None
     except Exception as e:
         print(f"Error checking user existence: {e}")
@@ -63,8 +66,9 @@ def User_Exist(Email,name):
 
 def user_register(username,Email,password):
     try:
-        cursor.execute("INSERT INTO user_Credential (Name, Email,Pwd) VALUES (?, ?,?)", (username, Email,password))
-        connection.commit()
+        with pool.cursor() as cursor:
+            cursor.execute("INSERT INTO user_Credential (Name, Email,Pwd) VALUES (?, ?,?)", (username, Email,password))
+            cursor.connection.commit()
         return True
     except Exception as e:
         print(f"Error registering user: {e}")
@@ -80,18 +84,19 @@ def User_event_Log(user_id, Brand, Dealer, Location, Missing_file,
         (user_id, Brand, Dealer, Location, Missing_file, Startdate, Enddate, Category, MissingPeriod)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
-        cursor.execute(sql, (
-            user_id,
-            Brand,
-            Dealer,
-            Location,
-            Missing_file,
-            Startdate,
-            Enddate,
-            Category,
-            MissingPeriod
-        ))
-        connection.commit()
+        with pool.cursor() as cursor:
+            cursor.execute(sql, (
+                user_id,
+                Brand,
+                Dealer,
+                Location,
+                Missing_file,
+                Startdate,
+                Enddate,
+                Category,
+                MissingPeriod
+            ))
+            cursor.connection.commit()
         return True
     except Exception as e:
         print(f"Error logging user event: {e}")
@@ -0,0 +1,33 @@
+# test_excel_reader.py
+"""
+calamine / openpyxl parity of excel_reader.read_excel on synthetic_kia workbooks
+(one per report type, header row from report_schemas).
+"""
+
+import io
+
+import pytest
+from pandas.testing import assert_frame_equal
+
+from excel_reader import read_excel
+from report_schemas import SCHEMAS, schema_for
+from synthetic_kia import location_workbooks
+
+pytest.importorskip("python_calamine")
+
+
+@pytest.fixture(scope="module")
+def workbooks():
+    """{report type: xlsx bytes}, typo'd file names included."""
+    books = location_workbooks(0, rows=300, typo=True, seed=7)
+    return {schema_for(name).name: data for name, data in books.items()}
+
+
+@pytest.mark.parametrize("rtype", list(SCHEMAS))
+def test_calamine_matches_openpyxl(workbooks, rtype, capsys):
+    header = SCHEMAS[rtype].header
+    calamine = read_excel(io.BytesIO(workbooks[rtype]), header=header, engine="calamine")
+    assert "failed" not in capsys.readouterr().out  # read by calamine, not the openpyxl fallback
+    openpyxl = read_excel(io.BytesIO(workbooks[rtype]), header=header, engine="openpyxl")
+    assert not openpyxl.empty
+    assert_frame_equal(calamine, openpyxl, check_exact=True)
@@ -0,0 +1,56 @@
+# test_oem_golden.py
+"""
+OEM_*.xlsx of one synthetic_kia location against the pre-series output.
+
+test_oem_golden.json holds the sheet values the original process_files
+wrote for that location with "today" pinned, with one documented change
+applied: Receiving Today Detail ORDER DATE read like every other date column
+(Excel serial or day-first string, report_schemas) instead of a bare
+pd.to_datetime. The current process_location must reproduce them cell for
+cell, row order included.
+"""
+
+import io
+import json
+import os
+from datetime import datetime
+
+import pytest
+from openpyxl import load_workbook
+
+import report
+from excel_writer import to_xlsx
+from synthetic_kia import location_workbooks
+from zip_ingest import MemberSource
+
+GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_oem_golden.json")
+
+
+@pytest.fixture(scope="module")
+def golden():
+    with open(GOLDEN, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_oem_xlsx_matches_golden(golden, monkeypatch):
+    today = datetime.fromisoformat(golden["today"])
+
+    class Pinned(datetime):
+        @classmethod
+        def today(cls):
+            return today
+
+    monkeypatch.setattr(report, "datetime", Pinned)
+    loc = os.path.join("extracted_files", "KIA", "D1", "L1")
+    spec = golden["location"]
+    books = location_workbooks(spec["index"], rows=spec["rows"], seed=spec["seed"], today=today)
+    source = MemberSource({os.path.join(loc, name): data for name, data in books.items()})
+
+    res = report.process_location("KIA", "D1", "L1", loc, ["Spares"], source=source)
+    wb = load_workbook(io.BytesIO(to_xlsx(res["workbooks"]["OEM_KIA_D1_L1.xlsx"])))
+    sheets = {ws.title: [list(r) for r in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+
+    assert wb.active.title == golden["active"]
+    assert list(sheets) == list(golden["sheets"])
+    for name, rows in golden["sheets"].items():
+        assert sheets[name] == rows, name
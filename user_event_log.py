@@ -1,21 +1,68 @@
 # user_event_log.py
 """
 Logging helpers for Hyundai app.
-Expects `connection` and `cursor` from tbl.py.
+Uses the connection pool from tbl.py (one checkout per write).
 
 Make sure Log_user table has columns:
   user_id, Brand, Dealer, Location, Missing_file,
   Startdate, Enddate, Category, MissingPeriod, PeriodType, EventType, LogAddedOn
 (If not, ALTER TABLE to add PeriodType and EventType)
+
+log_app_events inserts all rows of a run with one executemany
+(fast_executemany) in a single transaction, KIA_LOG_CHUNK rows per batch.
+KIA_LOG_BULK=0 switches back to one INSERT + commit per row, which is also
+used automatically if the bulk insert fails because of the data. When the
+DB cannot be reached (no connection, pool timeout, dropped link) the batch
+fails at once with log_writer.TargetUnavailable instead, so it is spilled
+rather than retried one connection attempt per row.
+
+By default (KIA_LOG_ASYNC=1) the rows are handed to a background
+log_writer.EventLogWriter so the page never waits on SQL Server; it
+retries, spills to a local file while the DB is down and replays later;
+rows the DB rejects for their data are dead-lettered, not replayed.
+
+Every execute / executemany / commit counts as a "db.round_trips" in the
+diagnostics run passed as `metrics`. Background writes land on the writer
+thread after the run, so they are only counted as "db.rows_queued"; their
+latency is in writer_stats().
 """
 
-from typing import List, Any
+import atexit
+import os
+import threading
+from typing import List, Any, Tuple
 import pandas as pd
 
+from log_writer import TargetUnavailable
+
+LOG_BULK = os.getenv("KIA_LOG_BULK", "1").strip().lower() not in ("0", "false", "no")
+LOG_CHUNK = int(os.getenv("KIA_LOG_CHUNK", "1000"))
+LOG_ASYNC = os.getenv("KIA_LOG_ASYNC", "1").strip().lower() not in ("0", "false", "no")
+
+# Column order of a Log_user row tuple (matches log_event's parameters)
+LOG_SQL = """
+        INSERT INTO Log_user
+            (user_id, Brand, Dealer, Location, Missing_file,
+             Startdate, Enddate, Category, MissingPeriod, period_type, EventType, LogAddedOn)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, GETDATE())
+        """
+
 try:
-    from tbl import connection, cursor
+    from tbl import pool
 except Exception as e:
-    raise ImportError("Could not import connection/cursor from tbl.py") from e
+    raise ImportError("Could not import the connection pool from tbl.py") from e
+
+# DB-API exception classes that mean the server is unreachable, not that a row is bad
+_CONNECTION_ERRORS = ("OperationalError", "InterfaceError", "PoolTimeout")
+
+
+def _unreachable(e, connected):
+    """
+    True when `e` means the DB cannot be reached: anything raised before a
+    connection was checked out, or a connection-level driver error.
+    """
+    return (not connected or isinstance(e, (ConnectionError, TimeoutError))
+            or type(e).__name__ in _CONNECTION_ERRORS)
 
 
 def log_event(user_id: str,
@@ -28,17 +75,14 @@ def log_event(user_id: str,
               Category: str = "",
               MissingPeriod: str = "",
               period_type: str = "",   # <<-- snake_case
-              event_type: str = "") -> bool:  # <<-- snake_case
+              event_type: str = "",   # <<-- snake_case
+              metrics=None) -> bool:
     """
-    Insert a single row into Log_user.
+    Insert a single row into Log_user. Raises TargetUnavailable when the DB
+    cannot be reached.
     """
+    connected = False
     try:
-        sql = """
-        INSERT INTO Log_user
-            (user_id, Brand, Dealer, Location, Missing_file,
-             Startdate, Enddate, Category, MissingPeriod, period_type, EventType, LogAddedOn)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, GETDATE())
-        """
         params = (
             user_id,
             Brand,
@@ -52,34 +96,121 @@ def log_event(user_id: str,
             period_type,
             event_type
         )
-        cursor.execute(sql, params)
-        connection.commit()
+        with pool.cursor() as cursor:  # rolls back on error
+            connected = True
+            cursor.execute(LOG_SQL, params)
+            cursor.connection.commit()
+        if metrics is not None:
+            metrics.count("db.round_trips", 2)
+            metrics.count("db.rows")
         return True
     except Exception as e:
         print(f"[user_event_log.log_event] Error: {e}")
-        try:
-            connection.rollback()
-        except Exception:
-            pass
+        if _unreachable(e, connected):
+            raise TargetUnavailable(str(e)) from e
         return False
 
 
-def log_app_events(user_id: str,
-                   start_date: Any,
-                   end_date: Any,
-                   select_categories: List[str],
-                   missing_files: List[str],
-                   validation_log_df: pd.DataFrame,
-                   success: bool,
-                   period_type: str):
+def log_events_bulk(rows: List[Tuple], chunk_size: int = LOG_CHUNK, metrics=None) -> bool:
     """
-    High-level logging entrypoint.
-    `period_type` must be passed here (e.g. "Day","Week","Month","Quarter","Year").
+    Insert many Log_user rows with executemany, committed as one transaction.
+    Nothing is written if any chunk fails. Raises TargetUnavailable when the
+    DB cannot be reached.
+    """
+    if not rows:
+        return True
+    connected = False
+    try:
+        with pool.cursor() as cursor:  # rolls back on error
+            connected = True
+            try:
+                cursor.fast_executemany = True
+            except AttributeError:
+                pass  # non-pyodbc cursor
+            for i in range(0, len(rows), chunk_size):
+                cursor.executemany(LOG_SQL, rows[i:i + chunk_size])
+            cursor.connection.commit()
+        if metrics is not None:
+            metrics.count("db.round_trips", -(-len(rows) // chunk_size) + 1)
+            metrics.count("db.rows", len(rows))
+        return True
+    except Exception as e:
+        print(f"[user_event_log.log_events_bulk] Error: {e}")
+        if _unreachable(e, connected):
+            raise TargetUnavailable(str(e)) from e
+        return False
+
+
+def write_rows(rows: List[Tuple], bulk: bool = None, metrics=None) -> List[Tuple]:
+    """
+    Write rows (bulk first, then per row); return the rows that failed.
+    Raises TargetUnavailable (with the unwritten rows) when the DB cannot be
+    reached. Round trips are counted into `metrics` (a diagnostics.RunMetrics).
     """
+    rows = list(rows)
+    try:
+        if (LOG_BULK if bulk is None else bulk) and log_events_bulk(rows, metrics=metrics):
+            return []
+    except TargetUnavailable as e:
+        raise TargetUnavailable(str(e), rows) from e
+    # per-row fallback: one INSERT + commit each, a bad row doesn't drop the rest
+    failed = []
+    for i, params in enumerate(rows):
+        try:
+            if not log_event(*params, metrics=metrics):
+                failed.append(params)
+        except TargetUnavailable as e:
+            raise TargetUnavailable(str(e), failed + rows[i:]) from e
+    return failed
 
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def event_writer():
+    """
+    Process-wide background writer, started on first use.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            from log_writer import EventLogWriter
+            _writer = EventLogWriter(write_rows)
+            atexit.register(_writer.close, 5.0)  # drain (or spill) on shutdown
+        return _writer
+
+
+def writer_stats():
+    """
+    Queue depth / flush latency of the background writer (None if never started).
+    """
+    return _writer.stats() if _writer is not None else None
+
+
+def _column(df: pd.DataFrame, name: str) -> List[Any]:
+    """Column values with missing/empty cells as "" (per-row `row.get(name, "") or ""`)."""
+    if name not in df.columns:
+        return [""] * len(df)
+    col = df[name].astype(object)
+    return col.where(col.notna() & col.astype(bool), "").tolist()
+
+
+def build_event_rows(user_id: str,
+                     start_date: Any,
+                     end_date: Any,
+                     select_categories: List[str],
+                     missing_files: List[str],
+                     validation_log_df: pd.DataFrame,
+                     success: bool,
+                     period_type: str) -> List[Tuple]:
+    """
+    Log_user row tuples for one run, in log_event parameter order.
+    """
     start_date_str = str(start_date)
     end_date_str = str(end_date)
     category_value = ",".join(select_categories) if select_categories else ""
+    rows = []
 
     # Missing files
     for msg in missing_files or []:
@@ -90,50 +221,61 @@ def log_app_events(user_id: str,
         except Exception:
             brand = dealer = location = ""
             missing_label = msg
-
-        log_event(
-            user_id=user_id,
-            Brand=brand,
-            Dealer=dealer,
-            Location=location,
-            Missing_file=missing_label,
-            Startdate=start_date_str,
-            Enddate=end_date_str,
-            Category=category_value,
-            MissingPeriod="",
-            period_type=period_type,    # <-- pass snake_case param
-            event_type="FileMissing"
-        )
+        rows.append((user_id, brand, dealer, location, missing_label,
+                     start_date_str, end_date_str, category_value, "",
+                     period_type, "FileMissing"))
 
     # Missing periods
     if validation_log_df is not None and not validation_log_df.empty:
-        for _, row in validation_log_df.iterrows():
-            log_event(
-                user_id=user_id,
-                Brand=row.get("Brand", "") or "",
-                Dealer=row.get("Dealer", "") or "",
-                Location=row.get("Location", "") or "",
-                Missing_file=row.get("Missing In", "") or "",
-                Startdate=start_date_str,
-                Enddate=end_date_str,
-                Category=category_value,
-                MissingPeriod=row.get("Period", "") or "",
-                period_type=period_type,
-                event_type="PeriodMissing"
-            )
+        df = validation_log_df
+        rows.extend(zip(
+            [user_id] * len(df),
+            _column(df, "Brand"),
+            _column(df, "Dealer"),
+            _column(df, "Location"),
+            _column(df, "Missing In"),
+            [start_date_str] * len(df),
+            [end_date_str] * len(df),
+            [category_value] * len(df),
+            _column(df, "Period"),
+            [period_type] * len(df),
+            ["PeriodMissing"] * len(df),
+        ))
 
     # Success (single global row)
     if success:
-        log_event(
-            user_id=user_id,
-            Brand="ALL",
-            Dealer="ALL",
-            Location="ALL",
-            Missing_file="",
-            Startdate=start_date_str,
-            Enddate=end_date_str,
-            Category=category_value,
-            MissingPeriod="",
-            period_type=period_type,
-            event_type="ProcessingSuccess"
-        )
+        rows.append((user_id, "ALL", "ALL", "ALL", "",
+                     start_date_str, end_date_str, category_value, "",
+                     period_type, "ProcessingSuccess"))
+    return rows
+
+
+def log_app_events(user_id: str,
+                   start_date: Any,
+                   end_date: Any,
+                   select_categories: List[str],
+                   missing_files: List[str],
+                   validation_log_df: pd.DataFrame,
+                   success: bool,
+                   period_type: str,
+                   bulk: bool = None,
+                   background: bool = None,
+                   metrics=None):
+    """
+    High-level logging entrypoint.
+    `period_type` must be passed here (e.g. "Day","Week","Month","Quarter","Year").
+    `bulk` / `background` override KIA_LOG_BULK / KIA_LOG_ASYNC for this call.
+    `metrics` is the diagnostics.RunMetrics of the run being logged.
+    """
+
+    rows = build_event_rows(user_id, start_date, end_date, select_categories,
+                            missing_files, validation_log_df, success, period_type)
+    if LOG_ASYNC if background is None else background:
+        event_writer().submit(rows)
+        if metrics is not None:
+            metrics.count("db.rows_queued", len(rows))
+        return
+    try:
+        write_rows(rows, bulk, metrics)
+    except TargetUnavailable as e:
+        print(f"[user_event_log.log_app_events] {len(e.rows)} events not written, DB unreachable: {e}")
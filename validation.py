@@ -0,0 +1,240 @@
+# validation.py
+"""
+Pre-generation checks on an extracted KIA upload.
+
+missing_inputs    - report types a location has no file for
+validate_periods  - which report types have no rows in each reporting period
+validate_cross_sums - blocking List vs Detail quantity reconciliation
+
+Both take `all_locations` as (brand, dealer, location, location_path) tuples,
+the source the locations live in (zip_ingest; defaults to disk) and an
+optional WorkbookStore so parsed workbooks are shared with
+report.process_files. Frames come back named and coerced by their
+report_schemas entry, so dates and quantities are used as read.
+"""
+
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from file_index import REPORT_TYPES
+from report import read_file
+from report_schemas import SCHEMAS
+from zip_ingest import DiskSource
+
+
+# reporting period -> days
+PERIOD_TYPES = {"Day": 1, "Week": 7, "Month": 30, "Quarter": 90, "Year": 365}
+
+
+def missing_inputs(all_locations, source=None):
+    """
+    "Brand/Dealer/Location - Missing: <report type>" for every absent input type.
+    """
+    source = source or DiskSource()
+    missing_files = []
+    for brand, dealer, location, location_path in all_locations:
+        index = source.index(location_path)
+        for k in REPORT_TYPES:
+            if not index[k]:
+                missing_files.append(f"{brand}/{dealer}/{location} - Missing: {k}")
+    return missing_files
+
+
+# ---------------- Validation Functions (periods) ---------------- #
+# Columns of the periods x report-type coverage matrix, in reporting order.
+COVERAGE_TYPES = ["OEM", "MRN", "Receiving Pending Detail", "Receiving Today Detail", "Transfer list"]
+
+# coverage column -> (report type, date column, name in error messages)
+COVERAGE_SOURCES = {
+    0: ("bo list", "PO DATE", "OEM periods"),
+    2: ("receiving pending detail", "ORDER DATE", "receiving periods"),
+    3: ("receiving today detail", "ORDER DATE", "receiving today periods"),
+    4: ("transfer list", "REQ.DATE", "Transfer list periods"),
+}
+
+
+def period_coverage(dates, period_starts, period_ends):
+    """
+    Boolean array: True where at least one of `dates` falls on a day inside
+    [period_starts[i], period_ends[i]]. Periods must be sorted and disjoint.
+    """
+    covered = np.zeros(len(period_starts), dtype=bool)
+    days = pd.to_datetime(pd.Series(dates), errors="coerce").dropna().to_numpy(dtype="datetime64[ns]")
+    if days.size == 0 or covered.size == 0:
+        return covered
+    days = days.astype("datetime64[D]")
+    idx = np.searchsorted(period_starts, days, side="right") - 1
+    inside = idx >= 0
+    inside[inside] = days[inside] <= period_ends[idx[inside]]
+    covered |= np.bincount(idx[inside], minlength=len(period_starts)) > 0
+    return covered
+
+
+def validate_periods(all_locations, start_date, end_date, period_days, store=None, source=None):
+    source = source or DiskSource()
+    read = store.read if store is not None else (lambda path, header=None: read_file(path, header=header, source=source))
+    validation_errors = []
+    missing_periods_log = []
+
+    # Build (start,end) windows
+    periods = []
+    current_date = start_date
+    while current_date <= end_date:
+        period_end = min(current_date + timedelta(days=period_days - 1), end_date)
+        periods.append((current_date, period_end))
+        current_date = period_end + timedelta(days=1)
+    period_starts = np.array([p[0] for p in periods], dtype="datetime64[D]")
+    period_ends = np.array([p[1] for p in periods], dtype="datetime64[D]")
+
+    for brand, dealer, location, location_path in all_locations:
+        index = source.index(location_path)
+        oem_files = index['bo list']
+        rpd_files = index['receiving pending detail']
+        rtd_files = index['receiving today detail']
+        tl_files  = index['transfer list']
+
+        # If any of the core files is completely absent, skip period checks for this location
+        if not oem_files or not rpd_files or not rtd_files or not tl_files:
+            continue
+
+        coverage = np.zeros((len(periods), len(COVERAGE_TYPES)), dtype=bool)
+
+        for col, (rtype, date_col, label) in COVERAGE_SOURCES.items():
+            header = SCHEMAS[rtype].header
+            for name in index[rtype]:
+                try:
+                    df = read(os.path.join(location_path, name), header=header)
+                    if df is None or df.empty or date_col not in df.columns:
+                        continue
+                    coverage[:, col] |= period_coverage(df[date_col], period_starts, period_ends)
+                except Exception as e:
+                    validation_errors.append(f"{location}: Error validating {label} - {str(e)}")
+
+        # MRN not in KIA set; mark True
+        coverage[:, 1] = True
+
+        for (period_start, period_end), covered in zip(periods, coverage):
+            missing_in = [name for name, ok in zip(COVERAGE_TYPES, covered) if not ok]
+            if missing_in:
+                missing_periods_log.append({
+                    'Brand': brand, 'Dealer': dealer, 'Location': location,
+                    'Period': f"{period_start} to {period_end}",
+                    'Missing In': ", ".join(missing_in)
+                })
+                validation_errors.append(f"{location}: {' and '.join(missing_in)} missing for period {period_start} to {period_end}")
+
+    validation_log_df = pd.DataFrame(missing_periods_log) if missing_periods_log else pd.DataFrame(
+        columns=['Brand', 'Dealer', 'Location', 'Period', 'Missing In']
+    )
+    return validation_errors, validation_log_df
+
+# ---------------- HARD BLOCK: cross-sum checks ---------------- #
+def _to_num(s):
+    return pd.to_numeric(s, errors="coerce").fillna(0.0)
+
+def validate_cross_sums(all_locations, store=None, source=None):
+    """
+    1) Sum(ACCEPT) in Receiving Pending List == Sum(ACCEPT QTY) in Receiving Pending Detail
+    2) Sum(ACCEPT) in Receiving Today List   == Sum(ACCEPT QTY) in Receiving Today Detail
+    3) Sum(SEND)   in Transfer List          == Sum(QUANTITY) in Transfer Detail
+    If any mismatch -> return blocking errors.
+    """
+    source = source or DiskSource()
+    read = store.read if store is not None else (lambda path, header=None: read_file(path, header=header, source=source))
+    errors = []
+    rows = []
+
+    # header rows as the pipeline reads them
+    header = {rtype: schema.header for rtype, schema in SCHEMAS.items()}
+
+    for brand, dealer, location, location_path in all_locations:
+        # classified once per location (both "receiving" spellings)
+        index = source.index(location_path)
+
+        # ----- 1) Receiving Pending List vs Detail -----
+        rpl_files = index['receiving pending list']
+        rpd_files = index['receiving pending detail']
+
+        rpl_accept = 0.0
+        for f in rpl_files:
+            df = read(os.path.join(location_path, f), header=header['receiving pending list'])
+            if df is None or df.empty: continue
+            #df['SHIPPED INFORMATION_ACCEPT QTY']=df['SHIPPED INFORMATION_ACCEPT QTY'].astype(float).fillna(0.0)
+            #st.dataframe(df)
+            if 'SHIPPED INFORMATION_ACCEPT QTY' in df.columns:
+                rpl_accept += df['SHIPPED INFORMATION_ACCEPT QTY'].sum()
+               # rpl_accept += df['SHIPPED INFORMATION_ACCEPT QTY'].astype(float).sum()
+
+        rpd_accept = 0.0
+        for f in rpd_files:
+            df = read(os.path.join(location_path, f), header=header['receiving pending detail'])
+            if df is None or df.empty: continue
+            if 'ACCEPT QTY' in df.columns:
+                rpd_accept += df['ACCEPT QTY'].sum()
+                #rpd_accept += df['ACCEPT QTY'].astype(float).sum()
+
+        if (rpl_files or rpd_files) and abs(rpl_accept - rpd_accept) > 1e-6:
+            errors.append(f"{location}: Receiving Pending List ACCEPT({rpl_accept:.2f}) != Pending Detail ACCEPT QTY({rpd_accept:.2f})")
+            rows.append({"Brand":brand,"Dealer":dealer,"Location":location,"Check":"Receiving Pending (List vs Detail)",
+                        "List_Sum":rpl_accept,"Detail_Sum":rpd_accept,"Difference":rpl_accept - rpd_accept})
+
+        # ----- 2) Receiving Today List vs Detail -----
+        rtl_files = index['receiving today list']
+        rtd_files = index['receiving today detail']
+
+        rtl_accept = 0.0
+        for f in rtl_files:
+            df = read(os.path.join(location_path, f), header=header['receiving today list'])
+            if df is None or df.empty: continue
+            if 'SHIPPED INFORMATION_ACCEPT QTY' in df.columns:
+                #tl_accept += _to_num(df['SHIPPED INFORMATION_ACCEPT QTY']).sum()
+                rtl_accept += df['SHIPPED INFORMATION_ACCEPT QTY'].sum()
+                #rtl_accept += df['SHIPPED INFORMATION_ACCEPT QTY'].astype(float).sum()
+
+        rtd_accept = 0.0
+        for f in rtd_files:
+            df = read(os.path.join(location_path, f), header=header['receiving today detail'])
+            if df is None or df.empty: continue
+            if 'ACCEPT QTY' in df.columns:
+                #rtd_accept += df['ACCEPT QTY'].astype(float).sum()
+                rtd_accept += df['ACCEPT QTY'].sum()
+
+        if (rtl_files or rtd_files) and abs(rtl_accept - rtd_accept) > 1e-6:
+            errors.append(f"{location}: Receiving Today List ACCEPT({rtl_accept:.2f}) != Today Detail ACCEPT QTY({rtd_accept:.2f})")
+            rows.append({"Brand":brand,"Dealer":dealer,"Location":location,"Check":"Receiving Today (List vs Detail)",
+                        "List_Sum":rtl_accept,"Detail_Sum":rtd_accept,"Difference":rtl_accept - rtd_accept})
+
+        # ----- 3) Transfer List vs Transfer Detail -----
+        tl_files = index['transfer list']
+        td_files = index['transfer detail']
+
+        tl_send = 0.0
+        for f in tl_files:
+            df = read(os.path.join(location_path, f), header=header['transfer list'])
+            if df is None or df.empty: continue
+            if 'QUANTITY_SEND' in df.columns:
+                #tl_send += df['QUANTITY_SEND'].astype(float).sum()
+                tl_send += df['QUANTITY_SEND'].sum()
+
+        # Transfer Detail is less standardized; try common candidates
+        td_qty = 0.0
+        qty_candidates = ["QUANTITY", "QTY", "QUANTITY_SEND", "QUANTITY_REQ", "ITEM_SEND"]
+        for f in td_files:
+            df = read(os.path.join(location_path, f), header=header['transfer detail'])
+            if df is None or df.empty: continue
+            # pick the first candidate present (case-sensitive as read)
+            cand = next((c for c in qty_candidates if c in df.columns), None)
+            if cand:
+               # td_qty += df[cand].astype(float).sum()
+                td_qty += _to_num(df[cand]).sum()
+
+        if (tl_files or td_files) and abs(tl_send - td_qty) > 1e-6:
+            errors.append(f"{location}: Transfer List SEND({tl_send:.2f}) != Transfer Detail QUANTITY({td_qty:.2f})")
+            rows.append({"Brand":brand,"Dealer":dealer,"Location":location,"Check":"Transfer (List vs Detail)",
+                        "List_Sum":tl_send,"Detail_Sum":td_qty,"Difference":tl_send - td_qty})
+
+    log_df = pd.DataFrame(rows, columns=["Brand","Dealer","Location","Check","List_Sum","Detail_Sum","Difference"])
+    return errors, log_df
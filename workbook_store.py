@@ -0,0 +1,106 @@
+# workbook_store.py
+"""
+Per-run store of parsed workbooks.
+
+validate_periods, validate_cross_sums and report.process_files all read the
+same BO LIST / Receiving / Transfer workbooks. The store parses each
+(path, header) pair once per run and hands every stage a shallow copy, so a
+stage can rename columns or add helper columns without affecting the next
+stage.
+
+report.process_files is the last stage for every report type, so it releases
+each file as soon as it has read it; anything left over is dropped with
+`clear()` when the run ends.
+
+Reads may ask for a column projection (`usecols`, see excel_reader). It is
+part of the key; when the full frame of the same (path, header) is already
+held, the projection is cut from it instead of parsing the file again.
+"""
+
+import os
+
+import pandas as pd
+
+import diagnostics
+from excel_reader import select_columns
+
+# Frames are not retained past this budget; they are still returned to the
+# caller and simply re-read by the next stage that asks for them.
+DEFAULT_MAX_BYTES = int(os.getenv("KIA_STORE_MAX_MB", "1024")) * 1024 * 1024
+
+
+class WorkbookStore:
+    def __init__(self, reader, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        `reader(path, header=..., usecols=...)` is the underlying parser (read_file).
+        """
+        self._reader = reader
+        self._frames = {}   # (path, header, usecols) -> DataFrame | None
+        self._sizes = {}    # (path, header, usecols) -> bytes held
+        self.max_bytes = max_bytes
+        self.bytes_held = 0
+        self.peak_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.released = 0
+
+    def read(self, path, header=None, usecols=None):
+        """
+        Return the parsed frame for (path, header, usecols), or None if it could not be read.
+        """
+        key = (path, header, usecols)
+        full = (path, header, None)
+        if key in self._frames:
+            self.hits += 1
+            diagnostics.count("store.hits")
+            df = self._frames[key]
+        elif usecols is not None and full in self._frames:
+            self.hits += 1
+            diagnostics.count("store.hits")
+            df = self._frames[full]
+            try:
+                df = None if df is None else select_columns(df, usecols)
+            except IndexError:
+                df = None  # positions past the last column: unreadable, as read_file reports it
+        else:
+            self.misses += 1
+            diagnostics.count("store.misses")
+            df = self._reader(path, header=header, usecols=usecols)
+            if not isinstance(df, pd.DataFrame):
+                df = None
+            self._retain(key, df)
+        return None if df is None else df.copy(deep=False)
+
+    def _retain(self, key, df):
+        size = 0 if df is None else int(df.memory_usage(deep=True).sum())
+        if self.bytes_held + size > self.max_bytes:
+            return
+        self._frames[key] = df
+        self._sizes[key] = size
+        self.bytes_held += size
+        self.peak_bytes = max(self.peak_bytes, self.bytes_held)
+
+    def release(self, path):
+        """
+        Drop every header / projection variant of `path`; call once the last stage has read it.
+        """
+        for key in [k for k in self._frames if k[0] == path]:
+            self._frames.pop(key)
+            self.bytes_held -= self._sizes.pop(key)
+            self.released += 1
+
+    def clear(self):
+        self.released += len(self._frames)
+        self._frames.clear()
+        self._sizes.clear()
+        self.bytes_held = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "retained": len(self._frames),
+            "released": self.released,
+            "bytes_held": self.bytes_held,
+            "peak_bytes": self.peak_bytes,
+        }
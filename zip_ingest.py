@@ -0,0 +1,188 @@
+# zip_ingest.py
+"""
+Input sources for the report pipeline.
+
+Every stage lists a location and opens its workbooks through a source:
+
+    listdir(dir)  isfile(path)  getsize(path)  open(path) -> binary file
+    index(location_path) -> {report type: [file names]}  (file_index, memoized)
+
+DiskSource wraps an extracted Brand/Dealer/Location tree. ZipSource indexes
+the uploaded ZIP's central directory and serves member bytes from memory;
+only members larger than KIA_ZIP_SPILL_MB are extracted to a temp dir, so a
+run no longer writes the whole upload to disk just to read it back.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+
+import diagnostics
+from file_index import build_index, iter_files
+
+DEFAULT_SPILL_BYTES = int(os.getenv("KIA_ZIP_SPILL_MB", "32")) * 1024 * 1024
+
+# Virtual root of ZIP paths; matches the old extract dir so display names
+# ("Brand/Dealer/Location/file.xlsx") stay the same.
+ZIP_ROOT = "extracted_files"
+
+
+def find_locations(source, root):
+    """
+    (brand, dealer, location, location_path) for every Brand/Dealer/Location dir.
+    """
+    all_locations = []
+    for brand in source.listdir(root):
+        brand_path = os.path.join(root, brand)
+        if source.isfile(brand_path): continue
+        for dealer in source.listdir(brand_path):
+            dealer_path = os.path.join(brand_path, dealer)
+            if source.isfile(dealer_path): continue
+            for location in source.listdir(dealer_path):
+                location_path = os.path.join(dealer_path, location)
+                if not source.isfile(location_path):
+                    all_locations.append((brand, dealer, location, location_path))
+    return all_locations
+
+
+class _Source:
+    _index = None
+
+    def index(self, location_path):
+        """
+        Classified files of a location; the directory is scanned once per source.
+        """
+        if self._index is None:
+            self._index = {}
+        if location_path not in self._index:
+            self._index[location_path] = build_index(self, location_path)
+        return self._index[location_path]
+
+
+class DiskSource(_Source):
+    def __init__(self, root=None):
+        self.root = root
+
+    def listdir(self, path):
+        return os.listdir(path)
+
+    def isfile(self, path):
+        return os.path.isfile(path)
+
+    def getsize(self, path):
+        return os.path.getsize(path)
+
+    def open(self, path):
+        return open(path, "rb")
+
+    def locations(self):
+        return find_locations(self, self.root)
+
+    def subset(self, location_path):
+        return self
+
+    def close(self):
+        pass
+
+
+class ZipSource(_Source):
+    def __init__(self, zip_file, spill_bytes=DEFAULT_SPILL_BYTES):
+        self.root = ZIP_ROOT
+        self.spill_bytes = spill_bytes
+        self._zip = zipfile.ZipFile(zip_file, "r")
+        self._files = {}      # virtual path -> ZipInfo
+        self._dirs = {}       # virtual dir -> set(child names)
+        self._spilled = {}    # virtual path -> extracted path
+        self._spill_dir = None
+        for info in self._zip.infolist():
+            parts = [p for p in info.filename.replace("\\", "/").split("/") if p]
+            if not parts:
+                continue
+            parent = self.root
+            for i, part in enumerate(parts):
+                self._dirs.setdefault(parent, set()).add(part)
+                parent = os.path.join(parent, part)
+                if i < len(parts) - 1 or info.is_dir():
+                    self._dirs.setdefault(parent, set())
+            if not info.is_dir():
+                self._files[parent] = info
+
+    def listdir(self, path):
+        if path not in self._dirs:
+            raise FileNotFoundError(path)
+        return sorted(self._dirs[path])
+
+    def isfile(self, path):
+        return path in self._files
+
+    def getsize(self, path):
+        return self._files[path].file_size
+
+    def open(self, path):
+        info = self._files[path]
+        if info.file_size <= self.spill_bytes:
+            diagnostics.count("zip.members_inflated")
+            diagnostics.count("zip.bytes_inflated", info.file_size)
+            return io.BytesIO(self._zip.read(info))
+        return open(self._spill(path, info), "rb")
+
+    def _spill(self, path, info):
+        if path not in self._spilled:
+            if self._spill_dir is None:
+                self._spill_dir = tempfile.mkdtemp(prefix="kia_zip_")
+            target = os.path.join(self._spill_dir, str(len(self._spilled)))
+            with self._zip.open(info) as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            self._spilled[path] = target
+            diagnostics.count("zip.members_spilled")
+            diagnostics.count("zip.bytes_spilled", info.file_size)
+        return self._spilled[path]
+
+    def locations(self):
+        return find_locations(self, self.root)
+
+    def subset(self, location_path):
+        """
+        Picklable source holding just one location's report inputs (for worker processes).
+        """
+        entries = {}
+        for _, name in iter_files(self.index(location_path)):
+            path = os.path.join(location_path, name)
+            info = self._files[path]
+            entries[path] = self._zip.read(info) if info.file_size <= self.spill_bytes else self._spill(path, info)
+        return MemberSource(entries)
+
+    def close(self):
+        self._zip.close()
+        if self._spill_dir:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+
+
+class MemberSource(_Source):
+    """
+    Flat set of files: virtual path -> bytes, or path of a spilled member on disk.
+    """
+    def __init__(self, entries):
+        self._entries = entries
+
+    def listdir(self, path):
+        return sorted(os.path.basename(p) for p in self._entries if os.path.dirname(p) == path)
+
+    def isfile(self, path):
+        return path in self._entries
+
+    def getsize(self, path):
+        data = self._entries[path]
+        return len(data) if isinstance(data, bytes) else os.path.getsize(data)
+
+    def open(self, path):
+        data = self._entries[path]
+        return io.BytesIO(data) if isinstance(data, bytes) else open(data, "rb")
+
+    def subset(self, location_path):
+        return self
+
+    def close(self):
+        pass